@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from local_store import CACHE_DIR, SQLiteStore
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "analysis.sqlite3")
+MAX_ENTRIES = 5000
+
+def analysis_key(prompt_version, model_name, transcript):
+    """Cache key: (prompt template version, model, transcript) -> sha256."""
+    h = hashlib.sha256()
+    for part in (prompt_version, model_name, transcript):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class AnalysisCache(SQLiteStore):
+    """
+    Gemini 分析結果快取：同一份逐字稿、同一版 prompt 與模型只需要分析一次。
+    超過 MAX_ENTRIES 時淘汰最久未使用的項目，並記錄本行程的命中 / 未命中次數。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS analyses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_analyses_accessed ON analyses(accessed_at);
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=MAX_ENTRIES):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def get(self, key):
+        row = self.conn.execute("SELECT data FROM analyses WHERE key = ?", (key,)).fetchone()
+        with self._counter_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.conn.execute("UPDATE analyses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row['data']).decode('utf-8'))
+
+    def put(self, key, analysis, model='', prompt_version=''):
+        data = zlib.compress(json.dumps(analysis, ensure_ascii=False).encode('utf-8'), 6)
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, model, prompt_version, data, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, data, now, now))
+            count = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,))
+
+    def stats(self):
+        entries = self.conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,162 @@
+import json
+
+# Structured output schema for generate_content(config={'response_schema': ...});
+# mirrors the JSON format described in study_ai.build_prompt.
+VOCABULARY_ITEM = {
+    'type': 'OBJECT',
+    'properties': {
+        'word': {'type': 'STRING'},
+        'phonetic': {'type': 'STRING'},
+        'definition': {'type': 'STRING'},
+        'definition_zh': {'type': 'STRING'},
+        'example': {'type': 'STRING'},
+        'example_zh': {'type': 'STRING'},
+    },
+    'required': ['word', 'definition', 'definition_zh', 'example', 'example_zh'],
+    'property_ordering': ['word', 'phonetic', 'definition', 'definition_zh', 'example', 'example_zh'],
+}
+
+# No timestamp: it is matched locally from the example sentence (time_index.align_patterns)
+PATTERN_ITEM = {
+    'type': 'OBJECT',
+    'properties': {
+        'structure': {'type': 'STRING'},
+        'usage': {'type': 'STRING'},
+        'example': {'type': 'STRING'},
+    },
+    'required': ['structure', 'usage', 'example'],
+    'property_ordering': ['structure', 'usage', 'example'],
+}
+
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'category': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'vocabulary': {'type': 'ARRAY', 'items': VOCABULARY_ITEM},
+        'sentence_patterns': {'type': 'ARRAY', 'items': PATTERN_ITEM},
+    },
+    'required': ['category', 'vocabulary', 'sentence_patterns'],
+    # Category first so that a truncated answer still carries it
+    'property_ordering': ['category', 'vocabulary', 'sentence_patterns'],
+}
+
+# When the prompt lists lexicon words (study_ai.lexicon), those come back as {"word": ...} only
+# and are completed locally, so only "word" is required per item.
+LEXICON_RESPONSE_SCHEMA = dict(RESPONSE_SCHEMA, properties=dict(
+    RESPONSE_SCHEMA['properties'],
+    vocabulary={'type': 'ARRAY', 'items': dict(VOCABULARY_ITEM, required=['word'])}))
+
+_REQUIRED = {
+    'vocabulary': ('word', 'definition'),
+    'sentence_patterns': ('structure', 'example'),
+}
+
+def lower_bound(count_range):
+    """'12-15' -> 12 (an int count is returned as is)"""
+    return int(str(count_range).split('-')[0])
+
+def upper_bound(count_range):
+    """'12-15' -> 15"""
+    return int(str(count_range).split('-')[-1])
+
+def _strip_fences(raw_text):
+    return (raw_text or '').replace('```json', '').replace('```', '').strip()
+
+def _salvage_items(text, pos, decoder):
+    """Decode the complete items of the array starting at text[pos] == '[', stopping at the first truncated one."""
+    items = []
+    pos += 1
+    length = len(text)
+    while pos < length:
+        while pos < length and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= length or text[pos] == ']':
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    return items
+
+def _skip_space(text, pos):
+    while pos < len(text) and text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+def _salvage_arrays(text, keys, decoder):
+    """
+    Walk the members of the top-level object with raw_decode, so that only real keys match
+    (not the same words inside a string value or a nested object), and return {key: items}
+    for the array members in keys; the truncated member keeps its complete items.
+    """
+    found = {key: [] for key in keys}
+    pos = text.find('{')
+    if pos < 0:
+        return found
+    pos += 1
+    while True:
+        pos = _skip_space(text, pos)
+        if pos < len(text) and text[pos] == ',':
+            pos = _skip_space(text, pos + 1)
+        if pos >= len(text) or text[pos] != '"':
+            break
+        try:
+            name, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        pos = _skip_space(text, pos)
+        if pos >= len(text) or text[pos] != ':':
+            break
+        pos = _skip_space(text, pos + 1)
+        try:
+            value, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if name in found and pos < len(text) and text[pos] == '[':
+                found[name] = _salvage_items(text, pos, decoder)
+            break
+        if name in found and isinstance(value, list):
+            found[name] = value
+    return found
+
+def parse_analysis(raw_text):
+    """
+    寬鬆的 JSON 解析：完整的回應直接 json.loads；被截斷或格式有誤時，
+    從 category / vocabulary / sentence_patterns 陣列中救回所有完整的項目。
+    回傳 (analysis, salvaged)。連一個項目都救不回時拋出 json.JSONDecodeError。
+    """
+    text = _strip_fences(raw_text)
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except json.JSONDecodeError as e:
+        error = e
+    else:
+        error = json.JSONDecodeError("AI response is not a JSON object", text, 0)
+
+    decoder = json.JSONDecoder()
+    data = _salvage_arrays(text, ('category', 'vocabulary', 'sentence_patterns'), decoder)
+    if not data['vocabulary'] and not data['sentence_patterns']:
+        raise error
+    return data, True
+
+def validate_analysis(analysis, vocab_count, pattern_count):
+    """
+    丟掉缺少必要欄位的項目，並回傳 (analysis, 缺少的單字數, 缺少的句型數)，
+    缺少的數量以 target_counts 區間的下限計算。
+    """
+    for key, fields in _REQUIRED.items():
+        items = analysis.get(key)
+        if not isinstance(items, list):
+            items = []
+        analysis[key] = [item for item in items
+                         if isinstance(item, dict) and all(item.get(field) not in (None, '') for field in fields)]
+    categories = analysis.get('category')
+    if isinstance(categories, str):
+        analysis['category'] = [categories]
+    elif not isinstance(categories, list):
+        analysis['category'] = []
+    missing_vocab = max(lower_bound(vocab_count) - len(analysis['vocabulary']), 0)
+    missing_patterns = max(lower_bound(pattern_count) - len(analysis['sentence_patterns']), 0)
+    return analysis, missing_vocab, missing_patterns
@@ -0,0 +1,90 @@
+"""
+為 en_videos 中已完成影片的 sentence_patterns 補上 (或重新比對) 時間點：
+逐字稿取自字幕快取 (--fetch 時快取沒有的才向 YouTube 下載)，並另存成二進位字幕 (transcript_store)，
+之後重新比對 (--all) 時直接以 mmap 串流進索引；以 time_index 比對例句，
+有變動的資料列再以 BulkLoader 批次寫回。
+
+    python backfill_timestamps.py              # 只補沒有 timestamp 的句型
+    python backfill_timestamps.py --all        # 所有句型都重新比對 (取代模型猜的時間點；找不到時保留原值)
+    python backfill_timestamps.py --fetch      # 快取中沒有的逐字稿向 YouTube 下載
+    python backfill_timestamps.py --dry-run    # 只顯示結果，不寫回
+"""
+import sys
+import time
+from bulk_loader import BulkLoader
+from time_index import TimeIndex, align_patterns
+from transcript_store import TranscriptStore
+
+PAGE_SIZE = 500
+
+transcript_store = TranscriptStore()
+
+def iter_completed(client):
+    start = 0
+    while True:
+        rows = client.table('en_videos').select('video_id, sentence_patterns').eq('status', 'completed') \
+            .order('video_id').range(start, start + PAGE_SIZE - 1).execute().data
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+def _has_timestamp(pattern):
+    return isinstance(pattern.get('timestamp'), (int, float))
+
+def load_transcript(video_id, fetch):
+    """BinaryTranscript (streamed from the mmap, no string copy), cached text (stored for the next run), or None."""
+    import study_ai
+    stored = transcript_store.open(video_id)
+    if stored is not None and len(stored):
+        return stored
+    if fetch:
+        text = study_ai.fetch_transcript_final(video_id)
+    else:
+        cached = study_ai.transcript_cache.get(video_id)
+        text = cached[0] if cached else None
+    if text:
+        try:
+            transcript_store.put(video_id, text)
+        except OSError as e:
+            print(f"   [資訊] 二進位字幕寫入失敗: {e}")
+    return text
+
+def backfill(client, realign=False, fetch=False):
+    """Yields {'video_id', 'sentence_patterns'} for every row whose patterns changed; prints a summary."""
+    stats = {'videos': 0, 'no_transcript': 0, 'patterns': 0, 'matched': 0, 'changed_rows': 0}
+    t0 = time.perf_counter()
+    for row in iter_completed(client):
+        patterns = [p for p in (row.get('sentence_patterns') or []) if isinstance(p, dict)]
+        todo = patterns if realign else [p for p in patterns if not _has_timestamp(p)]
+        if not todo:
+            continue
+        stats['videos'] += 1
+        transcript = load_transcript(row['video_id'], fetch)
+        if transcript is None or not len(transcript):
+            stats['no_transcript'] += 1
+            continue
+        before = [p.get('timestamp') for p in patterns]
+        # The raw transcript has finer timestamps than the compacted one the analysis saw
+        index = TimeIndex(transcript)
+        if hasattr(transcript, 'close'):
+            transcript.close()
+        stats['patterns'] += len(todo)
+        stats['matched'] += align_patterns(todo, index, keep_existing=True)
+        if [p.get('timestamp') for p in patterns] != before:
+            stats['changed_rows'] += 1
+            yield {'video_id': row['video_id'], 'sentence_patterns': patterns}
+    print(f"🕒 {stats['videos']} videos, {stats['matched']}/{stats['patterns']} patterns matched, "
+          f"{stats['changed_rows']} rows changed, {stats['no_transcript']} without a transcript "
+          f"({time.perf_counter() - t0:.1f}s)")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    from study_ai import get_supabase
+    client = get_supabase()
+    rows = backfill(client, realign="--all" in args, fetch="--fetch" in args)
+    if "--dry-run" in args:
+        for row in rows:
+            print(f"   {row['video_id']}: {[p.get('timestamp') for p in row['sentence_patterns']]}")
+    else:
+        BulkLoader(client, 'en_videos').load(rows)
@@ -0,0 +1,88 @@
+"""
+本機候選單字排序 (vocab_rank) 的基準：每份逐字稿的排序時間 (目標遠低於 50 ms)，
+以及 prompt 大小 (完整逐字稿 vs. 候選清單 + 逐字稿節錄，長影片依 chunked_analysis 分段加總)。
+
+    python bench_candidates.py                   # 產生 10 / 30 / 90 分鐘的樣本 (字詞取自 cefr_words.txt)
+    python bench_candidates.py a.txt b.txt       # 使用「秒數|文字」格式的逐字稿檔
+    python bench_candidates.py --cache           # 使用本機字幕快取中的所有逐字稿
+    python bench_candidates.py --verbose         # 另外列出每份逐字稿的前 15 個候選單字
+"""
+import sys
+import time
+import math
+import random
+from bench_compaction import load_samples, FILLERS
+from transcript_compact import estimate_tokens, transcript_duration
+from analysis_schema import upper_bound
+from vocab_rank import rank_candidates, load_wordlist
+
+REPEAT = 7
+# Function words that make up most of real speech
+COMMON = ("the and to of a i you it that in is we so this what for they have but be on just like "
+          "not do with know can there about going get think really one if all was my your").split()
+
+def make_transcript(minutes, seed=0):
+    """Speech-like sample: Zipf-distributed words from the CEFR list between common function words."""
+    rnd = random.Random(seed)
+    words = sorted(load_wordlist()[0])
+    rnd.shuffle(words)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    lines = []
+    t = 0.0
+    while t < minutes * 60:
+        fragment = []
+        for _ in range(rnd.randint(6, 12)):
+            x = rnd.random()
+            if x < 0.55:
+                fragment.append(rnd.choice(COMMON))
+            elif x < 0.6:
+                fragment.append(rnd.choice(FILLERS))
+            else:
+                fragment.append(rnd.choices(words, weights)[0])
+        lines.append(f"{int(t)}|{' '.join(fragment)}")
+        t += 2 + rnd.random() * 2
+    return "\n".join(lines)
+
+def prompt_tokens(study_ai, text, ranked):
+    """Estimated prompt tokens for one transcript, summed over the windows of a long video."""
+    from chunked_analysis import split_windows
+    vocab_count, pattern_count = study_ai.target_counts(text)
+    windows = split_windows(text) if study_ai.should_chunk(text) else [text]
+    total = 0
+    n = len(windows)
+    excerpt_chars = study_ai.PATTERN_EXCERPT_CHARS if n == 1 else \
+        max(study_ai.PATTERN_EXCERPT_CHARS // n, study_ai.MIN_WINDOW_EXCERPT_CHARS)
+    for window in windows:
+        count = vocab_count if n == 1 else max(3, math.ceil(upper_bound(vocab_count) / n * 1.5))
+        if ranked:
+            candidates, excerpt = study_ai._shortlist(window, count, excerpt_chars)
+        else:
+            candidates, excerpt = None, window
+        total += estimate_tokens(study_ai.build_prompt(excerpt, count, pattern_count, candidates=candidates))
+    return total
+
+def main(args):
+    import study_ai
+    samples = load_samples(args) if [a for a in args if a != "--verbose"] else \
+        [(f"sample {m} min", make_transcript(m, seed=m)) for m in (10, 30, 90)]
+    load_wordlist()   # parsed once per process, not per transcript
+    print(f"{'sample':<16}{'min':>5}{'chars':>9}{'rank(ms)':>10}{'cands':>7}"
+          f"{'est.tok':>10}{'->':>4}{'est.tok':>9}{'saved':>7}")
+    for name, text in samples:
+        times = []
+        for _ in range(REPEAT):
+            t0 = time.perf_counter()
+            candidates = rank_candidates(text)
+            times.append(time.perf_counter() - t0)
+        before = prompt_tokens(study_ai, text, ranked=False)
+        after = prompt_tokens(study_ai, text, ranked=True)
+        minutes = (transcript_duration(text) or 0) / 60
+        print(f"{name:<16}{minutes:>5.0f}{len(text):>9}{min(times) * 1000:>10.1f}{len(candidates):>7}"
+              f"{before:>10}{'->':>4}{after:>9}{1 - after / before:>7.0%}")
+        if "--verbose" in args:
+            for c in candidates[:15]:
+                print(f"   {c['word']:<18}{c['level'] or '-':>4}{c['count']:>5}x  D={c['dispersion']:.2f}  "
+                      f"score={c['score']:.2f}  @{c['timestamps']}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
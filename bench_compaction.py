@@ -0,0 +1,93 @@
+"""
+逐字稿壓縮 (transcript_compact) 前後比較：字元數、prompt token 數，以及 50000 字元上限能涵蓋多少影片內容。
+
+    python bench_compaction.py                   # 產生 10 / 30 / 60 分鐘的 YTA 風格樣本
+    python bench_compaction.py a.txt b.txt       # 使用「秒數|文字」格式的逐字稿檔
+    python bench_compaction.py --cache           # 使用本機字幕快取中的所有逐字稿
+    python bench_compaction.py --live [...]      # 另外以 Gemini 實測 token 數與端到端延遲 (會消耗配額)
+"""
+import sys
+import time
+import random
+from transcript_compact import compact_transcript, estimate_tokens, transcript_duration
+
+PROMPT_CHAR_LIMIT = 50000
+
+WORDS = ("so I think the most important thing is that you actually figure out what works for you "
+         "and then you keep doing it every single day because consistency is what makes the difference "
+         "when it comes to learning a new language it's not about talent").split()
+FILLERS = ["um", "uh", "you know", "like", "[Music]", "[Laughter]", "so so"]
+
+def make_yta_transcript(minutes, seed=0):
+    """YTA 自動字幕風格：每 2-4 秒一個 4-9 字的片段，夾雜填充詞與少量重疊。"""
+    rnd = random.Random(seed)
+    lines = []
+    t = 0.0
+    prev_tail = []
+    while t < minutes * 60:
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(4, 9))]
+        if rnd.random() < 0.3:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(FILLERS))
+        if prev_tail and rnd.random() < 0.2:
+            words = prev_tail + words
+        if rnd.random() < 0.15:
+            words[-1] += "."
+        lines.append(f"{int(t)}|{' '.join(words)}")
+        prev_tail = words[-2:]
+        t += 2 + rnd.random() * 2
+    return "\n".join(lines)
+
+def coverage(text):
+    """Share of the video (by timestamp) that survives the [:50000] prompt cut."""
+    total = transcript_duration(text)
+    if not total:
+        return 1.0
+    kept = transcript_duration(text[:PROMPT_CHAR_LIMIT].rpartition('\n')[0] or text[:PROMPT_CHAR_LIMIT])
+    return min((kept or 0) / total, 1.0)
+
+def load_samples(args):
+    if "--cache" in args:
+        from transcript_cache import TranscriptCache
+        cache = TranscriptCache()
+        rows = cache.conn.execute("SELECT DISTINCT video_id FROM tracks").fetchall()
+        return [(row['video_id'], cache.get(row['video_id'])[0]) for row in rows if cache.get(row['video_id'])]
+    paths = [a for a in args if not a.startswith("--")]
+    if paths:
+        samples = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples.append((path[-16:], f.read()))
+        return samples
+    return [(f"yta {m} min", make_yta_transcript(m)) for m in (10, 30, 60)]
+
+def measure_live(before, after):
+    """Gemini 實測：prompt token 數 (count_tokens) 與 generate_content 的端到端延遲。"""
+    import study_ai
+    results = []
+    for text in (before, after):
+        vocab_count, pattern_count = study_ai.target_counts(text)
+        prompt = study_ai.build_prompt(text, vocab_count, pattern_count)
+        tokens = study_ai.key_pool.call(
+            lambda c: c.models.count_tokens(model=study_ai.MODEL_NAME, contents=prompt)).total_tokens
+        t0 = time.perf_counter()
+        study_ai.key_pool.call(lambda c: c.models.generate_content(model=study_ai.MODEL_NAME, contents=prompt))
+        results.append((tokens, time.perf_counter() - t0))
+    return results
+
+def main(args):
+    live = "--live" in args
+    print(f"{'sample':<16}{'chars':>9}{'->':>4}{'chars':>8}{'est.tok':>9}{'->':>4}{'est.tok':>8}"
+          f"{'coverage':>10}{'->':>4}{'cov.':>6}{'compact(ms)':>13}")
+    for name, text in load_samples(args):
+        t0 = time.perf_counter()
+        compacted = compact_transcript(text)
+        elapsed = (time.perf_counter() - t0) * 1000
+        print(f"{name:<16}{len(text):>9}{'->':>4}{len(compacted):>8}"
+              f"{estimate_tokens(text[:PROMPT_CHAR_LIMIT]):>9}{'->':>4}{estimate_tokens(compacted[:PROMPT_CHAR_LIMIT]):>8}"
+              f"{coverage(text):>10.0%}{'->':>4}{coverage(compacted):>6.0%}{elapsed:>13.1f}")
+        if live:
+            (tok_before, lat_before), (tok_after, lat_after) = measure_live(text, compacted)
+            print(f"{'  gemini':<16}prompt tokens {tok_before} -> {tok_after}, latency {lat_before:.1f}s -> {lat_after:.1f}s")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
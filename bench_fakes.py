@@ -0,0 +1,572 @@
+"""
+bench_worker.py 使用的本機替身 (不消耗任何配額)：
+- FakeBackend：localhost HTTP 伺服器，同時扮演 Supabase PostgREST (en_videos 表與佇列 RPC)、
+  Gemini generateContent 端點，以及 yt-dlp 字幕軌的 VTT 下載網址。
+  worker 透過真正的 supabase / google-genai 用戶端連線 (SUPABASE_URL、GOOGLE_GEMINI_BASE_URL)。
+- install_youtube_fakes()：在 worker 行程內替換 youtube_transcript_api 與 yt_dlp 的擷取。
+每個服務都可以設定平均延遲與錯誤率 (429 / 503)。
+"""
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from bench_compaction import make_yta_transcript
+from bench_vtt import make_auto_caption_vtt
+
+class Faults:
+    """
+    One fake service: mean latency in seconds (log-normal, so there is a realistic tail)
+    and the share of requests answered with 429 / 503. truncate_rate only applies to Gemini
+    (the JSON answer is cut in half, like a response that hit max_output_tokens), and so does
+    output_tps: the answer takes output_tokens / output_tps seconds longer, like a model
+    generating tokens.
+    """
+    def __init__(self, latency=0.0, rate_429=0.0, rate_503=0.0, truncate_rate=0.0, seed=0, output_tps=0.0):
+        self.latency = latency
+        self.output_tps = output_tps
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.truncate_rate = truncate_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self):
+        if self.latency > 0:
+            with self._lock:
+                seconds = self.latency * self._rng.lognormvariate(-0.125, 0.5)   # mean == latency
+            time.sleep(seconds)
+
+    def error(self):
+        """Returns the status code to inject (429 / 503) or None."""
+        x = self._random()
+        if x < self.rate_429:
+            return 429
+        if x < self.rate_429 + self.rate_503:
+            return 503
+        return None
+
+    def generate(self, output_tokens):
+        if self.output_tps > 0:
+            time.sleep(output_tokens / self.output_tps)
+
+    def truncate(self):
+        return self.truncate_rate > 0 and self._random() < self.truncate_rate
+
+    def to_dict(self):
+        return {'latency': self.latency, 'rate_429': self.rate_429, 'rate_503': self.rate_503,
+                'truncate_rate': self.truncate_rate, 'seed': self.seed,
+                'output_tps': self.output_tps}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+# --- Sample data ---
+
+def video_ids(count):
+    """11-character ids like real YouTube ones."""
+    return [f"bench{i:06d}" for i in range(count)]
+
+def make_yta_snippets(index, minutes):
+    """youtube_transcript_api 風格的片段 [{'start', 'duration', 'text'}]，內容依 index 不同。"""
+    snippets = []
+    for line in make_yta_transcript(minutes, seed=index).split("\n"):
+        seconds, _, text = line.partition("|")
+        snippets.append({'start': float(seconds), 'duration': 3.0, 'text': text})
+    return snippets
+
+def make_vtt(index, minutes):
+    return make_auto_caption_vtt(minutes, seed=index).encode('utf-8')
+
+_SYLLABLES = ("ba", "ce", "di", "fo", "gu", "ka", "le", "mi", "no", "pu", "ra", "se", "ti", "vo", "wu", "ze")
+
+def fake_analysis(seed, vocab_count, pattern_count, transcript_lines=(), known_words=()):
+    """
+    An analysis shaped like Gemini's answer (RESPONSE_SCHEMA). Up to half of the words are taken
+    from the transcript, the rest are made up; words in known_words come back as {"word": ...} only,
+    as the prompt asks when it lists lexicon words. Pattern examples are quoted from the transcript.
+    """
+    rng = random.Random(seed)
+    transcript_lines = [line for line in transcript_lines if len(line.split()) >= 4] or ["It is consistency that matters"]
+    candidates = sorted({w for line in transcript_lines for w in line.split() if w.isalpha() and len(w) >= 5})
+    rng.shuffle(candidates)
+    words = set(candidates[:vocab_count // 2])
+    while len(words) < vocab_count:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    known_words = set(known_words)
+    return {
+        'category': ["生活 (Daily)"],
+        'vocabulary': [{'word': word} if word in known_words else {
+            'word': word,
+            'phonetic': f"/{word}/",
+            'definition': f"a made-up word used to benchmark the worker ({word})",
+            'definition_zh': "基準測試用的假單字",
+            'example': f"We keep saying {word} because it is in the benchmark.",
+            'example_zh': "因為基準測試，我們一直說這個字。",
+        } for word in sorted(words)],
+        'sentence_patterns': [{
+            'structure': f"It is {rng.choice(_SYLLABLES)}{i} that ...",
+            'usage': "強調句型",
+            'example': " ".join(rng.choice(transcript_lines).split()[:12]),
+        } for i in range(pattern_count)],
+    }
+
+# "整理出 12-15 個核心單字" / "再補充 3 個不重複的核心單字與 2 個不重複的常用句型"
+_VOCAB_RE = re.compile(r"(\d+)(?:-(\d+))? 個(?:不重複的)?核心單字")
+_PATTERN_RE = re.compile(r"(\d+)(?:-(\d+))? 個(?:不重複的)?常用句型")
+# The transcript is the last section of the prompt, one segment per line
+_TRANSCRIPT_RE = re.compile(r"逐字稿(?:內容|節錄)[^\n]*：\n(.*)", re.DOTALL)
+# study_ai._lexicon_note: the known words follow on the next line
+_KNOWN_RE = re.compile(r"清單以外的單字仍需完整欄位：\s*\n\s*(.+)")
+
+def _requested(regex, prompt, default):
+    match = regex.search(prompt)
+    return int(match.group(2) or match.group(1)) if match else default
+
+def _transcript_lines(prompt):
+    match = _TRANSCRIPT_RE.search(prompt)
+    return [line.strip() for line in match.group(1).splitlines() if line.strip()] if match else []
+
+def answer_prompt(prompt):
+    """Answer a study_ai prompt with the number of items it asks for."""
+    known = _KNOWN_RE.search(prompt)
+    return fake_analysis(zlib.crc32(prompt.encode('utf-8')),
+                         _requested(_VOCAB_RE, prompt, 15),
+                         _requested(_PATTERN_RE, prompt, 8),
+                         _transcript_lines(prompt),
+                         [w.strip() for w in known.group(1).split(',')] if known else ())
+
+# --- Fake backend (PostgREST + Gemini + VTT) ---
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _iso(moment):
+    return moment.isoformat()
+
+def _split_top(text):
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    return parts + [current]
+
+def _compare(value, arg):
+    try:
+        return (float(value) > float(arg)) - (float(value) < float(arg))
+    except (TypeError, ValueError):
+        return (str(value) > arg) - (str(value) < arg)
+
+def _predicate(column, op, arg):
+    if op == 'in':
+        values = {v.strip().strip('"') for v in _split_top(arg.strip('()'))}
+        return lambda row: str(row.get(column)) in values
+    if op == 'is':
+        return lambda row: row.get(column) is None
+    arg = arg.strip('"')
+    if op == 'eq':
+        return lambda row: str(row.get(column)) == arg
+    if op == 'neq':
+        return lambda row: str(row.get(column)) != arg
+    accept = {'lt': (-1,), 'lte': (-1, 0), 'gt': (1,), 'gte': (0, 1)}[op]
+    return lambda row: row.get(column) is not None and _compare(row.get(column), arg) in accept
+
+def _logic(kind, inner):
+    predicates = [_condition(part) for part in _split_top(inner)]
+    combine = all if kind == 'and' else any
+    return lambda row: combine(p(row) for p in predicates)
+
+def _condition(expr):
+    """'status.eq.pending' or a nested 'and(...)' / 'or(...)' from a logic tree."""
+    for kind in ('and', 'or'):
+        if expr.startswith(kind + '('):
+            return _logic(kind, expr[len(kind) + 1:-1])
+    column, op, arg = expr.split('.', 2)
+    return _predicate(column, op, arg)
+
+def _filters(query):
+    """PostgREST query string -> (row predicates, limit). Supports eq / neq / lt(e) / gt(e) / in / is and or / and trees."""
+    predicates = []
+    limit = None
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key in ('select', 'on_conflict', 'columns', 'order', 'offset'):
+            continue
+        if key == 'limit':
+            limit = int(value)
+        elif key in ('or', 'and'):
+            predicates.append(_logic(key, value[1:-1]))
+        else:
+            op, _, arg = value.partition('.')
+            predicates.append(_predicate(key, op, arg))
+    return predicates, limit
+
+def _error_body(service, status):
+    if service == 'gemini':
+        if status == 429:
+            return {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                              'message': "Resource has been exhausted (e.g. check quota).",
+                              'details': [{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '1s'}]}}
+        return {'error': {'code': 503, 'status': 'UNAVAILABLE',
+                          'message': "The model is overloaded. Please try again later."}}
+    if service == 'db':
+        return {'code': str(status), 'message': "Service Unavailable", 'details': None, 'hint': None}
+    return {'error': "Too Many Requests"}
+
+class FakeBackend(ThreadingHTTPServer):
+    """
+    en_videos 存在記憶體中；claim / heartbeat / fail / reap 的行為與 lease_retries.sql 相同。
+    served 記錄每個服務回應過的狀態碼數量 (含注入的錯誤)。
+    """
+    daemon_threads = True
+
+    def __init__(self, db=None, gemini=None, youtube=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.faults = {'db': db or Faults(), 'gemini': gemini or Faults(), 'youtube': youtube or Faults()}
+        self.rows = {}        # video_id -> row, in insertion (created_at) order
+        self.vtt = {}         # video_id -> VTT bytes
+        self.served = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-backend").start()
+        return self
+
+    def reset(self, pending_ids=(), vtt=None):
+        with self.lock:
+            self.rows = {video_id: {'video_id': video_id, 'status': 'pending', 'attempt_count': 0,
+                                    'next_attempt_at': None, 'lease_owner': None, 'lease_expires_at': None}
+                         for video_id in pending_ids}
+            self.vtt = vtt or {}
+            self.served.clear()
+
+    def record(self, service, status):
+        with self.lock:
+            self.served[service][status] += 1
+
+    def status_counts(self):
+        with self.lock:
+            counts = defaultdict(int)
+            for row in self.rows.values():
+                counts[row.get('status')] += 1
+            return dict(counts)
+
+    def served_summary(self):
+        with self.lock:
+            return {service: {str(status): n for status, n in by_status.items()}
+                    for service, by_status in self.served.items()}
+
+    # --- Table operations ---
+
+    def select(self, predicates, limit=None):
+        with self.lock:
+            rows = [dict(row) for row in self.rows.values() if all(p(row) for p in predicates)]
+        return (rows[:limit] if limit is not None else rows), len(rows)
+
+    def update(self, predicates, payload):
+        with self.lock:
+            updated = []
+            for row in self.rows.values():
+                if all(p(row) for p in predicates):
+                    row.update(payload)
+                    updated.append(dict(row))
+            return updated
+
+    def upsert(self, rows, ignore_duplicates=False):
+        with self.lock:
+            written = []
+            for row in rows:
+                existing = self.rows.get(row.get('video_id'))
+                if existing is not None:
+                    if ignore_duplicates:
+                        continue
+                    existing.update(row)
+                    written.append(dict(existing))
+                else:
+                    self.rows[row.get('video_id')] = dict(row)
+                    written.append(dict(row))
+            return written
+
+    # --- Queue functions (lease_retries.sql) ---
+
+    def rpc(self, name, params):
+        fn = getattr(self, f"_rpc_{name}", None)
+        if fn is None:
+            raise KeyError(name)
+        with self.lock:
+            return fn(**params)
+
+    def _rpc_claim_en_videos(self, p_worker, p_limit=1, p_lease_seconds=600):
+        now = _now()
+        claimed = []
+        for row in self.rows.values():
+            if len(claimed) >= p_limit:
+                break
+            due = row.get('next_attempt_at') is None or datetime.fromisoformat(row['next_attempt_at']) <= now
+            if row.get('status') == 'pending' and due:
+                row.update(status='processing', lease_owner=p_worker,
+                           lease_expires_at=_iso(now + timedelta(seconds=p_lease_seconds)),
+                           attempt_count=(row.get('attempt_count') or 0) + 1)
+                claimed.append(dict(row))
+        return claimed
+
+    def _rpc_heartbeat_en_videos(self, p_worker, p_video_ids, p_lease_seconds=600):
+        held = []
+        for video_id in p_video_ids:
+            row = self.rows.get(video_id)
+            if row and row.get('lease_owner') == p_worker and row.get('status') == 'processing':
+                row['lease_expires_at'] = _iso(_now() + timedelta(seconds=p_lease_seconds))
+                held.append(video_id)
+        return held
+
+    def _retry_at(self, attempts, base_delay):
+        return _iso(_now() + timedelta(seconds=min(base_delay * 2 ** max(attempts - 1, 0), 6 * 3600)))
+
+    def _rpc_fail_en_videos(self, p_worker, p_video_id, p_error, p_retryable=True,
+                            p_max_attempts=5, p_base_delay_seconds=60):
+        row = self.rows.get(p_video_id)
+        if not row or row.get('lease_owner') not in (p_worker, None):
+            return []
+        attempts = row.get('attempt_count') or 0
+        if not p_retryable:
+            status, retry_at = 'error', None
+        elif attempts >= p_max_attempts:
+            status, retry_at = 'dead', None
+        else:
+            status, retry_at = 'pending', self._retry_at(attempts, p_base_delay_seconds)
+        row.update(status=status, next_attempt_at=retry_at, processing_error=p_error,
+                   lease_owner=None, lease_expires_at=None)
+        return [dict(row)]
+
+    def _rpc_reap_en_videos(self, p_max_attempts=5, p_base_delay_seconds=60):
+        now = _now()
+        reaped = []
+        for row in self.rows.values():
+            expires = row.get('lease_expires_at')
+            if row.get('status') == 'processing' and expires and datetime.fromisoformat(expires) < now:
+                attempts = row.get('attempt_count') or 0
+                dead = attempts >= p_max_attempts
+                row.update(status='dead' if dead else 'pending',
+                           next_attempt_at=None if dead else self._retry_at(attempts, p_base_delay_seconds),
+                           processing_error='Lease expired (worker stopped responding)',
+                           lease_owner=None, lease_expires_at=None)
+                reaped.append(dict(row))
+        return reaped
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real services
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else None
+
+    def _send(self, status, payload=None, headers=None, raw=None, content_type="application/json"):
+        if raw is None:
+            raw = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(raw)
+
+    def _service(self, path):
+        if path.startswith('/rest/v1/'):
+            return 'db'
+        if path.endswith(':generateContent'):
+            return 'gemini'
+        if path.startswith('/vtt/'):
+            return 'youtube'
+        return None
+
+    def _handle(self):
+        # Always consume the body first so the keep-alive connection stays in sync
+        body = self._read_body() if self.command in ('POST', 'PATCH') else None
+        path = urlsplit(self.path).path
+        service = self._service(path)
+        if service is None:
+            return self._send(404, {'error': f"no fake for {path}"})
+
+        faults = self.server.faults[service]
+        faults.delay()
+        status = faults.error()
+        if status:
+            self.server.record(service, status)
+            return self._send(status, _error_body(service, status))
+
+        if service == 'db':
+            status = self._postgrest(path, body)
+        elif service == 'gemini':
+            status = self._gemini(path, body, faults)
+        else:
+            status = self._vtt(path)
+        self.server.record(service, status)
+
+    do_GET = do_HEAD = do_POST = do_PATCH = _handle
+
+    def _postgrest(self, path, body):
+        name = path[len('/rest/v1/'):]
+        prefer = self.headers.get('Prefer', '')
+        if name.startswith('rpc/'):
+            try:
+                rows = self.server.rpc(name[len('rpc/'):], body or {})
+            except KeyError:
+                self._send(404, {'code': 'PGRST202', 'message': f"Could not find the function public.{name[4:]}"})
+                return 404
+            self._send(200, rows)
+            return 200
+        if name != 'en_videos':
+            self._send(404, {'code': '42P01', 'message': f'relation "public.{name}" does not exist'})
+            return 404
+
+        predicates, limit = _filters(urlsplit(self.path).query)
+        if self.command in ('GET', 'HEAD'):
+            rows, total = self.server.select(predicates, limit)
+            headers = {}
+            if 'count=' in prefer:
+                headers['Content-Range'] = f"0-{len(rows) - 1}/{total}" if rows else f"*/{total}"
+            self._send(200, rows, headers)
+            return 200
+
+        if self.command == 'PATCH':
+            rows = self.server.update(predicates, body or {})
+        else:
+            rows = self.server.upsert(body if isinstance(body, list) else [body],
+                                      ignore_duplicates='ignore-duplicates' in prefer)
+        if 'return=representation' in prefer:
+            self._send(200 if self.command == 'PATCH' else 201, rows)
+            return 200
+        self._send(204)
+        return 204
+
+    def _gemini(self, path, body, faults):
+        prompt = "".join(part.get('text', '')
+                         for content in (body or {}).get('contents', [])
+                         for part in content.get('parts', []))
+        text = json.dumps(answer_prompt(prompt), ensure_ascii=False)
+        finish_reason = "STOP"
+        if faults.truncate():
+            text, finish_reason = text[:len(text) // 2], "MAX_TOKENS"
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        faults.generate(output_tokens)
+        self._send(200, {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]},
+                            'finishReason': finish_reason, 'index': 0}],
+            'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': output_tokens,
+                              'totalTokenCount': prompt_tokens + output_tokens},
+            'modelVersion': path.rsplit('/', 1)[-1].split(':')[0],
+        })
+        return 200
+
+    def _vtt(self, path):
+        vtt = self.server.vtt.get(path[len('/vtt/'):])
+        if vtt is None:
+            self._send(404, {'error': "no such caption track"})
+            return 404
+        self._send(200, raw=vtt, content_type="text/vtt")
+        return 200
+
+# --- In-process YouTube fakes (youtube_transcript_api / yt_dlp) ---
+
+def _raise_if_blocked(faults, message):
+    if faults.error():
+        raise Exception(message)
+
+class _FakeTranscript:
+    def __init__(self, snippets, faults):
+        self.snippets = snippets
+        self.faults = faults
+        self.language_code = 'en'
+        self.is_generated = True
+
+    def fetch(self):
+        self.faults.delay()
+        _raise_if_blocked(self.faults, "RequestBlocked: YouTube is blocking requests from your IP (429 Too Many Requests)")
+        return [dict(snippet) for snippet in self.snippets]
+
+class _FakeTranscriptList:
+    def __init__(self, transcript):
+        self.transcript = transcript
+
+    def find_transcript(self, language_codes):
+        return self.transcript
+
+    def find_generated_transcript(self, language_codes):
+        return self.transcript
+
+    def __iter__(self):
+        return iter([self.transcript])
+
+def install_youtube_fakes(transcripts, vtt_base_url, faults):
+    """
+    transcripts: {video_id: YTA snippets}. yt-dlp 的字幕軌網址指向 FakeBackend 的 /vtt/<video_id>，
+    所以 download_caption 仍是一次真正的 HTTP 下載。
+    """
+    import yt_dlp
+    import youtube_transcript_api
+
+    class FakeTranscriptApi:
+        @staticmethod
+        def list_transcripts(video_id):
+            faults.delay()
+            _raise_if_blocked(faults, "RequestBlocked: YouTube is blocking requests from your IP (429 Too Many Requests)")
+            snippets = transcripts.get(video_id)
+            if snippets is None:
+                raise Exception(f"Could not retrieve a transcript for the video {video_id}: No transcripts were found")
+            return _FakeTranscriptList(_FakeTranscript(snippets, faults))
+
+    class FakeYoutubeDL:
+        def __init__(self, params=None):
+            self.params = params
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False):
+            video_id = url.rsplit('=', 1)[-1]
+            faults.delay()
+            _raise_if_blocked(faults, f"ERROR: [youtube] {video_id}: Sign in to confirm you're not a bot")
+            snippets = transcripts.get(video_id) or [{'start': 0}]
+            return {
+                'id': video_id,
+                'title': f"Benchmark video {video_id}",
+                'thumbnail': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+                'duration': int(snippets[-1]['start']) + 3,
+                'automatic_captions': {'en': [{'ext': 'vtt', 'url': f"{vtt_base_url}/vtt/{video_id}"}]},
+            }
+
+    youtube_transcript_api.YouTubeTranscriptApi = FakeTranscriptApi
+    yt_dlp.YoutubeDL = FakeYoutubeDL
@@ -0,0 +1,102 @@
+"""
+批次 SRS 排程 (srs_scheduler) 的基準：以合成的 en_study_progress 資料列 (預設 10 萬 / 30 萬張卡片、
+各 10% 有新評分) 比較逐筆計算複習間隔與 NumPy 批次計算，並量測解析資料列與建立每日佇列的時間。
+
+    python bench_srs.py                  # 100000 與 300000 張卡片
+    python bench_srs.py 500000           # 指定卡片數
+"""
+import sys
+import math
+import time
+import random
+from datetime import datetime, timedelta
+import numpy as np
+import srs_scheduler as srs
+
+REVIEW_SHARE = 0.1
+
+def make_rows(count, now, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        interval = rnd.choice((0, 1, 3, 6, 15, 40, 120))
+        due = now + timedelta(days=rnd.randint(-10, 60), seconds=rnd.randint(0, 86399))
+        rows.append({
+            'id': f"00000000-0000-0000-0000-{i:012d}",
+            'video_id': f"vid{i % 5000:08d}",
+            'word': f"word{i}",
+            'status': rnd.choice(srs.STATUSES),
+            'interval': interval,
+            'streak': rnd.randint(0, 8),
+            'next_review_date': due.isoformat() + "+00:00",
+            'last_reviewed_at': (due - timedelta(days=interval)).isoformat() + "+00:00",
+        })
+    return rows
+
+def make_reviews(count, cards, now, seed=0):
+    rnd = random.Random(seed + 1)
+    index = np.array([rnd.randrange(cards) for _ in range(count)], dtype=np.int64)
+    quality = np.array([rnd.choice((0, 3, 4, 5)) for _ in range(count)], dtype=np.int64)
+    at = np.datetime64(now, 's') - np.array([rnd.randint(0, 86400) for _ in range(count)]).astype('timedelta64[s]')
+    return index, quality, at
+
+def next_review_scalar(interval, streak, quality):
+    """The same step as srs_scheduler.next_review, one card at a time (as the review page does it)."""
+    if quality == 0:
+        return srs.LAPSE_INTERVAL, 0, srs.LEARNING
+    if quality == 3:
+        return max(1, math.floor(interval * srs.HARD_FACTOR)), streak + 1, srs.REVIEW
+    if quality == 4:
+        return max(1, math.floor(max(interval, 1) * srs.GOOD_FACTOR)), streak + 1, srs.REVIEW
+    if quality == 5:
+        return max(srs.MIN_EASY_INTERVAL, math.floor(max(interval, 1) * srs.EASY_FACTOR)), streak + 1, srs.MASTERED
+    return 1, streak + 1, srs.REVIEW
+
+def apply_one_by_one(rows, index, quality, at):
+    state = {i: (row['interval'], row['streak'], None) for i, row in enumerate(rows)}
+    order = sorted(range(len(index)), key=lambda k: (int(at[k].astype(np.int64)), k))
+    for k in order:
+        i = int(index[k])
+        interval, streak, _ = state[i]
+        state[i] = next_review_scalar(interval, streak, int(quality[k]))
+    return state
+
+def main(args):
+    sizes = [int(a) for a in args] or [100000, 300000]
+    now = datetime(2026, 10, 18, 12, 0, 0)
+    print(f"{'cards':>8}{'reviews':>9}{'parse(ms)':>11}{'loop(ms)':>10}{'numpy(ms)':>11}{'speedup':>9}"
+          f"{'queues(ms)':>12}{'queued':>8}{'rows(ms)':>10}")
+    for size in sizes:
+        rows = make_rows(size, now)
+        index, quality, at = make_reviews(int(size * REVIEW_SHARE), size, now)
+
+        t0 = time.perf_counter()
+        cards = srs.Cards(rows, np.datetime64(now, 's'))
+        t_parse = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        expected = apply_one_by_one(rows, index, quality, at)
+        t_loop = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        srs.apply_reviews(cards, index, quality, at)
+        t_numpy = time.perf_counter() - t0
+
+        for i in np.unique(index)[:2000].tolist():
+            assert (cards.interval[i], cards.streak[i], cards.status[i]) == expected[i], i
+
+        t0 = time.perf_counter()
+        queue_index, day, position = srs.build_queues(cards, np.datetime64(now, 'D'))
+        t_queues = time.perf_counter() - t0
+
+        details = {(cards.video_ids[i], cards.words[i]): {'definition': 'x'} for i in queue_index.tolist()}
+        t0 = time.perf_counter()
+        srs.queue_rows(cards, queue_index, day, position, details, "2026-10-18T12:00:00Z")
+        cards.changed_rows()
+        t_rows = time.perf_counter() - t0
+
+        print(f"{size:>8}{len(index):>9}{t_parse * 1000:>11.0f}{t_loop * 1000:>10.0f}{t_numpy * 1000:>11.1f}"
+              f"{t_loop / t_numpy:>8.0f}x{t_queues * 1000:>12.1f}{len(queue_index):>8}{t_rows * 1000:>10.0f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
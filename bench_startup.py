@@ -0,0 +1,129 @@
+"""
+啟動時間基準 (cron 每 15 分鐘啟動一次 worker，大部分時候佇列是空的)：
+- `import worker` / `import study_ai` 的時間 (python -X importtime，取多次的最小值) 與最慢的模組
+- 匯入後是否載入了應該延遲載入的重量級模組 (yt_dlp、google.genai、supabase、youtube_transcript_api、numpy)
+- 對本機假 PostgREST (bench_fakes.FakeBackend，空佇列) 執行 `python worker.py --batch` 的總時間
+任一項超過門檻時以 exit 1 結束，可以放進 CI 防止退化。
+
+    python bench_startup.py
+    python bench_startup.py --max-import-ms 300 --max-empty-run-ms 1000 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("yt_dlp", "google.genai", "supabase", "youtube_transcript_api", "httpx", "numpy")
+
+def _env(workdir, base_url="http://127.0.0.1:9"):
+    env = dict(os.environ)
+    env.update({
+        'CACHE_DIR': os.path.join(workdir, "cache"),
+        'SUPABASE_URL': base_url,
+        'SUPABASE_KEY': "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYmVuY2gifQ.bench",
+        'GOOGLE_API_KEYS': "bench-key-0000",
+        'PYTHONIOENCODING': 'utf-8',
+    })
+    return env
+
+def _parse_importtime(stderr):
+    """-X importtime lines -> {module: (self us, cumulative us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue   # header line
+        modules[fields[2].strip()] = (self_us, cumulative_us)
+    return modules
+
+def measure_import(module, repeat, workdir):
+    """Best of `repeat` fresh interpreters: (ms, slowest (name, ms) list, heavy modules loaded)."""
+    code = f"import {module}, sys, json; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    best, slowest, heavy = None, [], []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO, env=_env(workdir),
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        modules = _parse_importtime(proc.stderr)
+        total = modules[module][1] / 1000
+        if best is None or total < best:
+            best = total
+            # Slowest modules by self time
+            slowest = sorted(((name, self_us / 1000) for name, (self_us, _) in modules.items()),
+                             key=lambda item: -item[1])[:8]
+        heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    return best, slowest, heavy
+
+def measure_interpreter(repeat):
+    """Wall time of `python -c pass`, the floor for any cron run."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        elapsed = (time.perf_counter() - t0) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def measure_empty_run(repeat, workdir):
+    """`python worker.py --batch` against an empty fake queue: (best ms, requests served, last output line)."""
+    from bench_fakes import FakeBackend
+    backend = FakeBackend().start()
+    try:
+        best, output = None, ""
+        for _ in range(repeat):
+            backend.reset()
+            t0 = time.perf_counter()
+            proc = subprocess.run([sys.executable, os.path.join(REPO, "worker.py"), "--batch"], cwd=workdir,
+                                  env=_env(workdir, backend.base_url), capture_output=True, text=True)
+            elapsed = (time.perf_counter() - t0) * 1000
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+            best = elapsed if best is None else min(best, elapsed)
+            output = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ""
+        return best, backend.served_summary(), output
+    finally:
+        backend.shutdown()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Worker start-up / import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=400, help="Fail if `import worker` takes longer")
+    parser.add_argument("--max-empty-run-ms", type=float, default=1000,
+                        help="Fail if `worker.py --batch` on an empty queue takes longer")
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        print(f"🐍 Interpreter start-up (python -c pass): {measure_interpreter(args.repeat):.0f} ms")
+        for module in ("study_ai", "worker"):
+            ms, slowest, heavy = measure_import(module, args.repeat, workdir)
+            print(f"\n📦 import {module}: {ms:.1f} ms")
+            for name, self_ms in slowest:
+                print(f"   {name:<40}{self_ms:>8.1f} ms")
+            if heavy:
+                failures.append(f"import {module} loads {', '.join(heavy)} (should be lazy)")
+            if module == "worker" and ms > args.max_import_ms:
+                failures.append(f"import worker took {ms:.0f} ms (> {args.max_import_ms:.0f} ms)")
+
+        ms, served, output = measure_empty_run(args.repeat, workdir)
+        print(f"\n⏱️ worker.py --batch on an empty queue: {ms:.0f} ms ({output})")
+        print(f"   requests served: {served}")
+        if ms > args.max_empty_run_ms:
+            failures.append(f"empty-queue run took {ms:.0f} ms (> {args.max_empty_run_ms:.0f} ms)")
+
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        sys.exit(1)
+    print("\n✅ Start-up within limits")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
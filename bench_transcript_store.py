@@ -0,0 +1,87 @@
+"""
+逐字稿儲存格式比較：字串形式 (transcripts.sqlite3 的 zlib 文字，讀出後 parse_timestamped)
+vs. 二進位形式 (transcript_store 的 .trs，mmap 開啟)。比較檔案大小、讀出所有 (秒數, 文字) 段落的時間、
+取出中間 10 分鐘的時間 (兩邊的輸出相同)，以及建立 TimeIndex 的時間與 Python heap 峰值 (tracemalloc)。
+
+    python bench_transcript_store.py                 # 產生 30 / 90 / 180 分鐘的 YTA 風格樣本
+    python bench_transcript_store.py a.txt b.txt     # 使用「秒數|文字」格式的逐字稿檔
+    python bench_transcript_store.py --cache         # 使用本機字幕快取中的所有逐字稿
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from bench_compaction import make_yta_transcript, load_samples
+from transcript_cache import TranscriptCache
+from transcript_compact import parse_timestamped, transcript_duration
+from transcript_store import TranscriptStore
+from time_index import TimeIndex
+
+REPEAT = 5
+WINDOW_SECONDS = 600
+
+def measure(fn):
+    """(best seconds over REPEAT runs, peak Python heap bytes of one run)"""
+    times = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+def _string_text(cache, video_id):
+    return cache.get(video_id)[0]
+
+def _string_load(cache, video_id):
+    return list(parse_timestamped(_string_text(cache, video_id)))
+
+def _string_window(cache, video_id, t0):
+    text = _string_text(cache, video_id)
+    return [(sec, body) for sec, body in parse_timestamped(text) if t0 <= sec < t0 + WINDOW_SECONDS]
+
+def _binary_load(store, video_id):
+    with store.open(video_id) as transcript:
+        return list(transcript)
+
+def _binary_window(store, video_id, t0):
+    with store.open(video_id) as transcript:
+        return list(transcript.between(t0, t0 + WINDOW_SECONDS))
+
+def _binary_index(store, video_id):
+    with store.open(video_id) as transcript:
+        return TimeIndex(transcript)
+
+def main(args):
+    samples = load_samples(args) if args else \
+        [(f"sample {m} min", make_yta_transcript(m, seed=m)) for m in (30, 90, 180)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptCache(os.path.join(tmp, "transcripts.sqlite3"))
+        store = TranscriptStore(os.path.join(tmp, "transcripts"))
+        print(f"{'sample':<16}{'min':>5}{'step':>8}{'string ms':>11}{'KiB':>9}{'binary ms':>11}{'KiB':>9}{'speedup':>9}")
+        for i, (name, text) in enumerate(samples):
+            video_id = f"bench{i:06d}"
+            cache.put(video_id, text)
+            store.put(video_id, text)
+            minutes = (transcript_duration(text) or 0) / 60
+            t0 = int(minutes * 30)   # the middle ten minutes
+            zipped = cache.conn.execute("SELECT b.size FROM tracks t JOIN blobs b USING (content_hash) "
+                                        "WHERE t.video_id = ?", (video_id,)).fetchone()[0]
+            print(f"{name:<16}{minutes:>5.0f}{'size':>8}{'':>11}{(zipped or 0) / 1024:>9.0f}{'':>11}"
+                  f"{os.path.getsize(store.path(video_id)) / 1024:>9.0f}   (text {len(text.encode('utf-8')) / 1024:.0f} KiB)")
+            steps = [
+                ('load', lambda: _string_load(cache, video_id), lambda: _binary_load(store, video_id)),
+                ('window', lambda: _string_window(cache, video_id, t0), lambda: _binary_window(store, video_id, t0)),
+                ('index', lambda: TimeIndex(_string_text(cache, video_id)), lambda: _binary_index(store, video_id)),
+            ]
+            for step, string_fn, binary_fn in steps:
+                (ts, ms), (tb, mb) = measure(string_fn), measure(binary_fn)
+                print(f"{'':<16}{'':>5}{step:>8}{ts * 1000:>11.2f}{ms / 1024:>9.0f}{tb * 1000:>11.2f}{mb / 1024:>9.0f}"
+                      f"{ts / tb:>8.1f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
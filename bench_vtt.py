@@ -0,0 +1,154 @@
+"""
+VTT 解析 micro-benchmark：比較舊的 clean_vtt_text / parse_vtt_with_timestamps
+與單次掃描的 vtt_parser.iter_vtt_cues (解析時間與輸出大小)。
+
+    python bench_vtt.py                 # 產生 10 / 30 / 90 分鐘的 YouTube 自動字幕樣本
+    python bench_vtt.py some_video.vtt  # 使用真實的 VTT 檔
+"""
+import re
+import sys
+import html
+import time
+import random
+from vtt_parser import iter_vtt_cues, format_timestamped, format_plain
+
+# --- Baseline: the functions study_ai.py used before vtt_parser (kept verbatim for comparison) ---
+
+def legacy_clean_vtt_text(vtt_content):
+    lines = vtt_content.splitlines()
+    text_lines = []
+    timestamp_pattern = re.compile(r'\d{2}:\d{2}:\d{2}\.\d{3}\s-->\s\d{2}:\d{2}:\d{2}\.\d{3}')
+    seen_lines = set()
+    is_header = True
+    for line in lines:
+        line = line.strip()
+        if is_header and not line:
+            is_header = False
+            continue
+        if not line: continue
+        if is_header:
+            if line == 'WEBVTT': continue
+            if line.startswith('Kind:'): continue
+            if line.startswith('Language:'): continue
+            if line.startswith('Style:'): continue
+            if line.startswith('::cue'): continue
+            if timestamp_pattern.match(line) or '-->' in line:
+                is_header = False
+        if not line: continue
+        if line.startswith('NOTE '): continue
+        if timestamp_pattern.match(line):
+            is_header = False
+            continue
+        if '-->' in line:
+            is_header = False
+            continue
+        clean_line = re.sub(r'<[^>]+>', '', line)
+        clean_line = html.unescape(clean_line)
+        clean_line = clean_line.strip()
+        if not clean_line: continue
+        if clean_line in ['WEBVTT', 'Kind: captions', 'Language: en']: continue
+        if clean_line in seen_lines:
+            pass
+        else:
+            text_lines.append(clean_line)
+            seen_lines.add(clean_line)
+    unique_lines = []
+    last_line = ""
+    for tl in text_lines:
+        if tl != last_line:
+            unique_lines.append(tl)
+            last_line = tl
+    return " ".join(unique_lines)
+
+def legacy_parse_vtt_with_timestamps(vtt_content):
+    lines = vtt_content.splitlines()
+    output = []
+    timestamp_pattern = re.compile(r'(\d{2}):(\d{2}):(\d{2})\.(\d{3})')
+    current_start = None
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        if line == 'WEBVTT': continue
+        if '-->' in line:
+            try:
+                start_str = line.split('-->')[0].strip()
+                match = timestamp_pattern.match(start_str)
+                if match:
+                    h, m, s, ms = map(int, match.groups())
+                    current_start = h * 3600 + m * 60 + s
+            except:
+                pass
+            continue
+        if line.startswith('NOTE'): continue
+        if line.startswith('Kind:'): continue
+        if line.startswith('Language:'): continue
+        if current_start is not None:
+            clean_text = re.sub(r'<[^>]+>', '', line)
+            clean_text = html.unescape(clean_text).strip()
+            if clean_text:
+                output.append(f"{current_start}|{clean_text}")
+    return "\n".join(output)
+
+# --- Sample generator: YouTube auto-caption "rolling" layout ---
+
+WORDS = ("so I think the most important thing is that you actually figure out what works for you "
+         "and then you keep doing it every single day because consistency is what makes the difference "
+         "when it comes to learning a new language you know it's not about talent").split()
+
+def _ts(t):
+    h, rem = divmod(t, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+def make_auto_caption_vtt(minutes, seed=0):
+    """每個 cue：上一行 (重複) + 新的一行 (含 <c> 逐字時間標籤)，再接一個 10ms 的過渡 cue。"""
+    rnd = random.Random(seed)
+    out = ["WEBVTT", "Kind: captions", "Language: en", ""]
+    t = 0.0
+    prev = ""
+    while t < minutes * 60:
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(5, 9))]
+        dur = 2.5 + rnd.random()
+        step = dur / len(words)
+        karaoke = words[0] + "".join(
+            f"<{_ts(t + (i + 1) * step)}><c> {w}</c>" for i, w in enumerate(words[1:]))
+        plain = " ".join(words)
+        out += [f"{_ts(t)} --> {_ts(t + dur)} align:start position:0%", prev if prev else " ", karaoke, ""]
+        out += [f"{_ts(t + dur)} --> {_ts(t + dur + 0.01)} align:start position:0%", plain, " ", ""]
+        prev = plain
+        t += dur + 0.01
+    return "\n".join(out)
+
+def _best_time(fn, arg, repeat=7):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def run(samples):
+    print(f"{'sample':<18}{'input':>10}  {'function':<30}{'time(ms)':>10}{'output':>10}")
+    for name, vtt in samples:
+        cases = [
+            ("legacy parse_vtt_with_ts", legacy_parse_vtt_with_timestamps),
+            ("vtt_parser timestamped", lambda v: format_timestamped(iter_vtt_cues(v))),
+            ("vtt_parser (bytes input)", lambda v: format_timestamped(iter_vtt_cues(v.encode('utf-8')))),
+            ("legacy clean_vtt_text", legacy_clean_vtt_text),
+            ("vtt_parser plain", lambda v: format_plain(iter_vtt_cues(v))),
+        ]
+        for label, fn in cases:
+            elapsed, output = _best_time(fn, vtt)
+            print(f"{name:<18}{len(vtt):>10}  {label:<30}{elapsed * 1000:>10.2f}{len(output):>10}")
+        print()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        samples = []
+        for path in sys.argv[1:]:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples.append((path[-18:], f.read()))
+    else:
+        samples = [(f"auto {m} min", make_auto_caption_vtt(m)) for m in (10, 30, 90)]
+    run(samples)
@@ -0,0 +1,391 @@
+"""
+端到端效能基準：以本機替身 (bench_fakes.py) 取代 YouTube、Gemini 與 Supabase，
+不消耗任何配額就能量測 worker 的吞吐量、延遲百分位數 (p50 / p95 / p99) 與記憶體峰值 (peak RSS)。
+每次結果附加到 .cache/bench_results.jsonl (--output 可改)，並與上一次相同設定的結果比較。
+
+    python bench_worker.py                                   # worker (循序 + pipelined x4)、VTT 解析、批次上傳
+    python bench_worker.py --scenarios worker --videos 40 --concurrency 1,2,4,8
+    python bench_worker.py --gemini-latency 3 --gemini-429 0.1 --youtube-429 0.02 --db-503 0.01
+    python bench_worker.py --scenarios worker --minutes 60 --videos 8     # 長影片 (分段平行分析)
+    python bench_worker.py --scenarios worker --lexicon off,on            # --lexicon 只接受 on、off 或 off,on
+    python bench_worker.py --output runs/today.jsonl                      # 或 --output '' 不寫入
+
+每個情境在獨立的子行程中執行 (乾淨的快取與模組狀態，RSS 分開計算)，替身伺服器則在父行程中。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from local_store import CACHE_DIR
+
+SCRIPT = os.path.abspath(__file__)
+# Shape of a JWT; the fake PostgREST does not check it
+FAKE_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYmVuY2gifQ.bench"
+STAGES = ("claim", "metadata", "db_mark_processing", "transcript", "transcript_yta", "transcript_ytdlp",
+          "analysis", "gemini_call", "db_save_results")
+
+def _percentiles(values):
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(int(len(ordered) * p), len(ordered) - 1)] if ordered else None
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+# --- Scenarios (run inside the child process) ---
+
+def _child_worker(spec):
+    from bench_fakes import Faults, install_youtube_fakes, make_yta_snippets
+    transcripts = {video_id: make_yta_snippets(i, minutes)
+                   for i, (video_id, minutes) in enumerate(zip(spec['video_ids'], spec['minutes']))}
+    install_youtube_fakes(transcripts, spec['base_url'], Faults.from_dict(spec['youtube']))
+
+    import youtube_limiter
+    import study_ai
+    import worker
+    from metrics import metrics
+    from queue_wakeup import PollingWaker
+    # The limiter starts at 0.5 req/s in production; the benchmark measures the pipeline, not the pacing
+    youtube_limiter.MAX_RATE = spec['youtube_rate']
+    if not spec['lexicon']:
+        # Every prompt asks for full vocabulary entries, as before the lexicon existed
+        study_ai.lexicon.known_words = lambda text, limit=0: []
+    study_ai.youtube_limiter.rate = spec['youtube_rate']
+
+    t0 = time.perf_counter()
+    if spec['concurrency'] > 1:
+        worker.process_queue_pipelined(spec['concurrency'], continuous=False, waker=PollingWaker())
+    else:
+        worker.process_queue(continuous=False, waker=PollingWaker())
+    elapsed = time.perf_counter() - t0
+
+    snapshot = metrics.snapshot()
+    task = snapshot['stages'].get('task', {})
+    ok = task.get('outcomes', {}).get('ok', 0)
+    keys = study_ai.key_pool.stats()
+    return [{
+        'name': spec['name'],
+        'items': len(spec['video_ids']),
+        'ok': ok,
+        'failed': task.get('outcomes', {}).get('error', 0),
+        'seconds': round(elapsed, 3),
+        'throughput': round(ok / elapsed * 60, 2),
+        'unit': 'videos/min',
+        'latency': {p: task.get(p) for p in ('p50', 'p95', 'p99')},
+        'stages': {stage: {p: summary.get(p) for p in ('count', 'p50', 'p95', 'p99')}
+                   for stage, summary in snapshot['stages'].items() if stage in STAGES},
+        'gemini_requests': study_ai.analysis_stats['requests'],
+        'gemini_output_tokens': int(snapshot['stages'].get('gemini_call', {}).get('totals', {}).get('output_tokens', 0)),
+        'lexicon_filled': study_ai.analysis_stats['lexicon_filled'],
+        'gemini_throttled': sum(k['throttled'] for k in keys),
+        'youtube': study_ai.youtube_limiter.stats(),
+    }]
+
+def _child_vtt(spec):
+    from bench_vtt import make_auto_caption_vtt
+    from vtt_parser import iter_vtt_cues, format_timestamped
+    from transcript_compact import compact_transcript
+    results = []
+    for minutes in spec['vtt_minutes']:
+        vtt = make_auto_caption_vtt(minutes, seed=minutes).encode('utf-8')
+        times = []
+        for _ in range(spec['repeat']):
+            t0 = time.perf_counter()
+            compact_transcript(format_timestamped(iter_vtt_cues(vtt)))
+            times.append(time.perf_counter() - t0)
+        results.append({
+            'name': f"vtt {minutes}min",
+            'items': spec['repeat'],
+            'ok': spec['repeat'],
+            'failed': 0,
+            'seconds': round(sum(times), 4),
+            'throughput': round(len(vtt) * len(times) / sum(times) / 1e6, 2),
+            'unit': 'MB/s',
+            'latency': _percentiles(times),
+            'bytes': len(vtt),
+        })
+    return results
+
+# Transcript lines the upload records quote their pattern examples from
+UPLOAD_TRANSCRIPT = [f"what really matters is practising a little every day, part {n}" for n in range(20)]
+
+def _child_upload(spec):
+    from supabase import create_client
+    from bulk_loader import BulkLoader, iter_records
+    from bench_fakes import fake_analysis
+
+    # Stream a learning_data.json-like file to disk first (not timed)
+    path = os.path.abspath("upload.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for i in range(spec['rows']):
+            record = fake_analysis(i, 15, 8, UPLOAD_TRANSCRIPT)
+            # Stored rows carry the timestamps time_index adds after the analysis
+            for pattern, sec in zip(record['sentence_patterns'], range(0, 600, 30)):
+                pattern['timestamp'] = sec
+            record.update(video_id=f"upload{i:05d}", url=f"https://youtu.be/upload{i:05d}", status='completed')
+            f.write((",\n" if i else "\n") + json.dumps(record, ensure_ascii=False))
+        f.write("\n]")
+
+    latencies = []
+
+    class TimedLoader(BulkLoader):
+        def _upsert(self, rows):
+            t0 = time.perf_counter()
+            try:
+                super()._upsert(rows)
+            finally:
+                latencies.append(time.perf_counter() - t0)
+
+    client = create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_KEY'])
+    loader = TimedLoader(client, 'en_videos', batch_size=spec['batch_size'], max_parallel=spec['max_parallel'])
+    stats = loader.load(iter_records(path))
+    return [{
+        'name': f"upload {spec['rows']} rows",
+        'items': stats['rows'],
+        'ok': stats['written'],
+        'failed': stats['failed'],
+        'seconds': stats['seconds'],
+        'throughput': stats['rows_per_sec'],
+        'unit': 'rows/s',
+        'latency': _percentiles(latencies),
+        'requests': stats['requests'],
+        'bytes': os.path.getsize(path),
+    }]
+
+CHILD_SCENARIOS = {'worker': _child_worker, 'vtt': _child_vtt, 'upload': _child_upload}
+
+def run_child(spec_path):
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    results = CHILD_SCENARIOS[spec['scenario']](spec)
+    rss = peak_rss_mb()
+    for result in results:
+        result['peak_rss_mb'] = rss
+    with open(spec['result_path'], 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+
+# --- Parent: fake backend, child processes, report ---
+
+def _child_env(args, backend, workdir):
+    env = dict(os.environ)
+    env.update({
+        'CACHE_DIR': os.path.join(workdir, "cache"),
+        'METRICS_JSON': os.path.join(workdir, "worker_metrics.json"),
+        'SUPABASE_URL': backend.base_url,
+        'SUPABASE_KEY': FAKE_SUPABASE_KEY,
+        'GOOGLE_API_KEYS': ",".join(f"bench-key-{i:04d}" for i in range(args.keys)),
+        'GOOGLE_GEMINI_BASE_URL': backend.base_url,
+        'GEMINI_RPM': str(args.gemini_rpm),
+        'GEMINI_TPM': str(10 ** 9),
+        'GEMINI_RPD': str(10 ** 7),
+        'PYTHONIOENCODING': 'utf-8',
+    })
+    return env
+
+def run_scenario(spec, args, backend):
+    workdir = tempfile.mkdtemp(prefix="bench_worker_")
+    spec = dict(spec, base_url=backend.base_url, result_path=os.path.join(workdir, "result.json"))
+    spec_path = os.path.join(workdir, "spec.json")
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    print(f"▶️ {spec.get('name', spec['scenario'])} ...", flush=True)
+    try:
+        proc = subprocess.run([sys.executable, SCRIPT, "--child", spec_path], cwd=workdir,
+                              env=_child_env(args, backend, workdir),
+                              stdout=None if args.verbose else subprocess.DEVNULL,
+                              stderr=None if args.verbose else subprocess.PIPE)
+        if proc.returncode != 0:
+            tail = (proc.stderr or b'').decode('utf-8', 'replace').strip().splitlines()[-5:]
+            print(f"   ❌ 子行程失敗 (exit {proc.returncode})\n      " + "\n      ".join(tail))
+            return [{'name': spec.get('name', spec['scenario']), 'error': f"exit {proc.returncode}"}]
+        with open(spec['result_path'], 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for result in results:
+        result['served'] = backend.served_summary()
+    return results
+
+def worker_specs(args, backend):
+    from bench_fakes import video_ids, make_vtt
+    ids = video_ids(args.videos)
+    minutes = [args.minutes[i % len(args.minutes)] for i in range(len(ids))]
+    vtt = {video_id: make_vtt(i, m) for i, (video_id, m) in enumerate(zip(ids, minutes))}
+    for concurrency, lexicon in ((c, mode == 'on') for c in args.concurrency for mode in args.lexicon):
+        backend.reset(ids, vtt)
+        name = "worker seq" if concurrency <= 1 else f"worker x{concurrency}"
+        yield {
+            'scenario': 'worker',
+            'name': name if lexicon else f"{name} no-lex",
+            'lexicon': lexicon,
+            'video_ids': ids,
+            'minutes': minutes,
+            'concurrency': concurrency,
+            'youtube': backend.faults['youtube'].to_dict(),
+            'youtube_rate': args.youtube_rate,
+        }
+
+def _fmt_seconds(value):
+    if value is None:
+        return "-"
+    return f"{value * 1000:.1f}ms" if value < 1 else f"{value:.2f}s"
+
+def print_report(results):
+    print()
+    print(f"{'scenario':<20}{'items':>7}{'ok':>6}{'fail':>6}{'secs':>9}{'throughput':>20}"
+          f"{'p50':>10}{'p95':>10}{'p99':>10}{'RSS(MB)':>9}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['name']:<20}  ❌ {r['error']}")
+            continue
+        latency = r['latency']
+        print(f"{r['name']:<20}{r['items']:>7}{r['ok']:>6}{r['failed']:>6}{r['seconds']:>9.2f}"
+              f"{r['throughput']:>10} {r['unit']:<9}"
+              f"{_fmt_seconds(latency['p50']):>10}{_fmt_seconds(latency['p95']):>10}{_fmt_seconds(latency['p99']):>10}"
+              f"{r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '-':>9}")
+    for r in results:
+        if r.get('stages'):
+            print(f"\n  {r['name']} (gemini requests {r['gemini_requests']}, throttled {r['gemini_throttled']}, "
+                  f"output tokens/video {r['gemini_output_tokens'] / max(r['ok'], 1):.0f}, "
+                  f"lexicon fills {r['lexicon_filled']}, "
+                  f"youtube {r['youtube']['state']} @ {r['youtube']['rate']}/s, served {r['served']})")
+            for stage in STAGES:
+                s = r['stages'].get(stage)
+                if s:
+                    print(f"    {stage:<20}{s['count']:>6}  p50 {_fmt_seconds(s['p50']):>9}  "
+                          f"p95 {_fmt_seconds(s['p95']):>9}  p99 {_fmt_seconds(s['p99']):>9}")
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(SCRIPT)).stdout.strip() or None
+    except OSError:
+        return None
+
+def save_and_compare(path, config, results):
+    """Append this run to the JSONL history and compare with the last run that used the same config."""
+    previous = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    run = json.loads(line)
+                    if run.get('config') == config:
+                        previous = run
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'at': datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(),
+                            'config': config, 'results': results}, ensure_ascii=False) + "\n")
+    print(f"\n📝 結果已附加到 {path}")
+    if not previous:
+        return
+    before = {r['name']: r for r in previous['results'] if 'error' not in r}
+    print(f"📈 與 {previous['at']} ({previous.get('commit') or '?'}) 比較：")
+    for r in results:
+        old = before.get(r['name'])
+        if not old or 'error' in r:
+            continue
+        change = lambda new, prev: f"{(new - prev) / prev:+.0%}" if new is not None and prev else "-"
+        print(f"   {r['name']:<20} throughput {change(r['throughput'], old['throughput']):>6}   "
+              f"p95 {change(r['latency']['p95'], old['latency']['p95']):>6}   "
+              f"RSS {change(r['peak_rss_mb'], old['peak_rss_mb']):>6}")
+
+def _lexicon_modes(text):
+    modes = [mode.strip() for mode in text.split(',') if mode.strip()]
+    if not modes or any(mode not in ('on', 'off') for mode in modes):
+        raise argparse.ArgumentTypeError(f"expected on, off or off,on, got {text!r}")
+    return modes
+
+def _floats(text):
+    return [float(x) for x in text.split(',') if x.strip()]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="End-to-end worker benchmark against local fakes")
+    parser.add_argument("--scenarios", default="worker,vtt,upload", help="worker, vtt, upload (comma separated)")
+    parser.add_argument("--videos", type=int, default=24, help="Videos in the fake en_videos queue")
+    parser.add_argument("--concurrency", default="1,4", help="Worker modes to run: 1 = sequential, N = pipelined xN")
+    parser.add_argument("--minutes", default="5,10,20,45", help="Video lengths, assigned round-robin")
+    parser.add_argument("--keys", type=int, default=4, help="Fake Gemini API keys in the key pool")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="Mean seconds per generateContent")
+    parser.add_argument("--gemini-429", type=float, default=0.0, help="Share of Gemini requests answered 429")
+    parser.add_argument("--gemini-503", type=float, default=0.0, help="Share of Gemini requests answered 503")
+    parser.add_argument("--gemini-truncate", type=float, default=0.0, help="Share of Gemini answers cut in half")
+    parser.add_argument("--gemini-tps", type=float, default=200.0,
+                        help="Fake Gemini output tokens/s (longer answers take longer, 0 = off)")
+    parser.add_argument("--gemini-rpm", type=int, default=1000, help="Per-key RPM given to the key pool")
+    parser.add_argument("--lexicon", type=_lexicon_modes, default="on",
+                        help="on, off or off,on (off = full entries for every word; anything else is an error)")
+    parser.add_argument("--youtube-latency", type=float, default=0.2, help="Mean seconds per YouTube request")
+    parser.add_argument("--youtube-429", type=float, default=0.0, help="Share of YouTube requests blocked (429)")
+    parser.add_argument("--youtube-rate", type=float, default=20.0, help="YouTube limiter rate (req/s) in the benchmark")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Mean seconds per PostgREST request")
+    parser.add_argument("--db-503", type=float, default=0.0, help="Share of PostgREST requests answered 503")
+    parser.add_argument("--upload-rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument("--vtt-minutes", default="10,30,90")
+    parser.add_argument("--repeat", type=int, default=7, help="Repetitions per VTT sample")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(CACHE_DIR, "bench_results.jsonl"),
+                        help="JSONL history (default .cache/bench_results.jsonl, '' to skip)")
+    parser.add_argument("--verbose", action="store_true", help="Show the worker's own output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv):
+    args = parse_args(argv)
+    if args.child:
+        run_child(args.child)
+        return
+    from bench_fakes import Faults, FakeBackend
+
+    args.concurrency = [int(x) for x in _floats(args.concurrency)]
+    args.minutes = [int(x) for x in _floats(args.minutes)]
+    args.vtt_minutes = [int(x) for x in _floats(args.vtt_minutes)]
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    config = {k: v for k, v in vars(args).items() if k not in ('output', 'verbose', 'child')}
+
+    backend = FakeBackend(
+        db=Faults(args.db_latency, rate_503=args.db_503, seed=args.seed),
+        gemini=Faults(args.gemini_latency, args.gemini_429, args.gemini_503, args.gemini_truncate, seed=args.seed + 1,
+                      output_tps=args.gemini_tps),
+        youtube=Faults(args.youtube_latency, args.youtube_429, seed=args.seed + 2),
+    ).start()
+    print(f"🧪 Fake YouTube / Gemini / Supabase on {backend.base_url}")
+
+    results = []
+    try:
+        for scenario in scenarios:
+            if scenario == 'worker':
+                for spec in worker_specs(args, backend):
+                    results += run_scenario(spec, args, backend)
+            elif scenario == 'vtt':
+                results += run_scenario({'scenario': 'vtt', 'name': 'vtt', 'vtt_minutes': args.vtt_minutes,
+                                         'repeat': args.repeat}, args, backend)
+            elif scenario == 'upload':
+                backend.reset()
+                results += run_scenario({'scenario': 'upload', 'name': 'upload', 'rows': args.upload_rows,
+                                         'batch_size': args.batch_size, 'max_parallel': args.max_parallel},
+                                        args, backend)
+            else:
+                print(f"⚠️ Unknown scenario: {scenario}")
+    finally:
+        backend.shutdown()
+
+    print_report(results)
+    if args.output:
+        save_and_compare(args.output, config, results)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
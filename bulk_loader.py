@@ -0,0 +1,135 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+BATCH_SIZE = 500
+MAX_PARALLEL_BATCHES = 4
+READ_CHUNK_CHARS = 1 << 16
+
+def _iter_json_array(f):
+    """Stream the items of a top-level JSON array (the '[' is already consumed)."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            if pos >= len(buf):
+                raise json.JSONDecodeError("need more data", buf, pos)
+            item, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if pos >= len(buf):
+                    return
+                raise
+            chunk = f.read(READ_CHUNK_CHARS)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+
+def iter_records(path):
+    """逐筆讀取 JSON 陣列 / 單一 JSON 物件 / JSONL 檔案，不需把整份檔案載入記憶體。"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            yield from _iter_json_array(f)
+            return
+        if not first:
+            return
+        line = first + f.readline()
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # A single pretty-printed object
+            yield json.loads(line + f.read())
+            return
+        # JSONL: one object per line
+        yield record
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _batches(records, batch_size):
+    """
+    Group records into batches of identical columns: PostgREST fills the columns missing
+    from some rows of a bulk request with NULL, which would wipe existing values.
+    """
+    buckets = {}
+    for record in records:
+        key = tuple(sorted(record))
+        bucket = buckets.setdefault(key, [])
+        bucket.append(record)
+        if len(bucket) >= batch_size:
+            yield buckets.pop(key)
+    yield from (bucket for bucket in buckets.values() if bucket)
+
+class BulkLoader:
+    """
+    批次 upsert：每批 batch_size 筆、最多 max_parallel 批同時進行。
+    某一批失敗時對半切開重試，直到找出真正有問題的資料列 (例如 RLS 或欄位錯誤)，其餘資料照常寫入。
+    """
+    def __init__(self, client, table, on_conflict='video_id', batch_size=BATCH_SIZE,
+                 max_parallel=MAX_PARALLEL_BATCHES, key=None):
+        self.client = client
+        self.table = table
+        self.on_conflict = on_conflict
+        self.batch_size = batch_size
+        self.max_parallel = max_parallel
+        # Identifies a row in error reports
+        self.key = key or on_conflict
+        self.requests = 0
+        self.failed = []   # (row key, error message)
+        self._lock = threading.Lock()
+
+    def _upsert(self, rows):
+        with self._lock:
+            self.requests += 1
+        self.client.table(self.table).upsert(rows, on_conflict=self.on_conflict).execute()
+
+    def _load_batch(self, rows):
+        """Returns the number of rows written; bisects on failure."""
+        try:
+            self._upsert(rows)
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                self.failed.append((rows[0].get(self.key), str(e)))
+                print(f"   ❌ {rows[0].get(self.key)}: {e}")
+                return 0
+        middle = len(rows) // 2
+        return self._load_batch(rows[:middle]) + self._load_batch(rows[middle:])
+
+    def load(self, records):
+        """records: any iterable (e.g. iter_records(path)). Returns a stats dict."""
+        t0 = time.perf_counter()
+        written = 0
+        total = 0
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            for batch in _batches(records, self.batch_size):
+                total += len(batch)
+                # Bounded queue of in-flight batches keeps memory flat for large files
+                if len(pending) >= self.max_parallel * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    written += sum(future.result() for future in done)
+                pending.add(pool.submit(self._load_batch, batch))
+            written += sum(future.result() for future in pending)
+
+        elapsed = max(time.perf_counter() - t0, 1e-6)
+        stats = {
+            'rows': total,
+            'written': written,
+            'failed': len(self.failed),
+            'requests': self.requests,
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(written / elapsed, 1),
+        }
+        print(f"📦 [{self.table}] {written}/{total} rows in {elapsed:.1f}s ({stats['rows_per_sec']} rows/sec, "
+              f"{self.requests} requests, {len(self.failed)} failed)")
+        return stats
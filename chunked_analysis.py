@@ -0,0 +1,95 @@
+import re
+from collections import Counter
+from transcript_compact import iter_segments
+from lemmas import normalize_word
+from analysis_schema import lower_bound, upper_bound
+
+# Each window covers about this much video time ...
+WINDOW_SECONDS = 600
+# ... and never more than this many characters (well under the 50000 prompt cut)
+MAX_WINDOW_CHARS = 20000
+
+def split_windows(text_with_timestamps, window_seconds=WINDOW_SECONDS, max_chars=MAX_WINDOW_CHARS):
+    """
+    「秒數|文字」逐字稿 (或 (秒數, 文字) 序列) -> 依時間切成數個視窗 (每個視窗仍是「秒數|文字」格式)。
+    每一行都會落在某個視窗中，不會像單次呼叫那樣丟掉 50000 字元之後的內容。
+    """
+    windows = []
+    lines = []
+    chars = 0
+    window_start = None
+    for sec, body in iter_segments(text_with_timestamps):
+        line = f"{sec}|{body}"
+        if lines and (sec - window_start >= window_seconds or chars + len(line) + 1 > max_chars):
+            windows.append("\n".join(lines))
+            lines, chars = [], 0
+        if not lines:
+            window_start = sec
+        lines.append(line)
+        chars += len(line) + 1
+    if lines:
+        windows.append("\n".join(lines))
+    return windows
+
+def _pattern_key(pattern):
+    structure = str(pattern.get('structure', '')).lower()
+    return ' '.join(re.sub(r'[^a-z ]+', ' ', structure).split())
+
+def _round_robin(groups, key_fn, limit):
+    """Take items from each window's list in turn, skipping duplicates, until the limit is reached."""
+    picked = []
+    seen = set()
+    iterators = [iter(group) for group in groups]
+    while iterators and len(picked) < limit:
+        remaining = []
+        for it in iterators:
+            for item in it:
+                key = key_fn(item)
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                picked.append(item)
+                remaining.append(it)
+                break
+            if len(picked) >= limit:
+                break
+        iterators = remaining
+    return picked
+
+def merge_analyses(parts, vocab_count, pattern_count):
+    """
+    合併各視窗的分析結果：
+    - category: 以各視窗的票數取前 2 名
+    - vocabulary: 以正規化後的單字去除重複 (Make / make 視為同一字；care / car 不同)，各視窗輪流挑選，保持全片分佈
+    - sentence_patterns: 以句型結構去除重複，各視窗輪流挑選後依時間排序
+    數量上限沿用 target_counts 的區間上限；去重後不足下限的部分由呼叫端追加請求 (missing_counts)。
+    """
+    parts = [p for p in parts if isinstance(p, dict)]
+    votes = Counter()
+    for part in parts:
+        categories = part.get('category') or []
+        if isinstance(categories, str):
+            categories = [categories]
+        votes.update(categories)
+
+    vocabulary = _round_robin(
+        [p.get('vocabulary') or [] for p in parts],
+        lambda v: normalize_word(str(v.get('word', ''))),
+        upper_bound(vocab_count))
+
+    patterns = _round_robin(
+        [p.get('sentence_patterns') or [] for p in parts],
+        _pattern_key,
+        upper_bound(pattern_count))
+    patterns.sort(key=lambda p: p.get('timestamp') if isinstance(p.get('timestamp'), (int, float)) else 0)
+
+    return {
+        'category': [c for c, _ in votes.most_common(2)],
+        'vocabulary': vocabulary,
+        'sentence_patterns': patterns,
+    }
+
+def missing_counts(analysis, vocab_count, pattern_count):
+    """(缺少的單字數, 缺少的句型數)：合併去重後距離 target_counts 區間下限還差多少。"""
+    return (max(lower_bound(vocab_count) - len(analysis['vocabulary']), 0),
+            max(lower_bound(pattern_count) - len(analysis['sentence_patterns']), 0))
@@ -0,0 +1,38 @@
+-- Atomic batched task claiming for the worker queue
+-- Run this in your Supabase SQL Editor (after update_schema_status.sql)
+
+-- 1. Lease columns: who is processing the row and until when
+ALTER TABLE en_videos
+ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+
+-- Oldest pending rows first
+CREATE INDEX IF NOT EXISTS idx_en_videos_pending ON en_videos(created_at) WHERE status = 'pending';
+
+-- 2. Claim up to p_limit pending rows in one round trip.
+-- FOR UPDATE SKIP LOCKED lets concurrent workers (or overlapping cron runs)
+-- claim disjoint rows without blocking each other.
+CREATE OR REPLACE FUNCTION claim_en_videos(
+    p_worker TEXT,
+    p_limit INT DEFAULT 1,
+    p_lease_seconds INT DEFAULT 600
+)
+RETURNS SETOF en_videos
+LANGUAGE sql
+AS $$
+    UPDATE en_videos v
+    SET status = 'processing',
+        lease_owner = p_worker,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    WHERE v.video_id IN (
+        SELECT video_id
+        FROM en_videos
+        WHERE status = 'pending'
+        ORDER BY created_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING v.*;
+$$;
+
+COMMENT ON FUNCTION claim_en_videos IS 'Atomically move up to p_limit pending videos to processing and lease them to p_worker';
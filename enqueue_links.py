@@ -0,0 +1,137 @@
+"""
+大量匯入影片連結到 en_videos 佇列 (status = 'pending')，由 worker.py 接手處理。
+
+    python enqueue_links.py                      # 匯入所有 links*.csv (含「links - 複製.csv」這類副本)
+    python enqueue_links.py a.csv b.csv          # 指定檔案
+    python enqueue_links.py --dry-run            # 只統計，不寫入資料庫
+"""
+import re
+import csv
+import sys
+import glob
+import time
+import argparse
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+TABLE_NAME = "en_videos"
+# video_ids per in_() lookup (keeps the PostgREST query string short)
+LOOKUP_CHUNK = 200
+# rows per insert request
+INSERT_CHUNK = 500
+MAX_PARALLEL_REQUESTS = 4
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+# /shorts/<id>, /embed/<id>, /live/<id>, /v/<id>
+_PATH_ID_RE = re.compile(r'^/(?:shorts|embed|live|v|e)/([A-Za-z0-9_-]{11})')
+
+def normalize_video_id(link):
+    """
+    任何 YouTube 連結格式 -> 11 碼 video_id；無法辨識時回傳 None。
+    支援 watch?v=、youtu.be/、shorts/、embed/、live/、m. / music. 子網域與單純的 video_id。
+    """
+    link = (link or '').strip().strip('\ufeff"\'')
+    if not link:
+        return None
+    if _VIDEO_ID_RE.match(link):
+        return link
+    if '://' not in link:
+        link = 'https://' + link
+    parsed = urlparse(link)
+    host = (parsed.hostname or '').lower()
+    if host.endswith('youtu.be'):
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host.endswith('youtube.com') or host.endswith('youtube-nocookie.com'):
+        candidate = parse_qs(parsed.query).get('v', [None])[0]
+        if not candidate:
+            match = _PATH_ID_RE.match(parsed.path)
+            candidate = match.group(1) if match else None
+    else:
+        return None
+    return candidate if candidate and _VIDEO_ID_RE.match(candidate) else None
+
+def iter_links(paths):
+    """逐行讀取 CSV (不整份載入)，產生 (video_id, 原始連結)；每列取第一個可辨識的欄位。"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f):
+                for cell in row:
+                    video_id = normalize_video_id(cell)
+                    if video_id:
+                        yield video_id, cell.strip()
+                        break
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def existing_ids(client, video_ids, chunk_size=LOOKUP_CHUNK):
+    """Video ids already in en_videos (any status), looked up in parallel in_() chunks."""
+    def lookup(chunk):
+        response = client.table(TABLE_NAME).select('video_id').in_('video_id', chunk).execute()
+        return [row['video_id'] for row in response.data or []]
+
+    found = set()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as pool:
+        for ids in pool.map(lookup, _chunks(list(video_ids), chunk_size)):
+            found.update(ids)
+    return found
+
+def enqueue(client, links, chunk_size=INSERT_CHUNK):
+    """
+    新的 video_id 以 pending 批次寫入。ignore_duplicates 讓同時從網頁新增的影片不會造成衝突，
+    已存在的資料列 (包含已完成的影片) 不會被覆寫。
+    """
+    rows = [{
+        'video_id': video_id,
+        'url': url if '://' in url else f"https://www.youtube.com/watch?v={video_id}",
+        'status': 'pending',
+        'vocabulary': [],
+        'sentence_patterns': [],
+    } for video_id, url in links.items()]
+
+    def insert(chunk):
+        client.table(TABLE_NAME).upsert(chunk, on_conflict='video_id', ignore_duplicates=True).execute()
+        return len(chunk)
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as pool:
+        return sum(pool.map(insert, _chunks(rows, chunk_size)))
+
+def import_links(client, paths, dry_run=False):
+    t0 = time.perf_counter()
+    links = {}
+    total = 0
+    for video_id, url in iter_links(paths):
+        total += 1
+        links.setdefault(video_id, url)
+    print(f"📄 讀取 {total} 個連結，{len(links)} 個不重複的影片 ({len(paths)} 個檔案)")
+
+    known = existing_ids(client, links)
+    new_links = {video_id: url for video_id, url in links.items() if video_id not in known}
+    print(f"🔎 資料庫已有 {len(known)} 部，待新增 {len(new_links)} 部")
+
+    inserted = 0
+    if new_links and not dry_run:
+        inserted = enqueue(client, new_links)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ 已加入佇列 {inserted} 部 (pending)，耗時 {elapsed:.1f} 秒" + (" [dry-run]" if dry_run else ""))
+    return inserted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-enqueue YouTube links into en_videos as 'pending'")
+    parser.add_argument("paths", nargs="*", help="CSV files (default: links*.csv)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count new videos, do not insert")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(glob.glob("links*.csv"))
+    if not paths:
+        print("❌ 找不到 links*.csv")
+        return 1
+
+    from supabase import create_client
+    from upload_supabase import URL, KEY
+    import_links(create_client(URL, KEY), paths, dry_run=args.dry_run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
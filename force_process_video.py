@@ -1,4 +1,5 @@
 from study_ai import fetch_transcript_final, analyze_with_ai
+from transcript_compact import compact_transcript
 from upload_supabase import URL, KEY, TABLE_NAME
 from supabase import create_client
 import json
@@ -15,7 +16,7 @@ def run_force_update():
 
     print("Analyzing with AI (New Bilingual Prompt)...")
     try:
-        analysis = analyze_with_ai(text)
+        analysis = analyze_with_ai(compact_transcript(text))
         analysis['video_id'] = v_id
         analysis['url'] = url
         
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from local_store import CACHE_DIR
+
+# Hedge delay = recent p95 latency of the primary source, clamped to this range
+MIN_HEDGE_SECONDS = 1.0
+MAX_HEDGE_SECONDS = 15.0
+# Used until a source has this many successful samples
+DEFAULT_HEDGE_SECONDS = 5.0
+MIN_SAMPLES = 5
+LATENCY_WINDOW = 50
+
+STATS_PATH = os.path.join(CACHE_DIR, "transcript_sources.json")
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+class SourceStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = deque(maxlen=LATENCY_WINDOW)   # successful fetches only
+        self.attempts = 0
+        self.successes = 0
+        self.wins = 0
+        self.hedged = 0       # times this source was started as the hedge
+
+    def success_rate(self):
+        return self.successes / self.attempts if self.attempts else 1.0
+
+    def score(self):
+        """Lower is better: typical latency divided by how often the source delivers."""
+        p50 = percentile(self.latencies, 0.5) if len(self.latencies) >= MIN_SAMPLES else DEFAULT_HEDGE_SECONDS
+        return p50 / max(self.success_rate(), 0.05)
+
+    def to_dict(self):
+        return {
+            'latencies': [round(x, 3) for x in self.latencies],
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'wins': self.wins,
+            'hedged': self.hedged,
+        }
+
+    def load(self, saved):
+        self.latencies.extend(saved.get('latencies', []))
+        for field in ('attempts', 'successes', 'wins', 'hedged'):
+            setattr(self, field, int(saved.get(field, 0)))
+
+class HedgedFetcher:
+    """
+    對多個來源做 hedged request：先呼叫目前較好的來源，若超過它最近的 p95 延遲仍未回應
+    (或已經失敗)，就同時啟動下一個來源，採用第一個有效的結果，並通知較慢的一方放棄。
+    各來源的勝率與延遲會決定下次的優先順序與等待門檻，並保存在 .cache 中。
+
+    sources: {name: fn(*args, cancel=threading.Event, **kwargs) -> result 或 None}
+    is_fatal(error): 沒有任何來源成功時，符合條件的錯誤 (例如被封鎖) 會被拋出，其餘視為「沒有結果」。
+    concurrency: 同時進行的 fetch 數 (worker 的字幕階段執行緒數)；執行緒池為每個來源各保留這麼多條。
+    """
+    def __init__(self, sources, is_fatal=None, stats_path=STATS_PATH, concurrency=1):
+        self.sources = sources
+        self.is_fatal = is_fatal or (lambda error: True)
+        self.stats_path = stats_path
+        self.stats = {name: SourceStats(name) for name in sources}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.set_concurrency(concurrency)
+        self._load()
+
+    def set_concurrency(self, concurrency):
+        """Size the thread pool for `concurrency` fetches in flight (one thread per source each)."""
+        with self._lock:
+            old = self._executor
+            self._executor = ThreadPoolExecutor(max_workers=max(concurrency, 1) * len(self.sources),
+                                                thread_name_prefix="transcript")
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _load(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, stats in self.stats.items():
+            if name in saved:
+                stats.load(saved[name])
+
+    def save(self):
+        with self._lock:
+            data = {name: stats.to_dict() for name, stats in self.stats.items()}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.stats_path)), exist_ok=True)
+            tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            print(f"   [資訊] 無法儲存字幕來源統計: {e}")
+
+    def order(self):
+        with self._lock:
+            return sorted(self.sources, key=lambda name: self.stats[name].score())
+
+    def hedge_delay(self, name):
+        with self._lock:
+            latencies = self.stats[name].latencies
+            if len(latencies) < MIN_SAMPLES:
+                return DEFAULT_HEDGE_SECONDS
+            return min(max(percentile(latencies, 0.95), MIN_HEDGE_SECONDS), MAX_HEDGE_SECONDS)
+
+    def _run(self, name, cancel, args, kwargs):
+        if cancel.is_set():
+            # Queued behind other fetches and the race is already over
+            return None
+        t0 = time.monotonic()
+        try:
+            result = self.sources[name](*args, cancel=cancel, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.stats[name].attempts += 1
+            raise
+        latency = time.monotonic() - t0
+        if not result and cancel.is_set():
+            # Gave up because the other source already won: says nothing about this source
+            return result
+        with self._lock:
+            stats = self.stats[name]
+            stats.attempts += 1
+            if result:
+                stats.successes += 1
+                stats.latencies.append(latency)
+        return result
+
+    def fetch(self, *args, **kwargs):
+        """
+        Returns (result, source name), or (None, None) when no source has a result.
+        """
+        result, name, _ = self.fetch_with_errors(*args, **kwargs)
+        return result, name
+
+    def fetch_with_errors(self, *args, **kwargs):
+        """
+        Like fetch, plus the non-fatal errors of the sources that failed: (None, None, []) means that every
+        source answered and none had a result, as opposed to a source that could not be reached.
+        """
+        names = self.order()
+        cancel = threading.Event()
+        futures = {}
+        errors = []
+
+        def start(name, hedge=False):
+            if hedge:
+                with self._lock:
+                    self.stats[name].hedged += 1
+            futures[self._executor.submit(self._run, name, cancel, args, kwargs)] = name
+
+        start(names[0])
+        next_index = 1
+        timeout = self.hedge_delay(names[0])
+        try:
+            while futures:
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Primary is slow: hedge with the next source and wait for whichever answers first
+                    if next_index < len(names):
+                        print(f"   [hedge] {names[next_index - 1]} 超過 {timeout:.1f}s 未回應，同時嘗試 {names[next_index]}")
+                        start(names[next_index], hedge=True)
+                        next_index += 1
+                    timeout = None if next_index >= len(names) else self.hedge_delay(names[next_index - 1])
+                    continue
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        result = None
+                    if result:
+                        with self._lock:
+                            self.stats[name].wins += 1
+                        return result, name, errors
+                # This source failed or had nothing: start the next one right away
+                if next_index < len(names) and len(futures) == 0:
+                    start(names[next_index])
+                    next_index += 1
+                    timeout = None if next_index >= len(names) else self.hedge_delay(names[next_index - 1])
+        finally:
+            # Tell the losers to stop at their next checkpoint
+            cancel.set()
+
+        fatal = [e for e in errors if self.is_fatal(e)]
+        if fatal:
+            raise fatal[0]
+        return None, None, errors
+
+    def summary(self):
+        with self._lock:
+            return {name: {
+                'wins': stats.wins,
+                'attempts': stats.attempts,
+                'hedged': stats.hedged,
+                'success_rate': round(stats.success_rate(), 2),
+                'p50': percentile(stats.latencies, 0.5) and round(percentile(stats.latencies, 0.5), 2),
+                'p95': percentile(stats.latencies, 0.95) and round(percentile(stats.latencies, 0.95), 2),
+            } for name, stats in self.stats.items()}
@@ -0,0 +1,306 @@
+import re
+import time
+import random
+import asyncio
+import threading
+
+# Per-key quota (override with GEMINI_RPM / GEMINI_TPM / GEMINI_RPD, see study_ai.py)
+DEFAULT_RPM = 15
+DEFAULT_TPM = 1_000_000
+DEFAULT_RPD = 1500
+
+# Backoff for failures that carry no Retry-After hint
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 300
+# A key rejected as invalid / forbidden is parked this long
+DISABLED_SECONDS = 3600
+# Give up when no key becomes usable within this time
+MAX_WAIT_SECONDS = 900
+
+# HTTP status (google-genai APIError.code, httpx responses) and google.rpc status names (APIError.status)
+_QUOTA_STATUSES = {429, 'RESOURCE_EXHAUSTED'}
+_UNAVAILABLE_STATUSES = {500, 502, 503, 504, 'UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED'}
+_INVALID_STATUSES = {401, 403, 'UNAUTHENTICATED', 'PERMISSION_DENIED'}
+# A bad key is a 400 INVALID_ARGUMENT; only the reason in the message tells it apart from a bad request
+_INVALID_MARKERS = ("API_KEY_INVALID", "API key not valid")
+# "retryDelay': '27s'", "Please retry in 27.51s", "Retry-After: 30"
+_RETRY_HINT_RE = re.compile(r"(?:retryDelay['\"]?\s*:\s*['\"]?|retry in\s+|Retry-After:\s*)(\d+(?:\.\d+)?)s?", re.IGNORECASE)
+
+class NoKeyAvailable(Exception):
+    pass
+
+class TokenBucket:
+    """Refills continuously up to capacity; take() may drive it negative to settle actual usage."""
+    def __init__(self, capacity, per_seconds):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+    def refund(self, amount, now):
+        """Give back tokens taken for a request that was never sent."""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+def retry_after_seconds(error):
+    """Cooldown suggested by the error (Retry-After header or RetryInfo details), or None."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        try:
+            value = headers.get('retry-after') or headers.get('Retry-After')
+            if value:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+    match = _RETRY_HINT_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+def _error_statuses(error):
+    """HTTP status and status name carried by an API error (empty for other exceptions)."""
+    statuses = {getattr(error, 'code', None), getattr(error, 'status', None),
+                getattr(getattr(error, 'response', None), 'status_code', None)}
+    statuses.discard(None)
+    return statuses
+
+def classify_error(error):
+    """'quota' (429), 'unavailable' (5xx), 'invalid' (bad key) or None (not a key problem)."""
+    statuses = _error_statuses(error)
+    if not statuses:
+        return None
+    if statuses & _INVALID_STATUSES or any(marker in str(error) for marker in _INVALID_MARKERS):
+        return 'invalid'
+    if statuses & _QUOTA_STATUSES:
+        return 'quota'
+    if statuses & _UNAVAILABLE_STATUSES:
+        return 'unavailable'
+    return None
+
+def backoff_delay(failures, base=BASE_BACKOFF_SECONDS, cap=MAX_BACKOFF_SECONDS):
+    """Exponential backoff with full jitter."""
+    return random.uniform(base / 2, min(cap, base * 2 ** max(failures - 1, 0)))
+
+class KeyState:
+    def __init__(self, index, key, rpm, tpm, rpd):
+        self.index = index
+        self.key = key
+        self.client = None
+        self.rpm = TokenBucket(rpm, 60)
+        self.tpm = TokenBucket(tpm, 60)
+        self.rpd = TokenBucket(rpd, 86400)
+        self.cooldown_until = 0.0
+        self.health = 1.0          # moving average of success (1 = always succeeds)
+        self.failures = 0          # consecutive failures, drives the backoff
+        self.in_flight = 0
+        self.last_used = 0.0
+        self.requests = 0
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        self.tokens_used = 0
+        self.last_error = None
+
+    def wait_time(self, tokens, now):
+        return max(self.cooldown_until - now,
+                   self.rpm.wait_time(1, now),
+                   self.rpd.wait_time(1, now),
+                   self.tpm.wait_time(tokens, now))
+
+    def label(self):
+        return f"#{self.index + 1} (...{self.key[-4:]})"
+
+class KeyLease:
+    def __init__(self, state, tokens):
+        self.state = state
+        self.tokens = tokens
+
+    @property
+    def client(self):
+        return self.state.client
+
+class KeyPool:
+    """
+    多組 API Key 的配額感知池：每組 Key 以 token bucket 追蹤 RPM / TPM / RPD，
+    429 時依 Retry-After (或錯誤內容中的 retryDelay) 冷卻，並以健康分數優先挑選穩定的 Key。
+    call() 給多執行緒使用，acall() 給 asyncio 使用；兩者共用同一份狀態。
+    """
+    def __init__(self, keys, client_factory, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, rpd=DEFAULT_RPD):
+        self.client_factory = client_factory
+        self.keys = [KeyState(i, key, rpm, tpm, rpd) for i, key in enumerate(keys)]
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _try_acquire(self, tokens):
+        """Returns (lease, 0) for the best ready key, or (None, seconds until one may be ready)."""
+        if not self.keys:
+            raise NoKeyAvailable("No API keys configured (GOOGLE_API_KEYS)")
+        now = time.monotonic()
+        with self._cond:
+            ready = []
+            soonest = None
+            for state in self.keys:
+                wait = state.wait_time(tokens, now)
+                if wait <= 0:
+                    ready.append(state)
+                elif soonest is None or wait < soonest:
+                    soonest = wait
+            if not ready:
+                return None, soonest
+            state = min(ready, key=lambda s: (-round(s.health, 1), s.in_flight, s.last_used))
+            state.rpm.take(1, now)
+            state.rpd.take(1, now)
+            state.tpm.take(tokens, now)
+            state.in_flight += 1
+            state.requests += 1
+            state.last_used = now
+            client = state.client
+        if client is None:
+            # Built outside the lock (client construction can be slow); the first one published wins
+            try:
+                client = self.client_factory(state.key)
+            except Exception:
+                # No request was sent: give back what was taken above
+                with self._cond:
+                    now = time.monotonic()
+                    state.rpm.refund(1, now)
+                    state.rpd.refund(1, now)
+                    state.tpm.refund(tokens, now)
+                    state.in_flight -= 1
+                    state.requests -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                if state.client is None:
+                    state.client = client
+        return KeyLease(state, tokens), 0.0
+
+    def acquire(self, tokens=0, max_wait=MAX_WAIT_SECONDS):
+        deadline = time.monotonic() + max_wait
+        while True:
+            lease, wait = self._try_acquire(tokens)
+            if lease:
+                return lease
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise NoKeyAvailable(f"No API key available within {max_wait}s")
+            # Small jitter so waiting threads do not all retry at the same instant
+            with self._cond:
+                self._cond.wait(min(wait * random.uniform(1.0, 1.1), remaining))
+
+    async def acquire_async(self, tokens=0, max_wait=MAX_WAIT_SECONDS):
+        deadline = time.monotonic() + max_wait
+        while True:
+            lease, wait = self._try_acquire(tokens)
+            if lease:
+                return lease
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise NoKeyAvailable(f"No API key available within {max_wait}s")
+            await asyncio.sleep(min(wait * random.uniform(1.0, 1.1), remaining))
+
+    def release(self, lease, error=None, tokens_used=None):
+        """
+        Return a key after a call. tokens_used (e.g. usage_metadata.total_token_count)
+        settles the estimate taken at acquire time. Returns the error kind, if any.
+        """
+        state = lease.state
+        now = time.monotonic()
+        kind = classify_error(error) if error is not None else None
+        with self._cond:
+            state.in_flight -= 1
+            if error is not None:
+                # A rejected request consumed no tokens
+                state.tpm.take(-lease.tokens, now)
+            elif tokens_used is not None:
+                state.tpm.take(tokens_used - lease.tokens, now)
+                state.tokens_used += tokens_used
+            else:
+                state.tokens_used += lease.tokens
+
+            if error is None:
+                state.successes += 1
+                state.failures = 0
+                state.health = 0.8 * state.health + 0.2
+            elif kind is not None:
+                state.errors += 1
+                state.failures += 1
+                state.health = 0.8 * state.health
+                state.last_error = str(error)[:200]
+                if kind == 'invalid':
+                    cooldown = DISABLED_SECONDS
+                else:
+                    cooldown = retry_after_seconds(error) or backoff_delay(state.failures)
+                    if kind == 'quota':
+                        state.throttled += 1
+                        if 'PerDay' in str(error):
+                            state.rpd.tokens = 0
+                state.cooldown_until = max(state.cooldown_until, now + cooldown)
+                print(f"🔑 [系統] API Key {state.label()} {kind}，冷卻 {cooldown:.0f} 秒")
+            self._cond.notify_all()
+        return kind
+
+    def call(self, fn, tokens=0, max_attempts=4, usage=None):
+        """
+        以可用的 Key 執行 fn(client)。配額 / 暫時性錯誤時換一組 Key 重試 (最多 max_attempts 次)，
+        其他錯誤直接拋出。usage(result) 可回傳實際使用的 token 數。
+        """
+        for attempt in range(1, max_attempts + 1):
+            lease = self.acquire(tokens)
+            try:
+                result = fn(lease.client)
+            except Exception as e:
+                kind = self.release(lease, error=e)
+                if kind is None or attempt == max_attempts:
+                    raise
+                continue
+            self.release(lease, tokens_used=usage(result) if usage else None)
+            return result
+
+    async def acall(self, fn, tokens=0, max_attempts=4, usage=None):
+        """asyncio 版本的 call()：fn(client) 需回傳 awaitable (例如 client.aio.models.generate_content)。"""
+        for attempt in range(1, max_attempts + 1):
+            lease = await self.acquire_async(tokens)
+            try:
+                result = await fn(lease.client)
+            except Exception as e:
+                kind = self.release(lease, error=e)
+                if kind is None or attempt == max_attempts:
+                    raise
+                continue
+            self.release(lease, tokens_used=usage(result) if usage else None)
+            return result
+
+    def stats(self):
+        """Per-key usage snapshot (keys are masked)."""
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                'key': state.label(),
+                'requests': state.requests,
+                'successes': state.successes,
+                'throttled': state.throttled,
+                'errors': state.errors,
+                'tokens': state.tokens_used,
+                'in_flight': state.in_flight,
+                'health': round(state.health, 2),
+                'cooldown': round(max(state.cooldown_until - now, 0), 1),
+                'last_error': state.last_error,
+            } for state in self.keys]
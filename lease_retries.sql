@@ -0,0 +1,128 @@
+-- Lease heartbeats, expired-lease reaper and scheduled retries for the worker queue
+-- Run this in your Supabase SQL Editor (after claim_tasks.sql)
+
+-- 1. Retry bookkeeping
+ALTER TABLE en_videos
+ADD COLUMN IF NOT EXISTS attempt_count INT DEFAULT 0,
+ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN en_videos.status IS 'Status of AI processing: pending, processing, completed, error, dead (retries exhausted)';
+
+-- 2. Claim: only rows whose retry time has come; every claim counts as an attempt
+-- (so a video that keeps crashing the worker still ends up in the dead-letter state)
+CREATE OR REPLACE FUNCTION claim_en_videos(
+    p_worker TEXT,
+    p_limit INT DEFAULT 1,
+    p_lease_seconds INT DEFAULT 600
+)
+RETURNS SETOF en_videos
+LANGUAGE sql
+AS $$
+    UPDATE en_videos v
+    SET status = 'processing',
+        lease_owner = p_worker,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+        attempt_count = COALESCE(v.attempt_count, 0) + 1
+    WHERE v.video_id IN (
+        SELECT video_id
+        FROM en_videos
+        WHERE status = 'pending'
+          AND (next_attempt_at IS NULL OR next_attempt_at <= now())
+        ORDER BY created_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING v.*;
+$$;
+
+-- 3. Heartbeat: extend the lease of rows this worker still owns.
+-- Returns the ids that are still held (a missing id means the lease was lost).
+CREATE OR REPLACE FUNCTION heartbeat_en_videos(
+    p_worker TEXT,
+    p_video_ids TEXT[],
+    p_lease_seconds INT DEFAULT 600
+)
+RETURNS SETOF TEXT
+LANGUAGE sql
+AS $$
+    UPDATE en_videos
+    SET lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    WHERE video_id = ANY(p_video_ids)
+      AND lease_owner = p_worker
+      AND status = 'processing'
+    RETURNING video_id;
+$$;
+
+-- 4. Failure: transient errors go back to pending with exponential backoff,
+-- permanent errors become 'error', and exhausted rows become 'dead'.
+CREATE OR REPLACE FUNCTION fail_en_videos(
+    p_worker TEXT,
+    p_video_id TEXT,
+    p_error TEXT,
+    p_retryable BOOLEAN DEFAULT true,
+    p_max_attempts INT DEFAULT 5,
+    p_base_delay_seconds INT DEFAULT 60
+)
+RETURNS SETOF en_videos
+LANGUAGE sql
+AS $$
+    UPDATE en_videos v
+    SET status = CASE
+            WHEN NOT p_retryable THEN 'error'
+            WHEN COALESCE(v.attempt_count, 0) >= p_max_attempts THEN 'dead'
+            ELSE 'pending'
+        END,
+        next_attempt_at = CASE
+            WHEN p_retryable AND COALESCE(v.attempt_count, 0) < p_max_attempts
+            THEN now() + make_interval(secs => LEAST(p_base_delay_seconds * power(2, GREATEST(COALESCE(v.attempt_count, 1) - 1, 0)), 6 * 3600))
+            ELSE NULL
+        END,
+        processing_error = p_error,
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE v.video_id = p_video_id
+      AND (v.lease_owner = p_worker OR v.lease_owner IS NULL)
+    RETURNING v.*;
+$$;
+
+-- 5. Reaper: return rows whose lease expired (worker died) to the queue
+CREATE OR REPLACE FUNCTION reap_en_videos(
+    p_max_attempts INT DEFAULT 5,
+    p_base_delay_seconds INT DEFAULT 60
+)
+RETURNS SETOF en_videos
+LANGUAGE sql
+AS $$
+    UPDATE en_videos v
+    SET status = CASE WHEN COALESCE(v.attempt_count, 0) >= p_max_attempts THEN 'dead' ELSE 'pending' END,
+        next_attempt_at = CASE
+            WHEN COALESCE(v.attempt_count, 0) < p_max_attempts
+            THEN now() + make_interval(secs => LEAST(p_base_delay_seconds * power(2, GREATEST(COALESCE(v.attempt_count, 1) - 1, 0)), 6 * 3600))
+            ELSE NULL
+        END,
+        processing_error = 'Lease expired (worker stopped responding)',
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE v.status = 'processing'
+      AND v.lease_expires_at < now()
+    RETURNING v.*;
+$$;
+
+-- 6. Manual retry from the web app (status -> pending) starts a fresh attempt budget
+CREATE OR REPLACE FUNCTION en_videos_reset_attempts()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.status = 'pending' AND OLD.status IN ('error', 'dead') THEN
+        NEW.attempt_count := 0;
+        NEW.next_attempt_at := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_en_videos_reset_attempts ON en_videos;
+CREATE TRIGGER trg_en_videos_reset_attempts
+BEFORE UPDATE OF status ON en_videos
+FOR EACH ROW EXECUTE FUNCTION en_videos_reset_attempts();
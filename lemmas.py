@@ -0,0 +1,68 @@
+import re
+
+# Irregular forms that the suffix rules below cannot reach
+IRREGULAR = {
+    'am': 'be', 'is': 'be', 'are': 'be', 'was': 'be', 'were': 'be', 'been': 'be', 'being': 'be',
+    'has': 'have', 'had': 'have', 'does': 'do', 'did': 'do', 'done': 'do',
+    'went': 'go', 'gone': 'go', 'goes': 'go', 'made': 'make', 'took': 'take', 'taken': 'take',
+    'got': 'get', 'gotten': 'get', 'said': 'say', 'says': 'say', 'thought': 'think',
+    'brought': 'bring', 'bought': 'buy', 'came': 'come', 'knew': 'know', 'known': 'know',
+    'saw': 'see', 'seen': 'see', 'gave': 'give', 'given': 'give', 'found': 'find', 'told': 'tell',
+    'felt': 'feel', 'left': 'leave', 'kept': 'keep', 'began': 'begin', 'begun': 'begin',
+    'ran': 'run', 'wrote': 'write', 'written': 'write', 'spoke': 'speak', 'spoken': 'speak',
+    'chose': 'choose', 'chosen': 'choose', 'grew': 'grow', 'grown': 'grow', 'drove': 'drive',
+    'driven': 'drive', 'ate': 'eat', 'eaten': 'eat', 'fell': 'fall', 'fallen': 'fall',
+    'held': 'hold', 'stood': 'stand', 'understood': 'understand', 'meant': 'mean', 'met': 'meet',
+    'paid': 'pay', 'sent': 'send', 'spent': 'spend', 'built': 'build', 'lost': 'lose',
+    'sold': 'sell', 'taught': 'teach', 'caught': 'catch', 'fought': 'fight', 'led': 'lead',
+    'children': 'child', 'men': 'man', 'women': 'woman', 'feet': 'foot', 'teeth': 'tooth',
+    'mice': 'mouse', 'lives': 'life', 'wives': 'wife', 'knives': 'knife', 'leaves': 'leaf',
+    'better': 'good', 'best': 'good', 'worse': 'bad', 'worst': 'bad',
+}
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+# normalize_word keeps digits: "covid-19" and "covid" are different entries
+_SURFACE_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)?")
+_VOWELS = set('aeiou')
+
+def _stem(word):
+    if word.endswith("'s"):
+        word = word[:-2]
+    if word in IRREGULAR:
+        word = IRREGULAR[word]
+    elif len(word) > 4 and word.endswith(('ies', 'ied')):
+        word = word[:-3] + 'y'
+    elif len(word) > 4 and word.endswith(('sses', 'ches', 'shes', 'xes', 'zes')):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    elif len(word) > 5 and word.endswith('ing'):
+        word = word[:-3]
+    elif len(word) > 3 and word.endswith('ed') and not word.endswith('eed'):
+        word = word[:-2]
+
+    # Normalise the base so that inflected and plain forms meet:
+    # make/making -> mak, stop/stopped -> stop (doubled consonant), fall/falling -> fal
+    if len(word) > 2 and word.endswith('e') and not word.endswith('ee'):
+        word = word[:-1]
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in _VOWELS:
+        word = word[:-1]
+    return word
+
+def normalize_word(text):
+    """
+    單字 / 片語的原樣比對鍵：小寫、統一撇號、空白正規化 ("Figure  Out" -> "figure out")。
+    不同的字不會共用這個鍵 (lemma_key 會：care / car、note / not 都變成同一個 stem)。
+    """
+    return ' '.join(_SURFACE_RE.findall(text.lower().replace('’', "'")))
+
+def word_key(word):
+    """lemma_key for a single lowercase word, without the regex pass (for per-token loops)."""
+    return _stem(word)
+
+def lemma_key(text):
+    """
+    單字 / 片語的比對鍵 (不是給人看的原形)：went -> go, figured out -> figur out, studies -> study。
+    用於跨段落去除重複單字、詞庫查詢等需要「同一個字」判斷的地方。
+    """
+    return ' '.join(_stem(w) for w in _WORD_RE.findall(text.lower().replace('’', "'")))
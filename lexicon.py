@@ -0,0 +1,203 @@
+"""
+共用詞庫：以原樣正規化的單字 / 片語 (normalize_word) 為鍵保存音標、解釋與例句 (來自過去的分析結果)。
+prompt 只列出「出現在這份逐字稿、且詞庫已有」的字，模型選到它們時只回傳 word，
+其餘欄位由詞庫補上，減少 Gemini 的輸出 token 與回應時間。
+lemma_key 會讓不同的字共用一個 stem (care / car)，所以只用來找片語的變化形 (figured out -> figure out)。
+
+    python lexicon.py learning_data.json [more.json ...]   # 從過去的分析結果建立詞庫
+    python lexicon.py --supabase                           # 從 en_videos 中已完成的影片建立詞庫
+"""
+import os
+import sys
+import time
+import threading
+from local_store import CACHE_DIR, SQLiteStore
+from lemmas import lemma_key, normalize_word
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "lexicon.sqlite3")
+# Known words listed in one prompt (most used first); keeps the prompt overhead small
+MAX_KNOWN_WORDS = 200
+# Longest phrase looked up in the transcript ("get rid of")
+MAX_PHRASE_WORDS = 4
+FIELDS = ('phonetic', 'definition', 'definition_zh', 'example', 'example_zh')
+# An entry is only stored / reused when it has these
+REQUIRED_FIELDS = ('definition', 'definition_zh')
+SUPABASE_PAGE_SIZE = 500
+
+class Lexicon(SQLiteStore):
+    """
+    詞庫本體 (本機 SQLite，與其他快取一起存在 .cache)。
+    已知的鍵與使用次數會在第一次使用時載入記憶體，之後以集合查詢逐字稿中的單字與片語。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS words (
+            key TEXT PRIMARY KEY,
+            lemma TEXT NOT NULL,
+            word TEXT NOT NULL,
+            phonetic TEXT,
+            definition TEXT NOT NULL,
+            definition_zh TEXT NOT NULL,
+            example TEXT,
+            example_zh TEXT,
+            uses INTEGER NOT NULL DEFAULT 1,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        super().__init__(path)
+        self._uses = None      # key -> uses, loaded on first use
+        self._phrases = None   # lemma of a phrase -> its key (secondary lookup for inflected phrases)
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        """Lexicons written before the words table were keyed by lemma; re-key their entries by word."""
+        exists = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries'"
+        if not self.conn.execute(exists).fetchone():
+            return
+        with self.transaction() as conn:
+            if not conn.execute(exists).fetchone():
+                return    # another process migrated it meanwhile
+            rows = conn.execute("SELECT word, phonetic, definition, definition_zh, example, example_zh, uses, created_at "
+                                "FROM entries").fetchall()
+            conn.executemany(
+                "INSERT OR IGNORE INTO words (key, lemma, word, phonetic, definition, definition_zh, example, example_zh, "
+                "uses, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(normalize_word(row['word']), lemma_key(row['word']), *row) for row in rows if normalize_word(row['word'])])
+            conn.execute("DROP TABLE entries")
+
+    def _known(self):
+        with self._lock:
+            if self._uses is None:
+                self._migrate()
+                self._uses = {}
+                self._phrases = {}
+                for row in self.conn.execute("SELECT key, lemma, uses FROM words"):
+                    self._uses[row['key']] = row['uses']
+                    if ' ' in row['key']:
+                        self._phrases.setdefault(row['lemma'], row['key'])
+            return self._uses
+
+    def __len__(self):
+        return len(self._known())
+
+    def known_words(self, text, limit=MAX_KNOWN_WORDS):
+        """Lexicon words / phrases that occur in `text`, most used first (as stored, e.g. 'figure out')."""
+        uses = self._known()
+        if not uses:
+            return []
+        tokens = normalize_word(text).split()
+        stems = lemma_key(' '.join(tokens)).split()
+        found = set()
+        for n in range(1, MAX_PHRASE_WORDS + 1):
+            for i in range(len(tokens) - n + 1):
+                key = ' '.join(tokens[i:i + n])
+                if key in uses:
+                    found.add(key)
+                elif n > 1:
+                    # "figured out" -> "figure out"; single words only match exactly
+                    phrase = self._phrases.get(' '.join(stems[i:i + n]))
+                    if phrase:
+                        found.add(phrase)
+        ranked = sorted(found, key=lambda key: -uses[key])[:limit]
+        if not ranked:
+            return []
+        rows = self.conn.execute(
+            f"SELECT key, word FROM words WHERE key IN ({','.join('?' * len(ranked))})", ranked).fetchall()
+        words = {row['key']: row['word'] for row in rows}
+        return [words[key] for key in ranked if key in words]
+
+    def fill(self, vocabulary):
+        """
+        補齊只有 word 的項目 (模型選用了詞庫中的字)，只在 word 與詞庫的字完全相同時補上。回傳補齊的數量；
+        其餘項目維持原樣，之後會被 validate_analysis 當成不完整的項目丟掉，再由追加請求向模型要完整欄位。
+        """
+        pending = {}
+        for item in vocabulary:
+            if isinstance(item, dict) and item.get('word') and not all(item.get(f) for f in REQUIRED_FIELDS):
+                pending.setdefault(normalize_word(str(item['word'])), []).append(item)
+        pending.pop('', None)
+        if not pending:
+            return 0
+        keys = list(pending)
+        rows = self.conn.execute(
+            f"SELECT * FROM words WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        filled = 0
+        for row in rows:
+            for item in pending[row['key']]:
+                for field in FIELDS:
+                    if not item.get(field):
+                        item[field] = row[field] or ''
+                filled += 1
+        if rows:
+            used = [row['key'] for row in rows]
+            with self.transaction() as conn:
+                conn.executemany("UPDATE words SET uses = uses + 1 WHERE key = ?", [(k,) for k in used])
+            self._known()
+            with self._lock:
+                for key in used:
+                    self._uses[key] = self._uses.get(key, 0) + 1
+        return filled
+
+    def learn(self, vocabulary):
+        """Store complete entries that are not in the lexicon yet; returns how many were added."""
+        rows = {}
+        now = time.time()
+        for item in vocabulary:
+            if not isinstance(item, dict) or not item.get('word') or not all(item.get(f) for f in REQUIRED_FIELDS):
+                continue
+            word = str(item['word']).strip()
+            key = normalize_word(word)
+            if key and key not in rows:
+                rows[key] = (key, lemma_key(word), word, *(str(item.get(f) or '') for f in FIELDS), now)
+        if not rows:
+            return 0
+        known = self._known()
+        new_rows = [row for key, row in rows.items() if key not in known]
+        if not new_rows:
+            return 0
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO words (key, lemma, word, phonetic, definition, definition_zh, example, example_zh, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", new_rows)
+            added = conn.total_changes - before
+        with self._lock:
+            for row in new_rows:
+                self._uses.setdefault(row[0], 1)
+                if ' ' in row[0]:
+                    self._phrases.setdefault(row[1], row[0])
+        return added
+
+    def stats(self):
+        return {'entries': len(self._known())}
+
+def _vocabulary_from_files(paths):
+    from bulk_loader import iter_records
+    for path in paths:
+        for record in iter_records(path):
+            yield record.get('vocabulary') or []
+
+def _vocabulary_from_supabase():
+    from study_ai import get_supabase
+    client = get_supabase()
+    start = 0
+    while True:
+        rows = client.table('en_videos').select('vocabulary').eq('status', 'completed') \
+            .range(start, start + SUPABASE_PAGE_SIZE - 1).execute().data
+        for row in rows:
+            yield row.get('vocabulary') or []
+        if len(rows) < SUPABASE_PAGE_SIZE:
+            return
+        start += SUPABASE_PAGE_SIZE
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    source = _vocabulary_from_supabase() if "--supabase" in args else \
+        _vocabulary_from_files([a for a in args if not a.startswith("--")] or ["learning_data.json"])
+    lexicon = Lexicon()
+    videos = added = 0
+    for vocabulary in source:
+        videos += 1
+        added += lexicon.learn(vocabulary)
+    print(f"📚 詞庫新增 {added} 個單字 (來自 {videos} 部影片)，共 {len(lexicon)} 個")
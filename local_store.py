@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import threading
+
+# Local cache directory shared by the worker's on-disk stores (transcripts, AI results, ...)
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+class SQLiteStore:
+    """
+    本機 SQLite 檔案的共用基底：每個執行緒各自一條連線，WAL 模式讓多個行程
+    (例如同時跑兩個 worker) 可以安全地同時讀寫同一個檔案。
+    """
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK (takes the write lock up front, so no upgrade deadlocks)."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from local_store import CACHE_DIR
+
+# Seconds; covers cache hits (ms) up to long Gemini calls (minutes)
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Recent samples per stage kept for exact p50 / p95 / p99 in the JSON snapshot
+SAMPLE_WINDOW = 1024
+RECENT_SPANS = 200
+
+JSON_PATH = os.getenv("METRICS_JSON", os.path.join(CACHE_DIR, "worker_metrics.json"))
+JSON_INTERVAL_SECONDS = 15
+
+def _percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)] if ordered else None
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.samples.append(value)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'p50': _percentile(ordered, 0.5),
+            'p95': _percentile(ordered, 0.95),
+            'p99': _percentile(ordered, 0.99),
+        }
+
+class Span:
+    """One timed stage of a task; extra fields (chars, bytes, retries, ...) are added with set()."""
+    __slots__ = ('stage', 'fields', 'start', 'outcome')
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+        self.start = time.monotonic()
+        self.outcome = 'ok'
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+class Metrics:
+    """
+    Worker 的輕量指標：每個階段 (span) 的耗時直方圖、結果計數與數值欄位累計，
+    加上 gauge (佇列深度等) 與 videos/hour。只在記憶體中累加，匯出時才整理，
+    可以常駐在正式環境。
+    """
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.histograms = defaultdict(Histogram)          # stage -> Histogram
+        self.outcomes = defaultdict(int)                  # (stage, outcome) -> count
+        self.totals = defaultdict(float)                  # (stage, field) -> sum
+        self.gauges = {}
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self._collectors = []
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """
+        with metrics.span('gemini', chars=len(text)) as span: ...
+        巢狀的 span 會沿用外層的 video_id。
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if 'video_id' not in fields and stack:
+            video_id = stack[-1].fields.get('video_id')
+            if video_id:
+                fields['video_id'] = video_id
+        span = Span(stage, fields)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.outcome = 'error'
+            span.fields.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            stack.pop()
+            self._finish(span, time.monotonic() - span.start)
+
+    def _finish(self, span, duration):
+        with self._lock:
+            self.histograms[span.stage].observe(duration)
+            self.outcomes[(span.stage, span.outcome)] += 1
+            for field, value in span.fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.totals[(span.stage, field)] += value
+            self.recent.append(dict(span.fields, stage=span.stage, outcome=span.outcome,
+                                    seconds=round(duration, 4), at=round(time.time(), 3)))
+
+    def observe(self, stage, seconds, outcome='ok', **fields):
+        """Record a span whose start and end happen in different places (e.g. a pipelined task)."""
+        span = Span(stage, fields)
+        span.outcome = outcome
+        self._finish(span, seconds)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def register_collector(self, fn):
+        """fn() -> {gauge name: value}; evaluated at export time (e.g. key pool stats)."""
+        self._collectors.append(fn)
+
+    def _collected(self):
+        gauges = dict(self.gauges)
+        for fn in self._collectors:
+            try:
+                gauges.update(fn())
+            except Exception as e:
+                gauges['collector_errors'] = gauges.get('collector_errors', 0) + 1
+        return gauges
+
+    def videos_per_hour(self):
+        completed = self.outcomes.get(('task', 'ok'), 0)
+        return completed / max((time.time() - self.started) / 3600, 1e-6)
+
+    # --- Export ---
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: hist.summary() for stage, hist in self.histograms.items()}
+            outcomes = defaultdict(dict)
+            for (stage, outcome), count in self.outcomes.items():
+                outcomes[stage][outcome] = count
+            totals = defaultdict(dict)
+            for (stage, field), value in self.totals.items():
+                totals[stage][field] = value
+            recent = list(self.recent)
+            videos_per_hour = self.videos_per_hour()
+        for stage, summary in stages.items():
+            summary['outcomes'] = outcomes.get(stage, {})
+            summary['totals'] = totals.get(stage, {})
+        return {
+            'updated_at': time.time(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'videos_per_hour': round(videos_per_hour, 2),
+            'gauges': self._collected(),
+            'stages': stages,
+            'recent_spans': recent,
+        }
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE worker_stage_seconds histogram")
+            for stage, hist in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append(f'worker_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'worker_stage_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'worker_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+            lines.append("# TYPE worker_stage_total counter")
+            for (stage, outcome), count in self.outcomes.items():
+                lines.append(f'worker_stage_total{{stage="{stage}",outcome="{outcome}"}} {count}')
+            lines.append("# TYPE worker_stage_field_total counter")
+            for (stage, field), value in self.totals.items():
+                lines.append(f'worker_stage_field_total{{stage="{stage}",field="{field}"}} {value:g}')
+            videos_per_hour = self.videos_per_hour()
+        lines.append("# TYPE worker_videos_per_hour gauge")
+        lines.append(f"worker_videos_per_hour {videos_per_hour:.4f}")
+        for name, value in self._collected().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE worker_{name} gauge")
+                lines.append(f"worker_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path=JSON_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def start_json_writer(self, path=JSON_PATH, interval=JSON_INTERVAL_SECONDS):
+        """Rewrite the JSON stats file every `interval` seconds from a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_json(path)
+                except Exception as e:
+                    print(f"   ⚠️ Metrics JSON write failed: {e}")
+        threading.Thread(target=run, daemon=True, name="metrics-json").start()
+
+    def start_http_server(self, port, host="0.0.0.0"):
+        """GET /metrics -> Prometheus text, GET /stats -> JSON snapshot."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body, content_type = registry.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/stats"):
+                    body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        print(f"📈 Metrics on http://{host}:{port}/metrics")
+        return server
+
+# Process-wide registry
+metrics = Metrics()
@@ -0,0 +1,21 @@
+-- Push notifications for new work on en_videos (worker wake-up via LISTEN/NOTIFY)
+-- Run this in your Supabase SQL Editor
+
+-- Notify on new pending rows and on manual retries (error/dead -> pending).
+-- The payload is the video_id; workers only use it as a wake-up signal and still claim through claim_en_videos().
+CREATE OR REPLACE FUNCTION en_videos_notify_pending()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.status = 'pending' AND (TG_OP = 'INSERT' OR OLD.status IN ('error', 'dead')) THEN
+        PERFORM pg_notify('en_videos_pending', NEW.video_id);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_en_videos_notify_pending ON en_videos;
+CREATE TRIGGER trg_en_videos_notify_pending
+AFTER INSERT OR UPDATE OF status ON en_videos
+FOR EACH ROW EXECUTE FUNCTION en_videos_notify_pending();
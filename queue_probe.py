@@ -0,0 +1,71 @@
+"""
+只用標準函式庫的佇列探測：一個 PostgREST 請求檢查 en_videos 是否有工作可做
+(到期的 pending 任務，或租約已過期、需要 reaper 收回的 processing 任務)。
+cron 啟動 worker 時大多數時候佇列是空的，這樣不必載入 yt_dlp / google.genai / supabase 就能結束。
+
+    python queue_probe.py      # 有工作 (或無法判斷) -> exit 0，佇列是空的 -> exit 1
+                               # 在 GitHub Actions 中另外寫入 has_work=true/false 到 $GITHUB_OUTPUT
+"""
+import os
+import sys
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+PROBE_TIMEOUT_SECONDS = 5
+
+def _load_env():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:   # e.g. the workflow's probe step, before dependencies are installed
+        return
+    load_dotenv()
+
+def _work_filter(now):
+    """Same rows claim_en_videos() / reap_en_videos() would act on (see lease_retries.sql)."""
+    ts = f'"{now.isoformat(timespec="seconds")}"'
+    return (f"(and(status.eq.pending,or(next_attempt_at.is.null,next_attempt_at.lte.{ts})),"
+            f"and(status.eq.processing,lease_expires_at.lt.{ts}))")
+
+def _get(url, key, params, timeout):
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/rest/v1/en_videos?{urllib.parse.urlencode(params)}",
+        headers={'apikey': key, 'Authorization': f"Bearer {key}", 'Accept': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b'[]')
+
+def has_work(url=None, key=None, timeout=PROBE_TIMEOUT_SECONDS):
+    """
+    True / False，無法判斷 (網路錯誤、尚未設定等) 時回傳 None，呼叫端應照常執行 worker。
+    """
+    if url is None or key is None:
+        _load_env()
+        url = url or os.getenv("SUPABASE_URL")
+        key = key or os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        return None
+
+    params = {'select': 'video_id', 'limit': 1, 'or': _work_filter(datetime.now(timezone.utc))}
+    try:
+        try:
+            rows = _get(url, key, params, timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 400:
+                raise
+            # Schema without lease_retries.sql (no next_attempt_at / lease columns)
+            rows = _get(url, key, {'select': 'video_id', 'limit': 1, 'status': 'eq.pending'}, timeout)
+    except Exception as e:
+        print(f"   ⚠️ Queue probe failed, running the worker anyway: {e}")
+        return None
+    return bool(rows)
+
+if __name__ == "__main__":
+    work = has_work()
+    print(f"🔎 Queue probe: {'work to do' if work else 'empty' if work is False else 'unknown'}")
+    output = os.getenv("GITHUB_OUTPUT")
+    if output:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(f"has_work={'false' if work is False else 'true'}\n")
+    sys.exit(1 if work is False else 0)
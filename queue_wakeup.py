@@ -0,0 +1,120 @@
+import os
+import time
+import select
+import threading
+
+# Channel used by the en_videos_notify_pending() trigger (see notify_tasks.sql)
+NOTIFY_CHANNEL = "en_videos_pending"
+
+class AdaptiveBackoff:
+    """
+    閒置時的輪詢間隔：每次撲空就加倍 (min_delay -> max_delay)，拿到任務後重設。
+    有推播時它只是保底；沒有推播時它取代固定的 10 秒輪詢。
+    """
+    def __init__(self, min_delay=1.0, max_delay=60.0, factor=2.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self._delay = min_delay
+
+    def next_delay(self):
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.max_delay)
+        return delay
+
+    def reset(self):
+        self._delay = self.min_delay
+
+class PollingWaker:
+    """No push channel available: just sleep for the backoff delay."""
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        pass
+
+class InProcessWaker:
+    """
+    行程內的替身 (threading.Event)，用於測試推播路徑：
+    呼叫 notify() 就會讓正在 wait() 的 worker 立即醒來。
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def notify(self, payload=None):
+        self._event.set()
+
+    def wait(self, timeout):
+        woke = self._event.wait(timeout)
+        self._event.clear()
+        return woke
+
+    def close(self):
+        pass
+
+class PgNotifyWaker:
+    """
+    以 Postgres LISTEN/NOTIFY 等待新任務 (需要 psycopg2 與資料庫直連字串，
+    Supabase 專案的 Database -> Connection string)。連線中斷時自動重連，
+    期間的行為退化成一般輪詢。
+    """
+    def __init__(self, dsn, channel=NOTIFY_CHANNEL):
+        import psycopg2 # Optional dependency, only needed for push wake-up
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self.channel = channel
+        self.conn = None
+        self._connect()
+
+    def _connect(self):
+        conn = self._psycopg2.connect(self.dsn)
+        conn.set_isolation_level(0) # autocommit, required for LISTEN
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}";')
+        self.conn = conn
+
+    def _drain(self):
+        self.conn.poll()
+        got = bool(self.conn.notifies)
+        self.conn.notifies.clear()
+        return got
+
+    def wait(self, timeout):
+        try:
+            if self.conn is None:
+                self._connect()
+            # Notifications that arrived while the worker was busy are already buffered
+            if self._drain():
+                return True
+            if select.select([self.conn], [], [], timeout) == ([], [], []):
+                return False
+            return self._drain()
+        except Exception as e:
+            print(f"   ⚠️ LISTEN connection lost, falling back to polling: {e}")
+            self.close()
+            time.sleep(timeout)
+            return False
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+def create_waker():
+    """
+    有設定 DATABASE_URL 且安裝 psycopg2 時使用 LISTEN/NOTIFY，否則退回輪詢。
+    """
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        return PollingWaker()
+    try:
+        waker = PgNotifyWaker(dsn)
+        print(f"📡 Listening for new tasks on channel '{NOTIFY_CHANNEL}'")
+        return waker
+    except Exception as e:
+        print(f"   ⚠️ Push wake-up unavailable ({e}), using adaptive polling")
+        return PollingWaker()
@@ -0,0 +1,135 @@
+"""
+study_ai.main 的逐筆輸出：每完成一部影片就附加一行到 learning_data.jsonl，
+並在 learning_data.done 記錄已完成的 video_id，中斷後重新執行會從未完成的影片繼續。
+
+    python result_log.py        # 把 learning_data.jsonl 整理成 learning_data.json (舊格式)
+"""
+import os
+import sys
+import json
+import time
+
+JSONL_PATH = "learning_data.jsonl"
+JSON_PATH = "learning_data.json"
+# fsync after this many records or this many seconds, whichever comes first
+FSYNC_EVERY = 10
+FSYNC_INTERVAL_SECONDS = 5.0
+
+def _repair_tail(path):
+    """Drop a half-written last line left by a crash, so every line is a complete record."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # Walk back to the last newline
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            cut = chunk.rfind(b'\n')
+            if cut >= 0:
+                f.truncate(pos + cut + 1)
+                return
+        f.truncate(0)
+
+class ResultLog:
+    """
+    附加式 JSONL 結果檔 + 完成清單 (checkpoint)。
+    資料先寫入 JSONL 並 fsync，之後才寫入 checkpoint，所以 checkpoint 中的影片一定已經存檔。
+    """
+    def __init__(self, path=JSONL_PATH, checkpoint_path=None,
+                 fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL_SECONDS):
+        self.path = path
+        self.checkpoint_path = checkpoint_path or os.path.splitext(path)[0] + ".done"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.done = set()
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                self.done.update(line.strip() for line in f if line.strip())
+        _repair_tail(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._checkpoint = open(self.checkpoint_path, 'a', encoding='utf-8')
+        self._unsynced = []   # video_ids written but not yet fsynced / checkpointed
+        self._last_sync = time.monotonic()
+
+    def __contains__(self, video_id):
+        return video_id in self.done
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._unsynced.append(record.get('video_id'))
+        if len(self._unsynced) >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.flush()
+
+    def mark_done(self, video_id):
+        """Record a video that needs no output (e.g. no captions) so a restart skips it too."""
+        self._unsynced.append(video_id)
+        self.flush()
+
+    def flush(self):
+        if not self._unsynced:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        ids = [video_id for video_id in self._unsynced if video_id]
+        self._checkpoint.write("".join(f"{video_id}\n" for video_id in ids))
+        self._checkpoint.flush()
+        os.fsync(self._checkpoint.fileno())
+        self.done.update(ids)
+        self._unsynced = []
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._checkpoint.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def compact_to_json(jsonl_path=JSONL_PATH, json_path=JSON_PATH):
+    """
+    JSONL -> learning_data.json (JSON 陣列，與舊版輸出格式相同)。
+    同一個 video_id 出現多次時保留最後一筆；逐行處理，不必整份載入。
+    """
+    if not os.path.exists(jsonl_path):
+        return 0
+    last_line = {}
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                last_line[json.loads(line).get('video_id')] = number
+
+    keep = set(last_line.values())
+    tmp_path = json_path + ".tmp"
+    count = 0
+    with open(jsonl_path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+        dst.write("[")
+        for number, line in enumerate(src):
+            if number not in keep:
+                continue
+            record = json.loads(line)
+            dst.write(",\n" if count else "\n")
+            dst.write("\n".join("  " + part for part in
+                                json.dumps(record, ensure_ascii=False, indent=2).split("\n")))
+            count += 1
+        dst.write("\n]" if count else "]")
+    os.replace(tmp_path, json_path)
+    return count
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    n = compact_to_json(*args[:2])
+    print(f"✅ 已輸出 {n} 筆到 {args[1] if len(args) > 1 else JSON_PATH}")
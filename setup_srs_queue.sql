@@ -0,0 +1,46 @@
+-- Batch SRS scheduling: review log, precomputed daily review queues
+-- Run this in your Supabase SQL Editor (after setup_srs.sql), then run `python srs_scheduler.py`
+
+-- 1. Grades from the review deck are appended here; srs_scheduler.py applies them to en_study_progress
+-- in bulk (the review page's interval rules) and sets applied_at
+CREATE TABLE IF NOT EXISTS en_review_log (
+  id BIGSERIAL PRIMARY KEY,
+  progress_id UUID NOT NULL REFERENCES en_study_progress(id) ON DELETE CASCADE,
+  quality INT NOT NULL CHECK (quality BETWEEN 0 AND 5),   -- 0 again, 3 hard, 4 good, 5 easy
+  reviewed_at TIMESTAMPTZ DEFAULT now(),
+  applied_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_en_review_log_pending
+ON en_review_log (id) WHERE applied_at IS NULL;
+
+-- The scheduler only reads cards due within its horizon
+CREATE INDEX IF NOT EXISTS idx_en_study_progress_next_review
+ON en_study_progress (next_review_date);
+
+-- 2. One row per card due in the next days (overdue cards are due today), with the word payload the
+-- deck shows, so the review page needs a single query instead of reading every video's vocabulary
+CREATE TABLE IF NOT EXISTS en_review_queue (
+  progress_id UUID PRIMARY KEY REFERENCES en_study_progress(id) ON DELETE CASCADE,
+  due_date DATE NOT NULL,
+  position INT NOT NULL,                    -- order within the day: most overdue first
+  video_id TEXT NOT NULL,
+  word TEXT NOT NULL,
+  status TEXT,
+  interval INT,
+  streak INT,
+  details JSONB,                            -- phonetic, definition, definition_zh, example, example_zh
+  generated_at TIMESTAMPTZ NOT NULL
+);
+
+-- Earlier versions also copied easiness_factor, which the review rules never change
+ALTER TABLE en_review_queue DROP COLUMN IF EXISTS easiness_factor;
+
+CREATE INDEX IF NOT EXISTS idx_en_review_queue_day
+ON en_review_queue (due_date, position);
+
+ALTER TABLE en_review_log ENABLE ROW LEVEL SECURITY;
+ALTER TABLE en_review_queue ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow generic access" ON en_review_log FOR ALL USING (true) WITH CHECK (true);
+CREATE POLICY "Allow generic access" ON en_review_queue FOR ALL USING (true) WITH CHECK (true);
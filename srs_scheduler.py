@@ -0,0 +1,284 @@
+"""
+批次 SRS 排程：把複習頁寫入 en_review_log 的評分一次套用到 en_study_progress (NumPy 陣列運算，
+不逐筆計算)，再預先算出未來幾天每天的複習佇列 (en_review_queue，附上字卡需要的音標、解釋與例句)，
+複習頁只要一次查詢就能組出今天的字卡，不必再讀每部影片的 vocabulary JSONB。
+
+    python srs_scheduler.py               # 套用新的評分並重建未來 7 天的複習佇列
+    python srs_scheduler.py --days 14     # 佇列涵蓋的天數
+    python srs_scheduler.py --dry-run     # 只計算並顯示統計，不寫回
+
+資料表見 setup_srs_queue.sql。
+"""
+import re
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from bulk_loader import BulkLoader
+
+HORIZON_DAYS = 7
+PAGE_SIZE = 1000
+# Ids per `in` filter (keeps the request URL short)
+ID_CHUNK = 200
+
+# Review intervals (days), the rules of web_app/src/srsRules.js; test_srs_rules.py keeps the two in step.
+# "Again" makes the card due at once (the review page keeps it in today's queue until it is applied)
+LAPSE_INTERVAL = 0
+HARD_FACTOR, GOOD_FACTOR, EASY_FACTOR = 1.2, 2.5, 3.5
+MIN_EASY_INTERVAL = 4
+
+STATUSES = ('new', 'learning', 'review', 'mastered')
+NEW, LEARNING, REVIEW, MASTERED = range(len(STATUSES))
+# easiness_factor (SM-2) is not used by these rules, so it is neither read nor written
+PROGRESS_COLUMNS = "id, video_id, word, status, interval, streak, next_review_date, last_reviewed_at"
+DETAIL_FIELDS = ('phonetic', 'definition', 'definition_zh', 'example', 'example_zh')
+_UTC_SUFFIX_RE = re.compile(r'(?:Z|[+-]00(?::?00)?)$')
+DAY = np.timedelta64(1, 'D')
+
+def parse_times(values, default):
+    """ISO 8601 字串 (PostgREST 的 timestamptz) -> datetime64[s] (UTC)；None 以 default 代替。"""
+    normalized = []
+    for value in values:
+        if not value:
+            normalized.append('NaT')
+        elif value.endswith('+00:00'):
+            # What PostgREST returns; the common case is kept free of regex work
+            normalized.append(value[:-6])
+        elif _UTC_SUFFIX_RE.search(value):
+            normalized.append(_UTC_SUFFIX_RE.sub('', value).replace(' ', 'T'))
+        else:
+            moment = datetime.fromisoformat(value).astimezone(timezone.utc)
+            normalized.append(moment.replace(tzinfo=None).isoformat())
+    times = np.array(normalized, dtype='datetime64[us]').astype('datetime64[s]')
+    times[np.isnat(times)] = default
+    return times
+
+def format_times(times):
+    return np.datetime_as_string(times, unit='s', timezone='UTC').tolist()
+
+class Cards:
+    """en_study_progress 資料列的欄位陣列；changed 標記這次有套用評分的卡片。"""
+    def __init__(self, rows, now):
+        self.ids = [row['id'] for row in rows]
+        self.video_ids = [row['video_id'] for row in rows]
+        self.words = [row['word'] for row in rows]
+        codes = {name: code for code, name in enumerate(STATUSES)}
+        self.status = np.array([codes.get(row.get('status'), NEW) for row in rows], dtype=np.int8)
+        self.interval = np.array([row.get('interval') or 0 for row in rows], dtype=np.int64)
+        self.streak = np.array([row.get('streak') or 0 for row in rows], dtype=np.int64)
+        self.next_review = parse_times([row.get('next_review_date') for row in rows], now)
+        self.last_reviewed = parse_times([row.get('last_reviewed_at') for row in rows], now)
+        self.changed = np.zeros(len(rows), dtype=bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def changed_rows(self):
+        index = np.flatnonzero(self.changed)
+        next_review = format_times(self.next_review[index])
+        last_reviewed = format_times(self.last_reviewed[index])
+        return [{
+            'id': self.ids[i],
+            'video_id': self.video_ids[i],
+            'word': self.words[i],
+            'status': STATUSES[self.status[i]],
+            'interval': int(self.interval[i]),
+            'streak': int(self.streak[i]),
+            'next_review_date': next_review[k],
+            'last_reviewed_at': last_reviewed[k],
+        } for k, i in enumerate(index.tolist())]
+
+def next_review(interval, streak, quality):
+    """
+    One grading step for arrays of cards -> (interval, streak, status), as srsRules.nextReview does per card:
+    0 again, 3 hard (×1.2), 4 good (×2.5), 5 easy (×3.5, at least 4 days, mastered); other grades give 1 day.
+    """
+    interval = np.maximum(interval, 0)
+    known = np.maximum(interval, 1)
+    days = np.select(
+        [quality == 0, quality == 3, quality == 4, quality == 5],
+        [np.full_like(interval, LAPSE_INTERVAL),
+         np.maximum(1, np.floor(interval * HARD_FACTOR)).astype(np.int64),
+         np.maximum(1, np.floor(known * GOOD_FACTOR)).astype(np.int64),
+         np.maximum(MIN_EASY_INTERVAL, np.floor(known * EASY_FACTOR)).astype(np.int64)],
+        default=1)
+    streak = np.where(quality == 0, 0, streak + 1)
+    status = np.select([quality == 0, quality == 5], [LEARNING, MASTERED], default=REVIEW)
+    return days, streak, status.astype(np.int8)
+
+def _rank_within_groups(sorted_keys):
+    """0, 1, 2... within each run of equal keys."""
+    n = len(sorted_keys)
+    first = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if n else np.zeros(0, dtype=bool)
+    return np.arange(n) - np.maximum.accumulate(np.where(first, np.arange(n), 0))
+
+def apply_reviews(cards, card_index, quality, reviewed_at):
+    """
+    評分陣列 (卡片索引, 分數, 評分時間) 套用到 cards。同一張卡片可能在兩次執行之間被評分多次：
+    依時間順序處理，每一輪以一次陣列運算處理所有卡片的第 n 次評分。回傳套用的評分數。
+    """
+    order = np.lexsort((reviewed_at, card_index))
+    card_index, quality, reviewed_at = card_index[order], quality[order], reviewed_at[order]
+    rank = _rank_within_groups(card_index)
+    for round_ in range(int(rank.max()) + 1 if len(rank) else 0):
+        selected = rank == round_
+        index, at = card_index[selected], reviewed_at[selected]
+        interval, streak, status = next_review(cards.interval[index], cards.streak[index], quality[selected])
+        cards.interval[index] = interval
+        cards.streak[index] = streak
+        cards.status[index] = status
+        cards.last_reviewed[index] = at
+        cards.next_review[index] = at + interval.astype('timedelta64[D]')
+    cards.changed[card_index] = True
+    return len(card_index)
+
+def build_queues(cards, today, days=HORIZON_DAYS):
+    """
+    卡片索引、到期日與當天順序 (position)，涵蓋 today 起 days 天內到期的卡片 (逾期的算今天)。
+    同一天內：最早到期的優先，其次是 interval 短與 streak 低的 (較不熟的字)。
+    """
+    due_day = cards.next_review.astype('datetime64[D]')
+    index = np.flatnonzero(due_day < today + days * DAY)
+    day = np.maximum(due_day[index], today)
+    order = np.lexsort((cards.streak[index], cards.interval[index], cards.next_review[index], day))
+    index, day = index[order], day[order]
+    return index, day, _rank_within_groups(day)
+
+def _pages(query_fn):
+    start = 0
+    while True:
+        rows = query_fn().range(start, start + PAGE_SIZE - 1).execute().data
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+def _chunks(values, size=ID_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def load_pending_reviews(client):
+    return list(_pages(lambda: client.table('en_review_log').select('id, progress_id, quality, reviewed_at')
+                       .is_('applied_at', 'null').order('id')))
+
+def graded_since(client, after_id):
+    """
+    Cards graded on the review page after log row `after_id` (while a run was working), except those whose
+    latest grade is "again": the page takes graded cards out of today's queue but keeps lapsed ones.
+    """
+    latest = {}
+    for row in _pages(lambda: client.table('en_review_log').select('id, progress_id, quality')
+                      .gt('id', after_id).order('id')):
+        latest[row['progress_id']] = row['quality']
+    return sorted(card_id for card_id, quality in latest.items() if quality != 0)
+
+def load_progress(client, due_before, ids=()):
+    """Cards due before `due_before` (ISO) plus the cards with the given ids."""
+    rows = list(_pages(lambda: client.table('en_study_progress').select(PROGRESS_COLUMNS)
+                       .lt('next_review_date', due_before).order('id')))
+    loaded = {row['id'] for row in rows}
+    missing = sorted(set(ids) - loaded)
+    for chunk in _chunks(missing):
+        rows.extend(client.table('en_study_progress').select(PROGRESS_COLUMNS).in_('id', chunk).execute().data)
+    return rows
+
+def load_details(client, video_ids):
+    """{(video_id, word): 字卡欄位}，來自各影片的 vocabulary；小寫的 word 也可以查到。"""
+    details = {}
+    for chunk in _chunks(sorted(set(video_ids))):
+        for video in client.table('en_videos').select('video_id, vocabulary').in_('video_id', chunk).execute().data:
+            for item in video.get('vocabulary') or []:
+                if not isinstance(item, dict) or not isinstance(item.get('word'), str):
+                    continue
+                detail = {field: item[field] for field in DETAIL_FIELDS if item.get(field)}
+                details.setdefault((video['video_id'], item['word']), detail)
+                details.setdefault((video['video_id'], item['word'].lower()), detail)
+    return details
+
+def queue_rows(cards, index, day, position, details, generated_at):
+    """en_review_queue rows; cards whose word is no longer in the video's vocabulary are left out (as the deck did)."""
+    rows = []
+    dates = np.datetime_as_string(day, unit='D').tolist()
+    for i, due_date, pos in zip(index.tolist(), dates, position.tolist()):
+        key = (cards.video_ids[i], cards.words[i])
+        detail = details.get(key) or details.get((key[0], key[1].lower()))
+        if detail is None:
+            continue
+        rows.append({
+            'progress_id': cards.ids[i],
+            'due_date': due_date,
+            'position': pos,
+            'video_id': cards.video_ids[i],
+            'word': cards.words[i],
+            'status': STATUSES[cards.status[i]],
+            'interval': int(cards.interval[i]),
+            'streak': int(cards.streak[i]),
+            'details': detail,
+            'generated_at': generated_at,
+        })
+    return rows
+
+def run(client, days=HORIZON_DAYS, dry_run=False, now=None):
+    """套用待處理的評分並重建佇列；回傳統計。"""
+    t0 = time.perf_counter()
+    now = np.datetime64(now or datetime.now(timezone.utc).replace(tzinfo=None), 's')
+    today = now.astype('datetime64[D]')
+    generated_at = format_times(np.array([now]))[0]
+
+    reviews = load_pending_reviews(client)
+    due_before = format_times(np.array([(today + days * DAY).astype('datetime64[s]')]))[0]
+    cards = Cards(load_progress(client, due_before, [r['progress_id'] for r in reviews]), now)
+    t_load = time.perf_counter()
+
+    position_of = {card_id: i for i, card_id in enumerate(cards.ids)}
+    known = [r for r in reviews if r['progress_id'] in position_of]
+    applied = apply_reviews(
+        cards,
+        np.array([position_of[r['progress_id']] for r in known], dtype=np.int64),
+        np.clip(np.array([r['quality'] for r in known], dtype=np.int64), 0, 5),
+        parse_times([r.get('reviewed_at') for r in known], now))
+    index, day, position = build_queues(cards, today, days)
+    t_schedule = time.perf_counter()
+
+    details = load_details(client, [cards.video_ids[i] for i in index.tolist()])
+    rows = queue_rows(cards, index, day, position, details, generated_at)
+    per_day = np.unique(np.array([row['due_date'] for row in rows]), return_counts=True) if rows else ([], [])
+    stats = {
+        'reviews': len(reviews),
+        'applied': applied,
+        'cards': len(cards),
+        'queued': len(rows),
+        'without_details': len(index) - len(rows),
+        'per_day': dict(zip([str(d) for d in per_day[0]], [int(c) for c in per_day[1]])),
+        'load_seconds': round(t_load - t0, 2),
+        'schedule_ms': round((t_schedule - t_load) * 1000, 1),
+    }
+    print(f"🗓️ {stats['applied']}/{stats['reviews']} reviews applied, {stats['cards']} cards loaded, "
+          f"{stats['queued']} queued for {days} days ({stats['without_details']} without vocabulary details); "
+          f"load {stats['load_seconds']}s, grading + queues {stats['schedule_ms']} ms")
+    for due_date, count in stats['per_day'].items():
+        print(f"   {due_date}: {count}")
+    if dry_run:
+        return stats
+
+    BulkLoader(client, 'en_study_progress', on_conflict='id').load(cards.changed_rows())
+    for chunk in _chunks([r['id'] for r in reviews]):
+        client.table('en_review_log').update({'applied_at': generated_at}).in_('id', chunk).execute()
+    BulkLoader(client, 'en_review_queue', on_conflict='progress_id').load(rows)
+    # Cards that left the horizon (reviewed, or removed) still carry an older generated_at
+    client.table('en_review_queue').delete().lt('generated_at', generated_at).execute()
+    # Cards graded (and taken out of the queue by the page) during this run were just written back from
+    # the rows loaded at the start; remove them again so they cannot be graded twice
+    regraded = graded_since(client, max((r['id'] for r in reviews), default=0))
+    for chunk in _chunks(regraded):
+        client.table('en_review_queue').delete().in_('progress_id', chunk).execute()
+    stats['regraded'] = len(regraded)
+    stats['seconds'] = round(time.perf_counter() - t0, 2)
+    return stats
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    days = int(args[args.index("--days") + 1]) if "--days" in args else HORIZON_DAYS
+    from supabase import create_client
+    from upload_supabase import URL, KEY
+    run(create_client(URL, KEY), days=days, dry_run="--dry-run" in args)
@@ -1,17 +1,28 @@
 # import pandas as pd
-import yt_dlp
-import re
-import glob
-from google import genai
+# yt_dlp, google.genai, youtube_transcript_api and supabase are imported on first use:
+# together they take over a second to import, and most cron runs find an empty queue.
+import urllib.request
 import json
+import math
 import time
 import os
-import html
-import youtube_transcript_api as yta
-from upload_supabase import URL, KEY
-from supabase import create_client
-
-supabase = create_client(URL, KEY)
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from transcript_cache import TranscriptCache, track_rank
+from analysis_cache import AnalysisCache, analysis_key
+from vtt_parser import iter_vtt_cues, format_timestamped, format_plain
+from transcript_compact import compact_transcript, transcript_duration, estimate_tokens, sample_passages, strip_timestamps
+from chunked_analysis import split_windows, merge_analyses, missing_counts
+from analysis_schema import RESPONSE_SCHEMA, LEXICON_RESPONSE_SCHEMA, parse_analysis, validate_analysis, upper_bound
+from lexicon import Lexicon
+from time_index import TimeIndex, align_patterns
+from enqueue_links import normalize_video_id
+from lemmas import normalize_word
+from result_log import ResultLog, compact_to_json
+from youtube_limiter import YouTubeLimiter, YouTubeBlocked, RequestCancelled, is_block_error
+from hedged_fetch import HedgedFetcher
+from metrics import metrics
+from key_pool import KeyPool, DEFAULT_RPM, DEFAULT_TPM, DEFAULT_RPD
 
 # 1. 配置
 from dotenv import load_dotenv
@@ -20,272 +31,368 @@ load_dotenv()
 # Read keys from env
 env_keys = os.getenv("GOOGLE_API_KEYS", "")
 API_KEYS = [k.strip() for k in env_keys.split(',') if k.strip()]
-if not API_KEYS:
-    # Fallback to empty list or handle error
-    print("Warning: GOOGLE_API_KEYS not found in .env")
+_keys_checked = False
 
-current_key_index = 0
-client = None
+def _check_api_keys():
+    # Checked on the first Gemini call, not at import: --help and the empty-queue exit never need a key
+    global _keys_checked
+    if not _keys_checked:
+        _keys_checked = True
+        if not API_KEYS:
+            print("Warning: GOOGLE_API_KEYS not found in .env")
 
-def init_client():
-    global client, current_key_index
-    if not API_KEYS: return
-    
-    # Ensure index is valid
-    current_key_index = current_key_index % len(API_KEYS)
-    key = API_KEYS[current_key_index]
-    
-    client = genai.Client(api_key=key)
-    print(f"🔑 [系統] 切換至第 {current_key_index + 1} 組 API Key")
+_supabase = None
+_supabase_lock = threading.Lock()
+
+def get_supabase():
+    """Supabase client, created on first use (also available as study_ai.supabase)."""
+    global _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            from supabase import create_client
+            from upload_supabase import URL, KEY
+            _supabase = create_client(URL, KEY)
+        return _supabase
 
-def rotate_key():
-    global current_key_index
-    current_key_index += 1
-    init_client()
+def __getattr__(name):
+    # `from study_ai import supabase` keeps working, but only builds the client when asked for
+    if name == 'supabase':
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Initialize first key
-init_client()
+def _make_gemini_client(key):
+    from google import genai
+    return genai.Client(api_key=key)
+
+# 所有 API Key 共用一個配額感知池 (RPM / TPM / RPD 與 429 冷卻)，可同時給多個執行緒使用
+# Gemini clients are created by the pool the first time each key is used
+key_pool = KeyPool(
+    API_KEYS,
+    client_factory=_make_gemini_client,
+    rpm=int(os.getenv("GEMINI_RPM", DEFAULT_RPM)),
+    tpm=int(os.getenv("GEMINI_TPM", DEFAULT_TPM)),
+    rpd=int(os.getenv("GEMINI_RPD", DEFAULT_RPD)),
+)
 MODEL_NAME = "gemini-3-flash-preview"
+# 修改 analyze_with_ai 的 prompt 時請同步更新，讓舊的分析快取失效
+PROMPT_VERSION = "7"
+
+# 本機字幕快取 (重試、重新分析時不必再向 YouTube 下載)
+transcript_cache = TranscriptCache()
+# YouTube 請求 (YTA 與 yt-dlp) 共用的自適應節流 + 斷路器，狀態存在 .cache 中
+youtube_limiter = YouTubeLimiter()
+# 本機 AI 分析快取 (同一份逐字稿 + prompt 版本 + 模型只呼叫一次 Gemini)
+analysis_cache = AnalysisCache()
+# 共用詞庫 (過去分析過的單字)：prompt 只要求新單字的完整欄位，其餘在本機補上
+lexicon = Lexicon()
 
 def clean_vtt_text(vtt_content):
     """
     簡單清理 VTT 格式，只保留文字。
-    移除 header, timestamp, tag 等。
+    移除 header, timestamp, tag 等，並去除自動字幕的滾動重複行。
     """
-    lines = vtt_content.splitlines()
-    text_lines = []
-    # Regular expression for timestamp '00:00:00.000 --> 00:00:05.000'
-    timestamp_pattern = re.compile(r'\d{2}:\d{2}:\d{2}\.\d{3}\s-->\s\d{2}:\d{2}:\d{2}\.\d{3}')
-    
-    seen_lines = set() # Avoid immediate duplicates often found in VTT karaoke-style
-    
-    # 狀態: 讀取 header 中
-    is_header = True
-
-    for line in lines:
-        line = line.strip()
-        
-        # Header filtering check for empty line
-        if is_header and not line:
-            is_header = False
-            continue
-            
-        if not line: continue
-        
-        # Header filtering
-        if is_header:
-            if line == 'WEBVTT': continue
-            if line.startswith('Kind:'): continue
-            if line.startswith('Language:'): continue
-            if line.startswith('Style:'): continue
-            if line.startswith('::cue'): continue
-            # If we see a timestamp, header is definitely over
-            if timestamp_pattern.match(line) or '-->' in line:
-                is_header = False
-            # If we see normal text that is not a header key, maybe header is over?
-            # Safest is to rely on timestamp or known keywords.
-        
-        if not line: continue
-        if line.startswith('NOTE '): continue
-        if timestamp_pattern.match(line): 
-            is_header = False
-            continue
-        if '-->' in line: 
-            is_header = False
-            continue
-        
-        # Remove tags like <c.colorE6E6E6>...
-        clean_line = re.sub(r'<[^>]+>', '', line)
-        clean_line = html.unescape(clean_line)
-        clean_line = clean_line.strip()
-        
-        if not clean_line: continue
-        
-        # Filter headers if they leaked (sometimes no timestamp before first cue if lazy?)
-        if clean_line in ['WEBVTT', 'Kind: captions', 'Language: en']: continue
-        
-        # Simple dedup for adjacent lines
-        if clean_line in seen_lines:
-            pass
-        else:
-            text_lines.append(clean_line)
-            seen_lines.add(clean_line)
-            
-    # Post-process to merge unique lines
-    unique_lines = []
-    last_line = ""
-    for tl in text_lines:
-        if tl != last_line:
-            unique_lines.append(tl)
-            last_line = tl
-            
-    return " ".join(unique_lines)
+    return format_plain(iter_vtt_cues(vtt_content))
 
 def parse_vtt_with_timestamps(vtt_content):
     """
     解析 VTT 內容，回傳 '秒數|文字' 格式。
     """
-    lines = vtt_content.splitlines()
-    output = []
-    
-    # Simple timestamp regex: 00:00:00.000
-    timestamp_pattern = re.compile(r'(\d{2}):(\d{2}):(\d{2})\.(\d{3})')
-    
-    current_start = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        if line == 'WEBVTT': continue
-        if '-->' in line:
-            # Parse start time
-            # 00:00:01.500 --> 00:00:03.000
-            try:
-                start_str = line.split('-->')[0].strip()
-                match = timestamp_pattern.match(start_str)
-                if match:
-                    h, m, s, ms = map(int, match.groups())
-                    current_start = h * 3600 + m * 60 + s
-            except:
-                pass
-            continue
-            
-        # Skip tags/metadata
-        if line.startswith('NOTE'): continue
-        if line.startswith('Kind:'): continue
-        if line.startswith('Language:'): continue
-        
-        # Text line
-        if current_start is not None:
-            # Remove HTML-like tags
-            clean_text = re.sub(r'<[^>]+>', '', line)
-            clean_text = html.unescape(clean_text).strip()
-            if clean_text:
-                output.append(f"{current_start}|{clean_text}")
-                # Reset current_start so we don't repeat timestamp for multiple lines unless new timestamp appears? 
-                # Actually VTT usually has timestamp then text. 
-                # We keep current_start valid until next timestamp.
-                
-    return "\n".join(output)
-
-def fetch_transcript_final(video_id):
+    return format_timestamped(iter_vtt_cues(vtt_content))
+
+def extract_video_info(video_id, cancel=None):
     """
-    嘗試獲取帶有時間戳記的字幕。
-    優先使用 youtube_transcript_api (YTA)，失敗則退回 yt-dlp 下載 VTT 解析。
+    單次 yt-dlp 擷取：一次取得標題、縮圖、長度與所有字幕軌的 VTT 網址，不寫入任何檔案。
+    cancel: 已設定時不再等待 YouTube 節流名額 (拋出 RequestCancelled)。
     """
-    # 1. Try youtube_transcript_api
-    try:
-        from youtube_transcript_api import YouTubeTranscriptApi
-        
-        print(f"   [嘗試] 使用 YouTubeTranscriptApi...")
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-        
-        # 優先順序：手動英文 -> 自動英文 -> 第一個可用的
+    import yt_dlp
+
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    ydl_opts = {
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,
+        'nocheckcertificate': True,
+    }
+    with youtube_limiter.request(cancel), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False) or {}
+
+    caption_tracks = []
+    for is_generated, key in ((False, 'subtitles'), (True, 'automatic_captions')):
+        for language, formats in (info.get(key) or {}).items():
+            vtt = next((f for f in formats if f.get('ext') == 'vtt' and f.get('url')), None)
+            if vtt:
+                caption_tracks.append({
+                    'language': language,
+                    'is_generated': is_generated,
+                    'url': vtt['url'],
+                    'http_headers': vtt.get('http_headers') or {},
+                })
+
+    return {
+        'video_id': video_id,
+        'title': info.get('title'),
+        'thumbnail': info.get('thumbnail'),
+        'duration': info.get('duration'),
+        'caption_tracks': caption_tracks,
+    }
+
+def select_caption_track(caption_tracks):
+    """手動英文 -> 自動英文；沒有英文字幕時回傳 None (與舊的 subtitleslangs=['en.*'] 相同)。"""
+    english = [t for t in caption_tracks if t['language'].startswith('en')]
+    if not english:
+        return None
+    return min(english, key=lambda t: track_rank(t['language'], t['is_generated']))
+
+def download_caption(track, cancel=None):
+    """直接把 VTT 讀進記憶體 (bytes，不經過暫存檔，可安全地平行執行)。"""
+    request = urllib.request.Request(track['url'], headers=track.get('http_headers') or {})
+    with youtube_limiter.request(cancel), urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+def fetch_transcript_final(video_id, use_cache=True, video_info=None):
+    """帶有時間戳記的字幕，取不到時回傳 None (原因見 fetch_transcript)。"""
+    return fetch_transcript(video_id, use_cache=use_cache, video_info=video_info)[0]
+
+def fetch_transcript(video_id, use_cache=True, video_info=None):
+    """
+    嘗試獲取帶有時間戳記的字幕，回傳 (逐字稿, 狀態)；狀態為 'ok'、'no_captions' (每個來源都確定
+    這部影片沒有字幕) 或 'error' (有來源失敗，例如網路錯誤或被限流，稍後重試可能成功)。
+    先查本機快取，再以 hedged 方式向 youtube_transcript_api (YTA) 與 yt-dlp 字幕軌 (VTT) 取得：
+    先呼叫目前較快的來源，超過它最近的 p95 延遲仍未回應就同時啟動另一個，採用先回來的結果。
+    video_info: extract_video_info() 的結果，傳入時 yt-dlp 不會再向 YouTube 擷取一次。
+    """
+    with metrics.span('fetch_transcript', video_id=video_id) as span:
+        # 0. Local transcript cache
+        if use_cache:
+            try:
+                cached = transcript_cache.get(video_id)
+                if cached:
+                    text, track = cached
+                    print(f"   [快取] 使用本機字幕 ({track['language']}, {'auto' if track['is_generated'] else 'manual'}, {len(text)} chars)")
+                    span.set(source='cache', cache_hit=1, chars=len(text))
+                    return text, 'ok'
+            except Exception as e:
+                print(f"   [資訊] 字幕快取讀取失敗: {e}")
+
+        # 1. YTA / yt-dlp, hedged
+        full_text, source, errors = transcript_fetcher.fetch_with_errors(video_id, video_info=video_info)
+        span.set(source=source, cache_hit=0, chars=len(full_text or ''))
+        if full_text:
+            return full_text, 'ok'
+        if errors:
+            span.outcome = 'error'
+            print(f"   [失敗] 字幕來源暫時無法取得 ({len(errors)} 個錯誤)，稍後可重試")
+            return None, 'error'
+        span.outcome = 'empty'
+        print("   [失敗] YTA 與 yt-dlp 都沒找到英文字幕")
+        return None, 'no_captions'
+
+# youtube_transcript_api exceptions meaning that the video has no (usable) captions at all
+NO_CAPTION_ERRORS = ('NoTranscriptFound', 'TranscriptsDisabled', 'NoTranscriptAvailable')
+
+def _fetch_via_yta(video_id, video_info=None, cancel=None):
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    print(f"   [嘗試] 使用 YouTubeTranscriptApi...")
+    with metrics.span('transcript_yta', video_id=video_id) as span:
         try:
-            transcript = transcript_list.find_transcript(['en', 'en-US', 'en-GB'])
-        except:
+            # The losing hedge gives up before it takes a YouTube slot (cancel is checked while waiting for one)
+            with youtube_limiter.request(cancel):
+                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+
+            # 優先順序：手動英文 -> 自動英文 -> 第一個可用的
             try:
-                transcript = transcript_list.find_generated_transcript(['en', 'en-US'])
+                transcript = transcript_list.find_transcript(['en', 'en-US', 'en-GB'])
             except:
-                transcript = next(iter(transcript_list))
-        
-        raw_data = transcript.fetch()
-        if raw_data:
-            full_text = ""
-            for p in raw_data:
-                start_time = int(p['start'])
-                text = p['text'].replace('\n', ' ')
-                full_text += f"{start_time}|{text}\n"
-            
-            print(f"   [成功] YTA 抓取完成 ({len(full_text)} chars)")
+                try:
+                    transcript = transcript_list.find_generated_transcript(['en', 'en-US'])
+                except:
+                    transcript = next(iter(transcript_list), None)
+            if transcript is None:
+                print("   [資訊] YTA: 這部影片沒有字幕")
+                span.outcome = 'empty'
+                return None
+
+            with youtube_limiter.request(cancel):
+                raw_data = transcript.fetch()
+        except RequestCancelled:
+            span.outcome = 'cancelled'
+            return None
+        except Exception as e:
+            print(f"   [資訊] YTA 無法取得字幕: {str(e)[:100]}")
+            if type(e).__name__ in NO_CAPTION_ERRORS:
+                span.outcome = 'empty'
+                return None
+            if is_block_error(e):
+                print("   ⚠️ YouTube 正在限制您的 IP (429 Too Many Requests)")
+            raise
+
+        if not raw_data:
+            span.outcome = 'empty'
+            return None
+        segments = [(int(p['start']), p['text'].replace('\n', ' ')) for p in raw_data]
+        full_text = "".join(f"{start}|{text}\n" for start, text in segments)
+
+        print(f"   [成功] YTA 抓取完成 ({len(full_text)} chars)")
+        span.set(chars=len(full_text))
+        _cache_transcript(video_id, full_text, transcript.language_code, transcript.is_generated)
+        return full_text
+
+def _fetch_via_ytdlp(video_id, video_info=None, cancel=None):
+    # Reuse the worker's metadata extraction when available
+    with metrics.span('transcript_ytdlp', video_id=video_id) as span:
+        try:
+            print("   [嘗試] 使用 yt-dlp 下載字幕...")
+            if video_info is None:
+                video_info = extract_video_info(video_id, cancel)
+
+            track = select_caption_track(video_info['caption_tracks'])
+            if not track:
+                print("   [失敗] yt-dlp 沒找到英文字幕")
+                span.outcome = 'empty'
+                return None
+
+            vtt_content = download_caption(track, cancel)
+            print(f"   [成功] yt-dlp 讀取 VTT ({track['language']}, {'auto' if track['is_generated'] else 'manual'})")
+            full_text = parse_vtt_with_timestamps(vtt_content)
+            span.set(bytes=len(vtt_content), chars=len(full_text))
+            _cache_transcript(video_id, full_text, track['language'], track['is_generated'])
             return full_text
 
-    except Exception as e:
-        err_msg = str(e)
-        print(f"   [資訊] YTA 無法取得字幕: {err_msg[:100]}")
-        if "429" in err_msg:
-            print("   ⚠️ YouTube 正在限制您的 IP (429 Too Many Requests)")
-            # If 429, we skip to yt-dlp but it might also fail.
-        
-    # 2. Fallback to yt-dlp
-    try:
-        print("   [嘗試] 使用 yt-dlp 下載字幕...")
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        temp_filename = f"temp_{video_id}"
-        
-        # Cleanup old files
-        for f in glob.glob(f"{temp_filename}*"):
-            try: os.remove(f)
-            except: pass
-
-        ydl_opts = {
-            'skip_download': True,
-            'writesubtitles': True,
-            'writeautomaticsub': True,
-            'subtitleslangs': ['en.*', 'en', 'en-US'], 
-            'outtmpl': temp_filename,
-            'quiet': True,
-            'no_warnings': True,
-            'nocheckcertificate': True,
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=True)
-            
-        possible_files = glob.glob(f"{temp_filename}*.vtt")
-        if not possible_files:
-            print("   [失敗] yt-dlp 也沒下載到字幕")
+        except RequestCancelled:
+            span.outcome = 'cancelled'
             return None
-            
-        target_file = possible_files[0]
-        with open(target_file, 'r', encoding='utf-8') as f:
-            vtt_content = f.read()
-            
-        # Cleanup
-        for f in possible_files:
-            try: os.remove(f)
-            except: pass
-            
-        print("   [成功] yt-dlp 下載並讀取 VTT")
-        return parse_vtt_with_timestamps(vtt_content)
-        
+        except YouTubeBlocked:
+            raise
+        except Exception as e:
+            print(f"   [失敗] yt-dlp 失敗: {str(e)}")
+            if is_block_error(e):
+                raise YouTubeBlocked("YouTube IP Blocked (429)")
+            # Raised (not None) so that the fetch is reported as failed rather than "no captions"
+            raise
+
+# 兩個字幕來源的 hedged 請求；勝率與延遲統計存在 .cache/transcript_sources.json
+transcript_fetcher = HedgedFetcher(
+    {'yta': _fetch_via_yta, 'yt-dlp': _fetch_via_ytdlp},
+    is_fatal=lambda e: isinstance(e, YouTubeBlocked) or is_block_error(e))
+
+def _service_gauges():
+    """Key pool / YouTube limiter state for the metrics export."""
+    keys = key_pool.stats()
+    limiter = youtube_limiter.stats()
+    return {
+        'gemini_key_throttled_total': sum(k['throttled'] for k in keys),
+        'gemini_key_errors_total': sum(k['errors'] for k in keys),
+        'gemini_keys_cooling': sum(1 for k in keys if k['cooldown'] > 0),
+        'gemini_tokens_total': sum(k['tokens'] for k in keys),
+        'youtube_rate': limiter['rate'],
+        'youtube_breaker_open': int(limiter['state'] != 'closed'),
+        'youtube_blocks_total': limiter['blocks'],
+    }
+
+metrics.register_collector(_service_gauges)
+
+def _cache_transcript(video_id, text, language, is_generated):
+    if not text:
+        return
+    try:
+        transcript_cache.put(video_id, text, language, is_generated)
     except Exception as e:
-        print(f"   [失敗] yt-dlp 失敗: {str(e)}")
-        if "429" in str(e):
-            raise Exception("YouTube IP Blocked (429)")
-        return None
+        print(f"   [資訊] 字幕快取寫入失敗: {e}")
 
-def analyze_with_ai(text_with_timestamps):
-    # 1. 定義您的標準標籤庫 (Standard Tag Library)
-    tags_list = ["社交 (Social)", "職場 (Work)", "旅遊 (Travel)", "生活 (Daily)", "文化 (Culture)", "學術 (Academic)"]
+def analyze_with_ai(text_with_timestamps, use_cache=True):
+    with metrics.span('analyze', chars=len(text_with_timestamps)) as span:
+        cache_key = analysis_key(PROMPT_VERSION, MODEL_NAME, text_with_timestamps)
+        if use_cache:
+            try:
+                cached = analysis_cache.get(cache_key)
+                if cached is not None:
+                    print(f"   [快取] AI 分析命中 (hits={analysis_cache.hits}, misses={analysis_cache.misses})")
+                    span.set(cache_hit=1)
+                    return cached
+            except Exception as e:
+                print(f"   [資訊] 分析快取讀取失敗: {e}")
 
-    # 2. 根據逐字稿長度動態調整擷取數量
+        span.set(cache_hit=0)
+        analysis = _analyze_with_gemini(text_with_timestamps)
+
+        try:
+            analysis_cache.put(cache_key, analysis, MODEL_NAME, PROMPT_VERSION)
+        except Exception as e:
+            print(f"   [資訊] 分析快取寫入失敗: {e}")
+        return analysis
+
+def target_counts(text_with_timestamps):
+    """
+    根據影片長度動態調整擷取數量。
+    以最後一個時間戳判斷長度 (壓縮後的逐字稿字元數已不代表影片長度)，沒有時間戳時退回字元數估計。
+    """
+    duration = transcript_duration(text_with_timestamps)
     text_len = len(text_with_timestamps)
     # 預設值 (適用於 5-10 分鐘影片)
     vocab_count = "12-15"
     pattern_count = "6-8"
-    
-    if text_len > 30000: # 約 25-30 分鐘以上
+
+    if (duration is not None and duration >= 25 * 60) or (duration is None and text_len > 30000): # 約 25-30 分鐘以上
         vocab_count = "25-30"
         pattern_count = "12-15"
-    elif text_len > 15000: # 約 10-15 分鐘
+    elif (duration is not None and duration >= 10 * 60) or (duration is None and text_len > 15000): # 約 10-15 分鐘
         vocab_count = "18-22"
         pattern_count = "8-10"
+    return vocab_count, pattern_count
+
+def _lexicon_note(known_words):
+    if not known_words:
+        return ""
+    return f"""
+    詞庫中已有下列單字的完整解釋。若挑選到這些字，vocabulary 項目只需回傳 "word" (寫法與清單相同)，
+    其餘欄位請省略，程式會自動補上；清單以外的單字仍需完整欄位：
+    {', '.join(known_words)}
+    """
 
-    print(f"   [AI] 逐字稿長度: {text_len} 字元，預計擷取 {vocab_count} 個單字 與 {pattern_count} 個句型")
+def _vocab_task(vocab_count, candidates):
+    if not candidates:
+        return f"""2. 整理出 {vocab_count} 個核心單字。篩選基準為「實用頻率高」且「適合學習者擴充詞彙」的字，
+       請參考 Oxford 3000 或 CEFR B1-B2 等級，優先選擇能展現該影片主題特色的單字。"""
+    return f"""2. 從下方的候選單字中整理出 {vocab_count} 個核心單字。候選單字已依 CEFR 等級、出現次數與在影片中
+       分佈的平均程度排好順序 (括號內為等級、次數與出現的秒數)，請優先選擇排在前面且能展現該影片主題特色的字；
+       逐字稿中重要的片語也可以選。"""
 
-    prompt = f"""
-    你是一個專業的英文老師。我會提供一段影片逐字稿，格式為「秒數|英文內容」。
+def _transcript_section(text_with_timestamps, candidates, title):
+    # Timestamps are matched locally (time_index), so the model only sees the text
+    text = strip_timestamps(text_with_timestamps)[:50000]
+    if not candidates:
+        return f"""{title}：
+    {text}"""
+    return f"""候選單字：
+    {candidates}
+
+    逐字稿節錄 (用於判斷情境標籤與句型，單字請從上方候選單字挑選)：
+    {text}"""
+
+def build_prompt(text_with_timestamps, vocab_count, pattern_count, part=None, known_words=None, candidates=None):
+    """
+    candidates: vocab_rank.format_candidates() 的候選清單。有候選清單時單字從清單中挑選，
+    text_with_timestamps 只需是用於標籤與句型的逐字稿節錄。
+    """
+    # 定義您的標準標籤庫 (Standard Tag Library)
+    tags_list = ["社交 (Social)", "職場 (Work)", "旅遊 (Travel)", "生活 (Daily)", "文化 (Culture)", "學術 (Academic)"]
+    part_note = ""
+    if part:
+        part_note = f"（這是長影片的第 {part[0] + 1}/{part[1]} 段，只需分析本段內容）"
+
+    return f"""
+    你是一個專業的英文老師。我會提供一段影片逐字稿 (每行一段)。{part_note}
     
     請分析並執行以下任務：
     1. 從這份標籤清單中 {tags_list}，挑選出 1~2 個最符合本影片的情境標籤。
-    2. 整理出 {vocab_count} 個核心單字。篩選基準為「實用頻率高」且「適合學習者擴充詞彙」的字，
-       請參考 Oxford 3000 或 CEFR B1-B2 等級，優先選擇能展現該影片主題特色的單字。
+    {_vocab_task(vocab_count, candidates)}
     3. 整理出 {pattern_count} 個常用句型。優先選擇日常對話中高頻出現、結構完整且具備變換能力的組合，
-       並找出該句型在影片中出現的**準確時間點 (timestamp)**。
+       例句請**直接引用逐字稿中的原句** (程式會依原句找出影片中的時間點)。
     4. **解析與翻譯**：單字解釋需精簡，所有解釋與例句必須包含繁體中文翻譯。
     5. **分佈平均**：請確保挑選的單字與句型在整段影片中分佈相對均勻，而非集中在開頭。
-    
+    {_lexicon_note(known_words)}
     必須嚴格遵守以下 JSON 格式回傳 (欄位名稱請保持英文)：
     {{
       "category": ["標籤1", "標籤2"],
@@ -303,18 +410,252 @@ def analyze_with_ai(text_with_timestamps):
         {{
           "structure": "句型結構",
           "usage": "用法說明",
-          "example": "例句",
-          "timestamp": 120  /* (數字, 該句型在影片中出現的秒數) */
+          "example": "逐字稿中的原句"
         }}
       ]
     }}
     
-    逐字稿內容 (最多提供 50000 字元以完整分析長影片)：
-    {text_with_timestamps[:50000]}
+    {_transcript_section(text_with_timestamps, candidates, "逐字稿內容 (最多提供 50000 字元以完整分析長影片)")}
+    """
+
+# 超過這個長度 (秒數或字元數) 的逐字稿改用分段平行分析
+CHUNK_MIN_SECONDS = 30 * 60
+CHUNK_MIN_CHARS = 50000
+# 同時送出的分段請求上限
+MAX_PARALLEL_WINDOWS = 8
+
+def should_chunk(text_with_timestamps):
+    duration = transcript_duration(text_with_timestamps)
+    return (duration is not None and duration >= CHUNK_MIN_SECONDS) or len(text_with_timestamps) > CHUNK_MIN_CHARS
+
+# Candidate words offered per requested word (vocab_rank) ...
+CANDIDATES_PER_WORD = 3
+MIN_CANDIDATES = 15
+# ... and the transcript excerpt sent with them, used for the category and the sentence patterns
+# (split between the windows of a long video, but at least MIN_WINDOW_EXCERPT_CHARS each)
+PATTERN_EXCERPT_CHARS = 12000
+MIN_WINDOW_EXCERPT_CHARS = 3000
+# The shortlist replaces the full transcript only when the prompt gets at least this much smaller
+MIN_PROMPT_SAVING = 0.2
+
+# Rough size of the JSON answer, reserved from the key's TPM budget together with the prompt
+EXPECTED_OUTPUT_TOKENS = 4000
+
+def _usage_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None)
+
+def _output_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'candidates_token_count', None)
+
+# 回應解析統計：salvaged = 截斷後救回部分項目，topups = 只補抓缺少項目的追加請求
+# lexicon_filled = 只回傳 word、由詞庫補齊的單字數
+# unaligned = 在逐字稿中找不到例句、沒有時間點的句型數
+analysis_stats = {'requests': 0, 'salvaged': 0, 'topups': 0, 'lexicon_filled': 0, 'unaligned': 0}
+_analysis_stats_lock = threading.Lock()
+
+def _count(name, amount=1):
+    # Updated from the window threads and the pipelined worker's stage threads
+    with _analysis_stats_lock:
+        analysis_stats[name] += amount
+
+def _generate_json(prompt, schema=RESPONSE_SCHEMA):
+    """以 response_schema 要求結構化輸出；被截斷的回應會盡量救回完整的項目。"""
+    _check_api_keys()
+    attempts = 0
+
+    def generate(c):
+        nonlocal attempts
+        attempts += 1
+        return c.models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config={'response_mime_type': 'application/json', 'response_schema': schema})
+
+    with metrics.span('gemini_call', prompt_chars=len(prompt)) as span:
+        try:
+            response = key_pool.call(generate, tokens=estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS, usage=_usage_tokens)
+        finally:
+            # Attempts beyond the first were retried on another key
+            span.set(retries=max(attempts - 1, 0))
+        _count('requests')
+        analysis, salvaged = parse_analysis(response.text)
+        span.set(tokens=_usage_tokens(response) or 0, output_tokens=_output_tokens(response) or 0,
+                 response_chars=len(response.text or ''), salvaged=int(salvaged))
+        if salvaged:
+            _count('salvaged')
+            print(f"   [AI] 回應不完整，已救回 {len(analysis['vocabulary'])} 個單字 / {len(analysis['sentence_patterns'])} 個句型")
+        return analysis
+
+def build_topup_prompt(text_with_timestamps, analysis, missing_vocab, missing_patterns, known_words=None,
+                       candidates=None):
+    """只要求補上缺少的單字 / 句型，並排除已經有的項目。"""
+    known_words = ', '.join(str(v.get('word')) for v in analysis['vocabulary'])
+    known_patterns = '; '.join(str(p.get('structure')) for p in analysis['sentence_patterns'])
+    return f"""
+    你是一個專業的英文老師。以下是一段影片逐字稿 (每行一段)。
+    先前已整理出這些單字：{known_words or '(無)'}
+    以及這些句型：{known_patterns or '(無)'}
+
+    請「只」再補充 {missing_vocab} 個不重複的核心單字與 {missing_patterns} 個不重複的常用句型
+    (欄位格式與先前相同，解釋與例句需包含繁體中文翻譯，句型的例句需直接引用逐字稿中的原句)。
+    category 回傳空陣列即可。
+    {_lexicon_note(known_words)}
+
+    {_transcript_section(text_with_timestamps, candidates, "逐字稿內容")}
+    """
+
+def _shortlist(text_with_timestamps, vocab_count, excerpt_chars=PATTERN_EXCERPT_CHARS):
+    """
+    本機候選單字 (vocab_rank) 與送給 Gemini 的逐字稿：有候選清單時只送出平均分佈的逐字稿節錄。
+    短逐字稿 (節錄省不了多少) 或排序失敗時退回完整逐字稿，由 Gemini 自己挑字。
+    """
+    if len(text_with_timestamps) <= excerpt_chars:
+        return None, text_with_timestamps
+    try:
+        from vocab_rank import rank_candidates, format_candidates
+        with metrics.span('rank_candidates', chars=len(text_with_timestamps)) as span:
+            limit = max(MIN_CANDIDATES, CANDIDATES_PER_WORD * upper_bound(vocab_count))
+            candidates = rank_candidates(text_with_timestamps, limit=limit)
+            span.set(candidates=len(candidates))
+    except Exception as e:
+        print(f"   [資訊] 候選單字排序失敗: {e}")
+        return None, text_with_timestamps
+    if len(candidates) < upper_bound(vocab_count):
+        # Too few ranked words (unusual transcript): let the model pick from the full text
+        return None, text_with_timestamps
+    shortlist = format_candidates(candidates)
+    excerpt = sample_passages(text_with_timestamps, excerpt_chars)
+    if len(shortlist) + len(excerpt) > len(text_with_timestamps) * (1 - MIN_PROMPT_SAVING):
+        return None, text_with_timestamps
+    return shortlist, excerpt
+
+def _lexicon_words(text_with_timestamps):
+    try:
+        return lexicon.known_words(text_with_timestamps)
+    except Exception as e:
+        print(f"   [資訊] 詞庫讀取失敗: {e}")
+        return []
+
+def _fill_from_lexicon(analysis):
+    vocabulary = analysis.get('vocabulary')
+    if not isinstance(vocabulary, list):
+        return
+    try:
+        _count('lexicon_filled', lexicon.fill(vocabulary))
+    except Exception as e:
+        # Items left without a definition are dropped by validate_analysis and topped up
+        print(f"   [資訊] 詞庫補齊失敗: {e}")
+
+def _learn(analysis):
+    try:
+        lexicon.learn(analysis['vocabulary'])
+    except Exception as e:
+        print(f"   [資訊] 詞庫寫入失敗: {e}")
+
+def _analyze_prompt(text_with_timestamps, vocab_count, pattern_count, part=None, excerpt_chars=PATTERN_EXCERPT_CHARS,
+                    index=None):
+    """
+    單次分析 + 驗證：數量不足 (例如回應被截斷) 時只追加請求缺少的部分，
+    而不是整份 50000 字元的請求重來一次。句型的時間點以 index (TimeIndex) 在本機比對。
+    """
+    analysis = _request_analysis(text_with_timestamps, vocab_count, pattern_count, part, excerpt_chars)
+    _align(analysis, index or TimeIndex(text_with_timestamps))
+    return analysis
+
+def _align(analysis, index):
+    with metrics.span('align_timestamps', patterns=len(analysis['sentence_patterns'])) as span:
+        matched = align_patterns(analysis['sentence_patterns'], index)
+        span.set(matched=matched)
+    _count('unaligned', len(analysis['sentence_patterns']) - matched)
+
+def _request_analysis(text_with_timestamps, vocab_count, pattern_count, part, excerpt_chars):
+    known_words = _lexicon_words(text_with_timestamps)
+    schema = LEXICON_RESPONSE_SCHEMA if known_words else RESPONSE_SCHEMA
+    candidates, excerpt = _shortlist(text_with_timestamps, vocab_count, excerpt_chars)
+    analysis = _generate_json(build_prompt(excerpt, vocab_count, pattern_count, part=part,
+                                           known_words=known_words, candidates=candidates), schema)
+    _fill_from_lexicon(analysis)
+    analysis, missing_vocab, missing_patterns = validate_analysis(analysis, vocab_count, pattern_count)
+    if not (missing_vocab or missing_patterns):
+        _learn(analysis)
+        return analysis
+
+    _top_up(excerpt, analysis, missing_vocab, missing_patterns, known_words, candidates, schema)
+    _learn(analysis)
+    return analysis
+
+def _top_up(excerpt, analysis, missing_vocab, missing_patterns, known_words, candidates, schema):
+    """追加請求缺少的單字 / 句型並併入 analysis (略過重複的)；回傳新加入的句型。失敗時保留現有結果。"""
+    print(f"   [AI] 缺少 {missing_vocab} 個單字 / {missing_patterns} 個句型，追加請求補齊")
+    _count('topups')
+    try:
+        extra = _generate_json(build_topup_prompt(excerpt, analysis, missing_vocab, missing_patterns,
+                                                  known_words=known_words, candidates=candidates), schema)
+        _fill_from_lexicon(extra)
+        extra, _, _ = validate_analysis(extra, 0, 0)
+    except Exception as e:
+        # Keep what we have rather than failing the whole video
+        print(f"   [AI] 追加請求失敗，保留現有結果: {e}")
+        return []
+    added_patterns = []
+    for key, normalize in (('vocabulary', lambda v: normalize_word(str(v.get('word', '')))),
+                           ('sentence_patterns', lambda p: str(p.get('structure', '')).lower())):
+        known = {normalize(item) for item in analysis[key]}
+        for item in extra[key]:
+            value = normalize(item)
+            if value not in known:
+                known.add(value)
+                analysis[key].append(item)
+                if key == 'sentence_patterns':
+                    added_patterns.append(item)
+    return added_patterns
+
+def analyze_long_transcript(text_with_timestamps, index=None):
     """
-    response = client.models.generate_content(model=MODEL_NAME, contents=prompt)
-    raw_text = response.text.replace('```json', '').replace('```', '').strip()
-    return json.loads(raw_text)
+    長影片：依時間切成數個視窗平行分析 (由 key_pool 分散到各組 API Key)，再合併去重。
+    總耗時約等於最慢的一段，而不是隨影片長度線性增加。
+    """
+    vocab_count, pattern_count = target_counts(text_with_timestamps)
+    windows = split_windows(text_with_timestamps)
+    n = len(windows)
+    # 每段多要一些，合併去重後仍能湊滿目標數量
+    window_vocab = max(3, math.ceil(upper_bound(vocab_count) / n * 1.5))
+    window_patterns = max(2, math.ceil(upper_bound(pattern_count) / n * 1.5))
+    excerpt_chars = max(PATTERN_EXCERPT_CHARS // n, MIN_WINDOW_EXCERPT_CHARS)
+    print(f"   [AI] 長逐字稿分為 {n} 段平行分析 ({len(key_pool)} 組 API Key)，每段 {window_vocab} 個單字 / {window_patterns} 個句型")
+
+    def analyze_window(i):
+        return _analyze_prompt(windows[i], window_vocab, window_patterns, part=(i, n), excerpt_chars=excerpt_chars,
+                               index=index)
+
+    with ThreadPoolExecutor(max_workers=min(n, MAX_PARALLEL_WINDOWS)) as pool:
+        parts = list(pool.map(analyze_window, range(n)))
+    merged = merge_analyses(parts, vocab_count, pattern_count)
+    missing_vocab, missing_patterns = missing_counts(merged, vocab_count, pattern_count)
+    if missing_vocab or missing_patterns:
+        # The windows overlapped more than expected: ask once more over passages of the whole video
+        candidates, excerpt = _shortlist(text_with_timestamps, vocab_count)
+        known_words = _lexicon_words(text_with_timestamps)
+        added = _top_up(excerpt, merged, missing_vocab, missing_patterns, known_words, candidates,
+                        LEXICON_RESPONSE_SCHEMA if known_words else RESPONSE_SCHEMA)
+        _align({'sentence_patterns': added}, index or TimeIndex(text_with_timestamps))
+        merged['sentence_patterns'].sort(
+            key=lambda p: p.get('timestamp') if isinstance(p.get('timestamp'), (int, float)) else 0)
+        _learn(merged)
+    return merged
+
+def _analyze_with_gemini(text_with_timestamps):
+    # One time index per transcript, shared by all windows of a long video
+    index = TimeIndex(text_with_timestamps)
+    if should_chunk(text_with_timestamps):
+        return analyze_long_transcript(text_with_timestamps, index)
+
+    vocab_count, pattern_count = target_counts(text_with_timestamps)
+    print(f"   [AI] 逐字稿長度: {len(text_with_timestamps)} 字元，預計擷取 {vocab_count} 個單字 與 {pattern_count} 個句型")
+
+    return _analyze_prompt(text_with_timestamps, vocab_count, pattern_count, index=index)
 
 def main():
     # 檢查 API KEY 是否已設定
@@ -334,54 +675,64 @@ def main():
                 urls.append(row[0])
 
 
-    results = []
-    print(f"🚀 生產線啟動，預計處理 {len(urls)} 個連結...")
+    # 每部影片完成就寫入 learning_data.jsonl；已完成的影片 (learning_data.done) 重新執行時會跳過
+    result_log = ResultLog()
+    remaining = [url for url in urls if (normalize_video_id(url) or str(url).split('/')[-1]) not in result_log]
+    if len(remaining) < len(urls):
+        print(f"⏩ 略過 {len(urls) - len(remaining)} 個先前已完成的連結")
+    print(f"🚀 生產線啟動，預計處理 {len(remaining)} 個連結...")
+
+    try:
+        for i, url in enumerate(remaining):
+            v_id = normalize_video_id(url) or str(url).split('/')[-1]
+            if v_id in result_log:
+                continue
+            print(f"[{i+1}/{len(remaining)}] 處理: {v_id}", end="")
 
-    for i, url in enumerate(urls):
-        v_id = str(url).split('v=')[-1].split('&')[0] if 'v=' in str(url) else str(url).split('/')[-1]
-        print(f"[{i+1}/{len(urls)}] 處理: {v_id}", end="")
-        
-        text = fetch_transcript_final(v_id)
-        if text:
-            # Retry loop for AI generation
-            max_retries = 3
-            for attempt in range(max_retries):
+            text, status = fetch_transcript(v_id)
+            if text:
+                text = compact_transcript(text)
                 try:
-                    # 傳送給 AI 分析
+                    # 傳送給 AI 分析 (配額 / 暫時性錯誤由 key_pool 換 Key 重試)
                     analysis = analyze_with_ai(text)
-                    
+
                     analysis['video_id'] = v_id
                     analysis['url'] = url
-                    results.append(analysis)
-                    
+                    # Mark as done so the worker does not pick the row up again
+                    analysis['status'] = 'completed'
+                    result_log.append(analysis)
+
                     # Upload to Supabase immediately
                     try:
                         print(f"   [上傳] 正在寫入資料庫...")
-                        supabase.table('en_videos').upsert(analysis).execute()
+                        get_supabase().table('en_videos').upsert(analysis).execute()
                         print("   ✅ 資料庫更新成功！")
                     except Exception as db_err:
-                        print(f"   ⚠️ 資料庫寫入失敗 (但已存入 JSON): {db_err}")
+                        print(f"   ⚠️ 資料庫寫入失敗 (但已存入 JSONL): {db_err}")
 
                     print(" ✅ AI分析成功")
-                    break # Success, exit retry loop
-                    
                 except Exception as e:
-                    error_str = str(e)
-                    if any(code in error_str for code in ["429", "RESOURCE_EXHAUSTED", "503", "UNAVAILABLE"]):
-                        print(f" ⚠️ 臨時錯誤 ({'429' if '429' in error_str else '503'})，自動切換下一組 API Key 並稍後重試...")
-                        rotate_key()
-                        time.sleep(5 if "503" in error_str or "UNAVAILABLE" in error_str else 2)
-                    else:
-                        print(f" ❌ AI分析出錯: {e}")
-                        break # Other errors, don't retry
-        else:
-            print(" 🚫 真的找不到任何CC字幕軌")
-        
-        time.sleep(10)
-
-    with open('learning_data.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+                    print(f" ❌ AI分析出錯: {e}")
+            elif status == 'no_captions':
+                print(" 🚫 真的找不到任何CC字幕軌")
+                result_log.mark_done(v_id)
+            else:
+                # Not logged: the next run tries this video again
+                print(" ⚠️ 字幕暫時無法取得，下次執行會再試一次")
+    finally:
+        result_log.close()
+        youtube_limiter.close()
+        transcript_fetcher.save()
+
+    count = compact_to_json()
+    print(f"📝 learning_data.json 已更新 ({count} 筆)")
     print("\n✨ 任務完成！已產出精華筆記。")
+    print(f"📦 AI 分析快取: {analysis_cache.stats()}")
+    print(f"🧩 AI 回應: {analysis_stats}")
+    print(f"📺 YouTube 節流: {youtube_limiter.stats()}")
+    print(f"🏁 字幕來源: {transcript_fetcher.summary()}")
+    for key_stats in key_pool.stats():
+        print(f"🔑 {key_stats}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
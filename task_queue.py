@@ -0,0 +1,291 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+
+# Lease length for a claimed video. A worker that has not finished by then
+# is assumed to be dead and the row may be handed out again.
+LEASE_SECONDS = 600
+
+# Transient failures are retried with exponential backoff; after this many
+# attempts the row goes to the dead-letter status 'dead'.
+MAX_ATTEMPTS = 5
+BASE_RETRY_DELAY_SECONDS = 60
+MAX_RETRY_DELAY_SECONDS = 6 * 3600
+
+def retry_delay(attempt_count):
+    """Backoff before the next attempt, same formula as fail_en_videos()."""
+    return min(BASE_RETRY_DELAY_SECONDS * 2 ** max(attempt_count - 1, 0), MAX_RETRY_DELAY_SECONDS)
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class SupabaseTaskQueue:
+    """
+    透過 claim_en_videos() (見 claim_tasks.sql / lease_retries.sql) 一次原子性地領取多筆 pending 任務，
+    並以 heartbeat / fail / reap 管理租約與重試。
+    若資料庫尚未建立這些函式，退回舊的 select + 條件式 update 作法。
+    client_factory: 不直接傳入 client 時，第一次使用才呼叫它建立 (避免 import 時就載入 supabase)。
+    """
+    def __init__(self, client=None, worker_id=None, lease_seconds=LEASE_SECONDS, client_factory=None):
+        self._client = client
+        self.client_factory = client_factory
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self._missing_rpcs = set()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def _rpc(self, name, params):
+        """Call a queue function; returns None if it is not installed yet."""
+        if name in self._missing_rpcs:
+            return None
+        try:
+            return self.client.rpc(name, params).execute().data or []
+        except Exception as e:
+            if name not in str(e) and 'PGRST202' not in str(e):
+                raise
+            print(f"   ⚠️ {name}() not found, using fallback. Run claim_tasks.sql / lease_retries.sql. ({e})")
+            self._missing_rpcs.add(name)
+            return None
+
+    def claim(self, limit=1):
+        claimed = self._rpc('claim_en_videos', {
+            'p_worker': self.worker_id,
+            'p_limit': limit,
+            'p_lease_seconds': self.lease_seconds,
+        })
+        if claimed is None:
+            return self._claim_legacy(limit)
+        return claimed
+
+    def _claim_legacy(self, limit):
+        response = self.client.table('en_videos') \
+            .select('*') \
+            .eq('status', 'pending') \
+            .limit(limit) \
+            .execute()
+
+        claimed = []
+        for task in response.data:
+            # Conditional update: only succeeds if nobody else moved the row first
+            updated = self.client.table('en_videos') \
+                .update({'status': 'processing'}) \
+                .eq('video_id', task['video_id']) \
+                .eq('status', 'pending') \
+                .execute()
+            if updated.data:
+                task['status'] = 'processing'
+                claimed.append(task)
+        return claimed
+
+    def heartbeat(self, video_ids):
+        """Extend the leases of in-flight videos; returns the ids still held by this worker."""
+        if not video_ids:
+            return []
+        held = self._rpc('heartbeat_en_videos', {
+            'p_worker': self.worker_id,
+            'p_video_ids': list(video_ids),
+            'p_lease_seconds': self.lease_seconds,
+        })
+        return list(video_ids) if held is None else held
+
+    def fail(self, video_id, error, retryable=True):
+        """
+        失敗處理：可重試的錯誤排回 pending 並延後 next_attempt_at，
+        不可重試的標記 error，超過 MAX_ATTEMPTS 次則進入 dead。回傳新的 status。
+        """
+        rows = self._rpc('fail_en_videos', {
+            'p_worker': self.worker_id,
+            'p_video_id': video_id,
+            'p_error': str(error),
+            'p_retryable': retryable,
+            'p_max_attempts': MAX_ATTEMPTS,
+            'p_base_delay_seconds': BASE_RETRY_DELAY_SECONDS,
+        })
+        if rows is None:
+            # Old schema: no retry bookkeeping, keep the previous behaviour
+            self.client.table('en_videos') \
+                .update({'status': 'error', 'processing_error': str(error)}) \
+                .eq('video_id', video_id) \
+                .execute()
+            return 'error'
+        return rows[0]['status'] if rows else None
+
+    def reap(self):
+        """Return rows with expired leases to the queue (or to 'dead'); returns the reaped rows."""
+        rows = self._rpc('reap_en_videos', {
+            'p_max_attempts': MAX_ATTEMPTS,
+            'p_base_delay_seconds': BASE_RETRY_DELAY_SECONDS,
+        })
+        return rows or []
+
+class LeaseHeartbeat:
+    """
+    背景執行緒：定期 (租約的 1/3) 為所有進行中的任務續租，
+    讓 reaper 只會回收真正停止回應的 worker 留下的任務。
+    """
+    def __init__(self, task_queue, interval=None):
+        self.task_queue = task_queue
+        self.interval = interval or task_queue.lease_seconds / 3
+        self._video_ids = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def track(self, video_id):
+        with self._lock:
+            self._video_ids.add(video_id)
+
+    def untrack(self, video_id):
+        with self._lock:
+            self._video_ids.discard(video_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                video_ids = list(self._video_ids)
+            if not video_ids:
+                continue
+            try:
+                held = set(self.task_queue.heartbeat(video_ids))
+                for video_id in video_ids:
+                    if video_id not in held:
+                        print(f"   ⚠️ Lease lost for {video_id} (reaped or re-claimed by another worker)")
+            except Exception as e:
+                print(f"   ⚠️ Heartbeat failed: {e}")
+
+class SQLiteTaskQueue:
+    """
+    本機 SQLite 版本的任務佇列，語意與 claim_en_videos() 相同，用於測試與離線開發。
+    多個行程共用同一個檔案時，BEGIN IMMEDIATE 保證同一時間只有一個 claim 在執行。
+    """
+    def __init__(self, path=":memory:", worker_id=None, lease_seconds=LEASE_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS en_videos (
+                video_id TEXT PRIMARY KEY,
+                url TEXT,
+                title TEXT,
+                status TEXT DEFAULT 'pending',
+                processing_error TEXT,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                attempt_count INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                created_at REAL
+            )
+        """)
+
+    def enqueue(self, video_id, url=None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO en_videos (video_id, url, status, created_at) VALUES (?, ?, 'pending', ?)",
+                (video_id, url or f"https://www.youtube.com/watch?v={video_id}", time.time()))
+
+    def get(self, video_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM en_videos WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, limit=1):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT video_id FROM en_videos WHERE status = 'pending' "
+                    "AND (next_attempt_at IS NULL OR next_attempt_at <= ?) ORDER BY created_at LIMIT ?",
+                    (now, limit)).fetchall()
+                ids = [r['video_id'] for r in rows]
+                self.conn.executemany(
+                    "UPDATE en_videos SET status = 'processing', lease_owner = ?, lease_expires_at = ?, "
+                    "attempt_count = COALESCE(attempt_count, 0) + 1 WHERE video_id = ?",
+                    [(self.worker_id, now + self.lease_seconds, v) for v in ids])
+                claimed = [dict(self.conn.execute("SELECT * FROM en_videos WHERE video_id = ?", (v,)).fetchone()) for v in ids]
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def heartbeat(self, video_ids):
+        now = time.time()
+        held = []
+        with self._lock:
+            for video_id in video_ids:
+                cur = self.conn.execute(
+                    "UPDATE en_videos SET lease_expires_at = ? "
+                    "WHERE video_id = ? AND lease_owner = ? AND status = 'processing'",
+                    (now + self.lease_seconds, video_id, self.worker_id))
+                if cur.rowcount:
+                    held.append(video_id)
+        return held
+
+    def _reschedule(self, row, retryable, error, now):
+        attempts = row['attempt_count'] or 0
+        if not retryable:
+            status, next_at = 'error', None
+        elif attempts >= MAX_ATTEMPTS:
+            status, next_at = 'dead', None
+        else:
+            status, next_at = 'pending', now + retry_delay(attempts)
+        self.conn.execute(
+            "UPDATE en_videos SET status = ?, next_attempt_at = ?, processing_error = ?, "
+            "lease_owner = NULL, lease_expires_at = NULL WHERE video_id = ?",
+            (status, next_at, str(error), row['video_id']))
+        return status
+
+    def fail(self, video_id, error, retryable=True):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM en_videos WHERE video_id = ? AND (lease_owner = ? OR lease_owner IS NULL)",
+                    (video_id, self.worker_id)).fetchone()
+                status = self._reschedule(row, retryable, error, now) if row else None
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return status
+
+    def complete(self, video_id):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE en_videos SET status = 'completed', processing_error = NULL, "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE video_id = ?", (video_id,))
+
+    def reap(self):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT * FROM en_videos WHERE status = 'processing' AND lease_expires_at < ?", (now,)).fetchall()
+                for row in rows:
+                    self._reschedule(row, True, 'Lease expired (worker stopped responding)', now)
+                reaped = [dict(self.conn.execute("SELECT * FROM en_videos WHERE video_id = ?", (r['video_id'],)).fetchone())
+                          for r in rows]
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return reaped
@@ -0,0 +1,38 @@
+"""
+merge_analyses keeps distinct words that share a stem and reports what the merge left short.
+
+    python -m pytest test_chunked_analysis.py      # or: python test_chunked_analysis.py
+"""
+import unittest
+from chunked_analysis import merge_analyses, missing_counts
+
+def _word(word):
+    return {'word': word, 'definition': word, 'definition_zh': word}
+
+def _pattern(structure, timestamp):
+    return {'structure': structure, 'example': structure, 'timestamp': timestamp}
+
+class MergeAnalysesTest(unittest.TestCase):
+    def test_words_sharing_a_stem_are_both_kept(self):
+        parts = [{'vocabulary': [_word('care'), _word('note')]}, {'vocabulary': [_word('car'), _word('not')]}]
+        merged = merge_analyses(parts, '4-6', '0')
+        self.assertEqual(sorted(v['word'] for v in merged['vocabulary']), ['car', 'care', 'not', 'note'])
+
+    def test_same_word_is_merged(self):
+        parts = [{'vocabulary': [_word('Figure out')]}, {'vocabulary': [_word('figure  out'), _word('cheap')]}]
+        merged = merge_analyses(parts, '2-3', '0')
+        self.assertEqual([v['word'] for v in merged['vocabulary']], ['Figure out', 'cheap'])
+
+    def test_missing_counts_after_dedupe(self):
+        parts = [{'vocabulary': [_word('care'), _word('cheap')], 'sentence_patterns': [_pattern('used to + V', 30)]},
+                 {'vocabulary': [_word('care')], 'sentence_patterns': [_pattern('Used to + V', 700)]}]
+        merged = merge_analyses(parts, '4-6', '2-3')
+        self.assertEqual(missing_counts(merged, '4-6', '2-3'), (2, 1))
+
+    def test_patterns_sorted_by_time(self):
+        parts = [{'sentence_patterns': [_pattern('b', 900)]}, {'sentence_patterns': [_pattern('a', 10)]}]
+        merged = merge_analyses(parts, '0', '2')
+        self.assertEqual([p['timestamp'] for p in merged['sentence_patterns']], [10, 900])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+KeyPool: key selection, cooldown after 429 / 503, error classification and the asyncio path (acall / acquire_async).
+
+    python -m pytest test_key_pool.py      # or: python test_key_pool.py
+"""
+import time
+import asyncio
+import unittest
+from unittest import mock
+from google.genai import errors as genai_errors
+from key_pool import KeyPool, NoKeyAvailable, classify_error
+
+def genai_error(cls, code, status, message=None, retry_delay=None):
+    error = {'code': code, 'status': status, 'message': message or status}
+    if retry_delay:
+        error['details'] = [{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': retry_delay}]
+    return cls(code, {'error': error})
+
+QUOTA = genai_error(genai_errors.ClientError, 429, 'RESOURCE_EXHAUSTED', retry_delay='30s')
+
+class FakeClient:
+    def __init__(self, key):
+        self.key = key
+
+def make_pool(keys=("key-aaaa", "key-bbbb"), **kwargs):
+    return KeyPool(list(keys), FakeClient, **kwargs)
+
+class ClassifyErrorTest(unittest.TestCase):
+    def test_status_codes(self):
+        self.assertEqual(classify_error(QUOTA), 'quota')
+        self.assertEqual(classify_error(genai_error(genai_errors.ServerError, 503, 'UNAVAILABLE')), 'unavailable')
+        self.assertEqual(classify_error(genai_error(genai_errors.ServerError, 500, 'INTERNAL')), 'unavailable')
+        self.assertEqual(classify_error(genai_error(genai_errors.ClientError, 403, 'PERMISSION_DENIED')), 'invalid')
+        self.assertEqual(classify_error(genai_error(genai_errors.ClientError, 400, 'INVALID_ARGUMENT',
+                                                    "API key not valid. Please pass a valid API key.")), 'invalid')
+        self.assertIsNone(classify_error(genai_error(genai_errors.ClientError, 400, 'INVALID_ARGUMENT')))
+
+    def test_numbers_in_the_message_are_not_statuses(self):
+        self.assertIsNone(classify_error(ValueError("chunk 504 of 1500 INTERNAL")))
+        self.assertIsNone(classify_error(Exception("429")))
+
+class KeyPoolTest(unittest.TestCase):
+    def test_quota_error_cools_the_key_down(self):
+        pool = make_pool()
+        lease = pool.acquire()
+        self.assertEqual(pool.release(lease, error=QUOTA), 'quota')
+        self.assertGreater(pool.stats()[lease.state.index]['cooldown'], 25)
+        # The other key is used while the first one cools down
+        for _ in range(3):
+            other = pool.acquire()
+            self.assertIsNot(other.state, lease.state)
+            pool.release(other)
+
+    def test_call_retries_on_another_key(self):
+        pool = make_pool()
+        used = []
+        def fn(client):
+            used.append(client.key)
+            if len(used) == 1:
+                raise QUOTA
+            return "ok"
+        self.assertEqual(pool.call(fn), "ok")
+        self.assertEqual(len(set(used)), 2)
+
+    def test_other_errors_are_raised(self):
+        pool = make_pool()
+        def fn(client):
+            raise ValueError("bad prompt")
+        with self.assertRaises(ValueError):
+            pool.call(fn)
+        self.assertEqual(sum(s['requests'] for s in pool.stats()), 1)
+
+    def test_failed_client_factory_refunds_the_request(self):
+        def factory(key):
+            raise RuntimeError("no network")
+        pool = KeyPool(["key-aaaa"], factory, rpm=1)
+        with self.assertRaises(RuntimeError):
+            pool.acquire(tokens=100)
+        state = pool.keys[0]
+        self.assertEqual((state.in_flight, state.requests), (0, 0))
+        self.assertGreaterEqual(state.rpm.tokens, 1)
+        self.assertEqual(state.tpm.tokens, state.tpm.capacity)
+        # The only request allowed this minute is still available
+        pool.client_factory = FakeClient
+        self.assertIsNotNone(pool.acquire(max_wait=0))
+
+    def test_no_keys(self):
+        with self.assertRaises(NoKeyAvailable):
+            make_pool(keys=()).acquire()
+
+class AsyncKeyPoolTest(unittest.TestCase):
+    def test_acall(self):
+        pool = make_pool()
+        async def generate(client):
+            await asyncio.sleep(0)
+            return client.key
+        async def main():
+            return await asyncio.gather(*(pool.acall(generate, tokens=10) for _ in range(4)))
+        self.assertEqual(sorted(asyncio.run(main())), ["key-aaaa", "key-aaaa", "key-bbbb", "key-bbbb"])
+        self.assertEqual(sum(s['successes'] for s in pool.stats()), 4)
+        self.assertEqual(sum(s['in_flight'] for s in pool.stats()), 0)
+
+    def test_acall_moves_to_another_key_after_429(self):
+        pool = make_pool()
+        used = []
+        async def generate(client):
+            used.append(client.key)
+            if len(used) == 1:
+                raise QUOTA
+            return "ok"
+        self.assertEqual(asyncio.run(pool.acall(generate)), "ok")
+        self.assertNotEqual(used[0], used[1])
+        self.assertEqual(sum(s['throttled'] for s in pool.stats()), 1)
+
+    def test_acquire_async_waits_for_the_cooldown(self):
+        pool = make_pool(keys=("key-aaaa",))
+        lease = pool.acquire()
+        with mock.patch('key_pool.backoff_delay', return_value=0.1):
+            pool.release(lease, error=genai_error(genai_errors.ServerError, 503, 'UNAVAILABLE'))
+        start = time.monotonic()
+        lease = asyncio.run(pool.acquire_async())
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        pool.release(lease)
+
+    def test_acquire_async_gives_up(self):
+        pool = make_pool(keys=("key-aaaa",))
+        pool.release(pool.acquire(), error=QUOTA)
+        with self.assertRaises(NoKeyAvailable):
+            asyncio.run(pool.acquire_async(max_wait=0.05))
+
+    def test_acquire_async_does_not_block_the_loop(self):
+        pool = make_pool(keys=("key-aaaa",))
+        lease = pool.acquire()
+        with mock.patch('key_pool.backoff_delay', return_value=0.2):
+            pool.release(lease, error=genai_error(genai_errors.ServerError, 503, 'UNAVAILABLE'))
+        ticks = []
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+        async def main():
+            lease, _ = await asyncio.gather(pool.acquire_async(), ticker())
+            return lease
+        pool.release(asyncio.run(main()))
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.15)
+
+if __name__ == "__main__":
+    unittest.main()
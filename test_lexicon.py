@@ -0,0 +1,66 @@
+"""
+The lexicon must only fill a word-only item with the entry of that exact word: words that share a
+stem (care / car, note / not) keep separate entries.
+
+    python -m pytest test_lexicon.py      # or: python test_lexicon.py
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import unittest
+from lexicon import Lexicon
+
+CAR = {'word': 'car', 'phonetic': '/kɑːr/', 'definition': 'a road vehicle', 'definition_zh': '汽車',
+       'example': 'I drive a car.', 'example_zh': '我開車。'}
+FIGURE_OUT = {'word': 'figure out', 'definition': 'to understand', 'definition_zh': '弄懂'}
+
+class LexiconTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "lexicon.sqlite3")
+        self.lexicon = Lexicon(self.path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_words_sharing_a_stem_do_not_match(self):
+        self.lexicon.learn([CAR])
+        self.assertEqual(self.lexicon.known_words("1|I really care about this"), [])
+        self.assertEqual(self.lexicon.known_words("1|My car is red"), ['car'])
+        care = {'word': 'care'}
+        self.assertEqual(self.lexicon.fill([care]), 0)
+        self.assertEqual(care, {'word': 'care'})
+
+    def test_fill_exact_word(self):
+        self.lexicon.learn([CAR])
+        item = {'word': 'Car'}
+        self.assertEqual(self.lexicon.fill([item]), 1)
+        self.assertEqual(item['definition'], 'a road vehicle')
+
+    def test_both_words_are_kept(self):
+        self.lexicon.learn([CAR, {'word': 'care', 'definition': 'to feel concern', 'definition_zh': '在乎'}])
+        self.assertEqual(len(self.lexicon), 2)
+        items = [{'word': 'care'}, {'word': 'car'}]
+        self.lexicon.fill(items)
+        self.assertEqual([i['definition'] for i in items], ['to feel concern', 'a road vehicle'])
+
+    def test_inflected_phrase_lists_the_stored_phrase(self):
+        self.lexicon.learn([FIGURE_OUT])
+        self.assertEqual(Lexicon(self.path).known_words("1|We figured out the answer"), ['figure out'])
+
+    def test_lemma_keyed_lexicon_is_migrated(self):
+        conn = sqlite3.connect(os.path.join(self.dir.name, "old.sqlite3"))
+        conn.executescript("""
+            CREATE TABLE entries (lemma TEXT PRIMARY KEY, word TEXT NOT NULL, phonetic TEXT, definition TEXT NOT NULL,
+                                  definition_zh TEXT NOT NULL, example TEXT, example_zh TEXT,
+                                  uses INTEGER NOT NULL DEFAULT 1, created_at REAL NOT NULL);
+        """)
+        conn.execute("INSERT INTO entries VALUES ('car', 'car', '', 'a road vehicle', '汽車', '', '', 3, ?)", (time.time(),))
+        conn.commit()
+        conn.close()
+        lexicon = Lexicon(os.path.join(self.dir.name, "old.sqlite3"))
+        self.assertEqual(lexicon.known_words("1|I care about my car"), ['car'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+queue_wakeup: AdaptiveBackoff and InProcessWaker (the in-process stand-in for LISTEN/NOTIFY).
+
+    python -m pytest test_queue_wakeup.py      # or: python test_queue_wakeup.py
+"""
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+from queue_wakeup import AdaptiveBackoff, InProcessWaker, PollingWaker, create_waker
+
+class AdaptiveBackoffTest(unittest.TestCase):
+    def test_doubles_up_to_the_cap_and_resets(self):
+        backoff = AdaptiveBackoff(min_delay=1, max_delay=10, factor=2)
+        self.assertEqual([backoff.next_delay() for _ in range(6)], [1, 2, 4, 8, 10, 10])
+        backoff.reset()
+        self.assertEqual(backoff.next_delay(), 1)
+
+class InProcessWakerTest(unittest.TestCase):
+    def test_notify_wakes_a_waiting_worker(self):
+        waker = InProcessWaker()
+        threading.Timer(0.05, waker.notify, args=("video0",)).start()
+        start = time.monotonic()
+        self.assertTrue(waker.wait(5))
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_notify_while_busy_is_not_lost(self):
+        waker = InProcessWaker()
+        waker.notify()
+        self.assertTrue(waker.wait(0))
+        # Consumed by the first wait
+        self.assertFalse(waker.wait(0.01))
+
+    def test_times_out_without_notify(self):
+        waker = InProcessWaker()
+        start = time.monotonic()
+        self.assertFalse(waker.wait(0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+class CreateWakerTest(unittest.TestCase):
+    def test_polls_without_database_url(self):
+        with mock.patch.dict(os.environ, {"DATABASE_URL": ""}):
+            self.assertIsInstance(create_waker(), PollingWaker)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+The review page (web_app/src/srsRules.js) and srs_scheduler.next_review must schedule a grade the same way:
+both are run on every (interval, streak, grade) combination below and compared.
+
+    python -m pytest test_srs_rules.py      # or: python test_srs_rules.py
+"""
+import os
+import json
+import shutil
+import itertools
+import subprocess
+import unittest
+import numpy as np
+import srs_scheduler as srs
+
+RULES_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_app", "src", "srsRules.js")
+INTERVALS = (None, 0, 1, 2, 3, 4, 5, 7, 10, 13, 30, 99, 365)
+STREAKS = (None, 0, 1, 5)
+GRADES = range(6)
+
+def _run_js(cases):
+    script = (f"import {{ nextReview }} from {json.dumps('file://' + RULES_JS)};\n"
+              f"const cases = {json.dumps(cases)};\n"
+              "console.log(JSON.stringify(cases.map(([interval, streak, quality]) =>"
+              " nextReview({ interval, streak }, quality))));\n")
+    result = subprocess.run(["node", "--input-type=module", "-e", script],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+@unittest.skipIf(shutil.which("node") is None, "node is not installed")
+class SrsRulesTest(unittest.TestCase):
+    def test_page_and_scheduler_agree(self):
+        cases = list(itertools.product(INTERVALS, STREAKS, GRADES))
+        expected = _run_js(cases)
+        # The scheduler reads NULL columns as 0 (Cards)
+        interval, streak, status = srs.next_review(
+            np.array([c[0] or 0 for c in cases], dtype=np.int64),
+            np.array([c[1] or 0 for c in cases], dtype=np.int64),
+            np.array([c[2] for c in cases], dtype=np.int64))
+        for k, case in enumerate(cases):
+            with self.subTest(interval=case[0], streak=case[1], grade=case[2]):
+                self.assertEqual(
+                    {'interval': int(interval[k]), 'streak': int(streak[k]), 'status': srs.STATUSES[status[k]]},
+                    expected[k])
+
+if __name__ == "__main__":
+    unittest.main()
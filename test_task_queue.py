@@ -0,0 +1,177 @@
+"""
+SQLiteTaskQueue (the local stand-in for claim_en_videos() and the lease functions) and LeaseHeartbeat.
+
+    python -m pytest test_task_queue.py      # or: python test_task_queue.py
+"""
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from task_queue import SQLiteTaskQueue, LeaseHeartbeat, MAX_ATTEMPTS, BASE_RETRY_DELAY_SECONDS, \
+    MAX_RETRY_DELAY_SECONDS, retry_delay
+
+class TwoWorkersTest(unittest.TestCase):
+    """Two workers on one SQLite file, as two processes would share it."""
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.dir.name, "queue.sqlite3")
+        self.a = SQLiteTaskQueue(path, worker_id="worker-a", lease_seconds=60)
+        self.b = SQLiteTaskQueue(path, worker_id="worker-b", lease_seconds=60)
+        for n in range(5):
+            self.a.enqueue(f"video{n}")
+
+    def tearDown(self):
+        self.a.conn.close()
+        self.b.conn.close()
+        self.dir.cleanup()
+
+    def test_claim_leases_rows_once(self):
+        first = self.a.claim(limit=3)
+        second = self.b.claim(limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({r['video_id'] for r in first} & {r['video_id'] for r in second})
+        self.assertEqual(self.b.claim(limit=3), [])
+        row = self.a.get(first[0]['video_id'])
+        self.assertEqual((row['status'], row['lease_owner'], row['attempt_count']), ('processing', 'worker-a', 1))
+
+    def test_concurrent_claims_do_not_overlap(self):
+        claimed = []
+        def claim(queue):
+            while True:
+                rows = queue.claim(limit=1)
+                if not rows:
+                    return
+                claimed.extend(r['video_id'] for r in rows)
+        threads = [threading.Thread(target=claim, args=(q,)) for q in (self.a, self.b)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(claimed), [f"video{n}" for n in range(5)])
+
+    def test_heartbeat_renews_only_owned_leases(self):
+        mine = [r['video_id'] for r in self.a.claim(limit=2)]
+        theirs = [r['video_id'] for r in self.b.claim(limit=1)]
+        with mock.patch('task_queue.time.time', return_value=time.time() + 30):
+            self.assertEqual(self.a.heartbeat(mine + theirs), mine)
+        self.assertGreater(self.a.get(mine[0])['lease_expires_at'], self.b.get(theirs[0])['lease_expires_at'])
+
+    def test_heartbeat_skips_finished_rows(self):
+        video_id = self.a.claim(limit=1)[0]['video_id']
+        self.a.complete(video_id)
+        self.assertEqual(self.a.heartbeat([video_id]), [])
+
+    def test_expired_lease_can_be_claimed_after_reap(self):
+        video_id = self.a.claim(limit=5)[0]['video_id']
+        self.assertEqual(self.b.claim(limit=1), [])
+        with mock.patch('task_queue.time.time', return_value=time.time() + 120):
+            self.assertIn(video_id, [r['video_id'] for r in self.b.reap()])
+        # Returned to the queue with a backoff, then handed to the other worker
+        with mock.patch('task_queue.time.time', return_value=time.time() + 3600):
+            rows = self.b.claim(limit=5)
+        self.assertIn(video_id, [r['video_id'] for r in rows])
+        self.assertEqual(self.b.get(video_id)['lease_owner'], 'worker-b')
+        # The first worker lost the lease
+        self.assertEqual(self.a.heartbeat([video_id]), [])
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = SQLiteTaskQueue(worker_id="worker-a", lease_seconds=60)
+        self.queue.enqueue("video0")
+        self.now = time.time()
+
+    def tearDown(self):
+        self.queue.conn.close()
+
+    def _at(self, offset):
+        return mock.patch('task_queue.time.time', return_value=self.now + offset)
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)],
+                         [BASE_RETRY_DELAY_SECONDS, 2 * BASE_RETRY_DELAY_SECONDS, 4 * BASE_RETRY_DELAY_SECONDS])
+        self.assertEqual(retry_delay(50), MAX_RETRY_DELAY_SECONDS)
+
+    def test_transient_failure_is_retried_after_the_backoff(self):
+        with self._at(0):
+            self.queue.claim()
+            self.assertEqual(self.queue.fail("video0", "503 UNAVAILABLE", retryable=True), 'pending')
+        row = self.queue.get("video0")
+        self.assertAlmostEqual(row['next_attempt_at'], self.now + retry_delay(1), places=3)
+        self.assertIsNone(row['lease_owner'])
+        with self._at(retry_delay(1) - 1):
+            self.assertEqual(self.queue.claim(), [])
+        with self._at(retry_delay(1) + 1):
+            self.assertEqual(self.queue.claim()[0]['attempt_count'], 2)
+
+    def test_dead_letter_after_the_attempt_cap(self):
+        offset = 0
+        statuses = []
+        for _ in range(MAX_ATTEMPTS):
+            with self._at(offset):
+                self.assertEqual(len(self.queue.claim()), 1)
+                statuses.append(self.queue.fail("video0", "timed out", retryable=True))
+            offset += MAX_RETRY_DELAY_SECONDS + 1
+        self.assertEqual(statuses, ['pending'] * (MAX_ATTEMPTS - 1) + ['dead'])
+        with self._at(offset):
+            self.assertEqual(self.queue.claim(), [])
+
+    def test_permanent_failure_is_not_retried(self):
+        self.queue.claim()
+        self.assertEqual(self.queue.fail("video0", "No CC found", retryable=False), 'error')
+        self.assertEqual(self.queue.get("video0")['processing_error'], "No CC found")
+
+    def test_reaped_rows_count_as_attempts(self):
+        offset = 0
+        statuses = []
+        for _ in range(MAX_ATTEMPTS):
+            with self._at(offset):
+                self.assertEqual(len(self.queue.claim()), 1)
+            with self._at(offset + 61):
+                statuses.append(self.queue.reap()[0]['status'])
+            offset += 61 + MAX_RETRY_DELAY_SECONDS + 1
+        self.assertEqual(statuses, ['pending'] * (MAX_ATTEMPTS - 1) + ['dead'])
+
+    def test_fail_ignores_rows_leased_by_another_worker(self):
+        self.queue.claim()
+        other = SQLiteTaskQueue(worker_id="worker-b")
+        other.conn = self.queue.conn
+        other._lock = self.queue._lock
+        self.assertIsNone(other.fail("video0", "timed out"))
+        self.assertEqual(self.queue.get("video0")['status'], 'processing')
+
+class FakeQueue:
+    lease_seconds = 3
+
+    def __init__(self, owned):
+        self.owned = owned
+        self.calls = []
+        self.called = threading.Event()
+
+    def heartbeat(self, video_ids):
+        self.calls.append(sorted(video_ids))
+        self.called.set()
+        return [v for v in video_ids if v in self.owned]
+
+class LeaseHeartbeatTest(unittest.TestCase):
+    def test_renews_tracked_videos(self):
+        queue = FakeQueue(owned={'a', 'b'})
+        heartbeat = LeaseHeartbeat(queue, interval=0.01)
+        heartbeat.track('a')
+        heartbeat.track('b')
+        heartbeat.track('c')
+        heartbeat.untrack('b')
+        heartbeat.start()
+        try:
+            self.assertTrue(queue.called.wait(2))
+        finally:
+            heartbeat.stop()
+        self.assertEqual(queue.calls[0], ['a', 'c'])
+
+    def test_default_interval_is_a_third_of_the_lease(self):
+        self.assertEqual(LeaseHeartbeat(FakeQueue(set())).interval, 1)
+
+if __name__ == "__main__":
+    unittest.main()
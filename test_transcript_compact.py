@@ -0,0 +1,30 @@
+"""
+transcript_compact removes only listed fillers / sound tags and stutters, and drops a repeated
+sentence only right after its copy.
+
+    python -m pytest test_transcript_compact.py      # or: python test_transcript_compact.py
+"""
+import unittest
+from transcript_compact import compact_segments, compact_transcript
+
+def clean(text):
+    return compact_transcript(f"0|{text}").partition('|')[2]
+
+class CompactTest(unittest.TestCase):
+    def test_correct_doubled_words_are_kept(self):
+        self.assertEqual(clean("She had had enough."), "She had had enough.")
+        self.assertEqual(clean("I know that that works."), "I know that that works.")
+
+    def test_stutters_are_collapsed(self):
+        self.assertEqual(clean("I I think the the idea is fine."), "I think the idea is fine.")
+
+    def test_only_listed_tags_are_removed(self):
+        self.assertEqual(clean("[Music] So (Laughter) um, we started (in 2019) again."),
+                         "So we started (in 2019) again.")
+
+    def test_only_adjacent_repeats_are_dropped(self):
+        fragments = [(0, "Let's go."), (2, "Let's go."), (4, "We wait."), (6, "Let's go.")]
+        self.assertEqual([text for _, text in compact_segments(fragments)], ["Let's go.", "We wait.", "Let's go."])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+"""
+vocab_rank looks a word up in the CEFR list as written first, and only falls back to its stem
+(lemmas.word_key) for inflected forms: note is not ranked as "not", better not as "good".
+
+    python -m pytest test_vocab_rank.py      # or: python test_vocab_rank.py
+"""
+import unittest
+from vocab_rank import load_wordlist, base_form, rank_candidates
+
+class VocabRankTest(unittest.TestCase):
+    def test_exact_word_first(self):
+        levels, stems = load_wordlist()
+        self.assertEqual(base_form('note', levels, stems), 'note')
+        self.assertEqual(base_form('better', levels, stems), 'better')
+
+    def test_inflected_forms_use_the_stem(self):
+        levels, stems = load_wordlist()
+        for surface, word in (('notes', 'note'), ('cars', 'car'), ('caring', 'care'), ('planning', 'plan'),
+                              ('making', 'make'), ('went', 'go')):
+            with self.subTest(surface=surface):
+                self.assertEqual(base_form(surface, levels, stems), word)
+
+    def test_note_can_be_a_candidate(self):
+        text = "\n".join(f"{i * 20}|please take a note, the notes are not long" for i in range(30))
+        candidates = {c['word']: c for c in rank_candidates(text, limit=10)}
+        self.assertIn('note', candidates)
+        self.assertEqual(candidates['note']['count'], 60)
+        self.assertNotIn('not', candidates)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+iter_vtt_cues drops only the lines a rolling auto-caption cue repeats from the previous cue;
+speech that is really repeated stays.
+
+    python -m pytest test_vtt_parser.py      # or: python test_vtt_parser.py
+"""
+import unittest
+from vtt_parser import iter_vtt_cues
+
+ROLLING = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.000 align:start position:0%
+ 
+so I<00:00:00.500><c> think</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+so I think
+ 
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+so I think
+it<00:00:02.500><c> works</c>
+
+00:00:04.000 --> 00:00:04.010 align:start position:0%
+it works
+ 
+
+00:00:04.010 --> 00:00:06.000 align:start position:0%
+it works
+so I think
+"""
+
+MANUAL = """WEBVTT
+
+1
+00:00:01.000 --> 00:00:02.000
+No.
+
+2
+00:00:02.000 --> 00:00:03.000
+No.
+
+3
+00:00:03.000 --> 00:00:05.000
+No. No.
+I said no.
+"""
+
+class VttParserTest(unittest.TestCase):
+    def test_rolling_overlap_is_dropped(self):
+        cues = list(iter_vtt_cues(ROLLING))
+        self.assertEqual([c.text for c in cues], ['so I think', 'it works', 'so I think'])
+        self.assertEqual([c.start for c in cues], [0.0, 2.01, 4.01])
+
+    def test_repeated_speech_is_kept(self):
+        cues = list(iter_vtt_cues(MANUAL))
+        self.assertEqual([c.text for c in cues], ['No.', 'No.', 'No. No. I said no.'])
+
+    def test_bytes_input(self):
+        self.assertEqual(list(iter_vtt_cues(MANUAL.encode('utf-8'))), list(iter_vtt_cues(MANUAL)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+worker.is_transient_error: which failures are re-queued with backoff and which are marked 'error' at once.
+
+    python -m pytest test_worker_errors.py      # or: python test_worker_errors.py
+"""
+import json
+import unittest
+import httpx
+from google.genai import errors as genai_errors
+from postgrest.exceptions import APIError
+from worker import is_transient_error, TranscriptUnavailable, AnalysisFailed
+from key_pool import NoKeyAvailable
+from youtube_limiter import YouTubeBlocked
+
+def genai_error(cls, code, status):
+    return cls(code, {'error': {'code': code, 'status': status, 'message': status}})
+
+def postgrest_error(code):
+    return APIError({'message': 'failed', 'code': code, 'hint': None, 'details': None})
+
+class TransientErrorTest(unittest.TestCase):
+    def test_transient(self):
+        for e in [
+            TimeoutError("timed out"),
+            ConnectionError("reset"),
+            json.JSONDecodeError("Expecting value", "", 0),
+            NoKeyAvailable("No API key available within 900s"),
+            YouTubeBlocked("429 Too Many Requests"),
+            TranscriptUnavailable("VTT download failed"),
+            AnalysisFailed("empty response"),
+            httpx.ConnectError("connection refused"),
+            httpx.ReadTimeout("read timed out"),
+            genai_error(genai_errors.ClientError, 429, 'RESOURCE_EXHAUSTED'),
+            genai_error(genai_errors.ServerError, 500, 'INTERNAL'),
+            genai_error(genai_errors.ServerError, 503, 'UNAVAILABLE'),
+            genai_error(genai_errors.ServerError, 504, 'DEADLINE_EXCEEDED'),
+            postgrest_error('40001'),
+            postgrest_error('57014'),
+            postgrest_error('08006'),
+            postgrest_error('503'),
+        ]:
+            with self.subTest(e=repr(e)):
+                self.assertTrue(is_transient_error(e))
+
+    def test_permanent(self):
+        for e in [
+            Exception("No CC found"),
+            ValueError("bad transcript"),
+            genai_error(genai_errors.ClientError, 400, 'INVALID_ARGUMENT'),
+            genai_error(genai_errors.ClientError, 403, 'PERMISSION_DENIED'),
+            postgrest_error('23505'),
+            postgrest_error('42P01'),
+            postgrest_error('406'),
+        ]:
+            with self.subTest(e=repr(e)):
+                self.assertFalse(is_transient_error(e))
+
+    def test_status_text_in_the_message_is_not_enough(self):
+        # Only the status code / error type counts, not digits that happen to be in the text
+        self.assertFalse(is_transient_error(Exception("500 INTERNAL")))
+        self.assertFalse(is_transient_error(ValueError("video 503 of 504 has no captions")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+逐字稿時間索引：每份逐字稿建一次「相鄰兩字 (bigram) -> 字的位置」倒排索引，
+任意例句或句型都能在本機以模糊比對找出最吻合的位置與秒數，不必讓 Gemini 回傳 timestamp。
+"""
+import re
+from collections import Counter, defaultdict
+from lemmas import word_key
+from transcript_compact import iter_segments
+
+# Share of the query's bigrams that must be found in one place
+MIN_MATCH_SCORE = 0.35
+# Inserted / dropped words tolerated between matches (fillers, paraphrase)
+SLACK = 3
+# Bigrams this common ("you know", "of the") carry no position information
+MAX_POSTINGS = 200
+# Speaking rate used to spread a segment's words over time (compacted segments span several seconds)
+WORDS_PER_SECOND = 2.5
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+# Placeholders in a pattern structure: "It is ... that ~", "(someone)", "[verb]", "A / B"
+_PLACEHOLDER_RE = re.compile(r"\.{2,}|…|~|\([^)]*\)|\[[^\]]*\]|<[^>]*>|/|\bsb\b|\bsth\b|\bsomeone\b|\bsomething\b|\bV-ing\b")
+
+def _keys(text):
+    return [word_key(token) for token in _WORD_RE.findall(text.lower().replace('’', "'"))]
+
+class TimeIndex:
+    def __init__(self, text_with_timestamps):
+        self.times = []
+        keys = []
+        segments = [(sec, _keys(body)) for sec, body in iter_segments(text_with_timestamps)]
+        for i, (sec, words) in enumerate(segments):
+            # Words within a segment are spread up to the next segment's start
+            span = len(words) / WORDS_PER_SECOND
+            if i + 1 < len(segments):
+                span = min(span, max(segments[i + 1][0] - sec, 0))
+            step = span / len(words) if words else 0
+            for j, key in enumerate(words):
+                keys.append(key)
+                self.times.append(sec + int(j * step))
+        self._postings = defaultdict(list)
+        for i in range(len(keys) - 1):
+            self._postings[(keys[i], keys[i + 1])].append(i)
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, text, min_score=MIN_MATCH_SCORE):
+        """
+        (秒數, 分數) of the place where `text` matches best, or None.
+        Each query bigram votes for the start position it implies; votes within SLACK words are pooled.
+        """
+        query = _keys(text)
+        votes = Counter()
+        used = 0
+        for j in range(len(query) - 1):
+            postings = self._postings.get((query[j], query[j + 1]))
+            if postings is not None and len(postings) > MAX_POSTINGS:
+                continue
+            used += 1
+            for position in postings or ():
+                votes[position - j] += 1
+        if not votes:
+            return None
+
+        best_start, best = None, 0
+        for start in votes:
+            pooled = sum(votes.get(start + d, 0) for d in range(-SLACK, SLACK + 1))
+            if pooled > best or (pooled == best and start < best_start):
+                best_start, best = start, pooled
+        score = min(best / used, 1.0)
+        if score < min_score:
+            return None
+        first = min(s for s in range(best_start - SLACK, best_start + SLACK + 1) if s in votes)
+        return self.times[min(max(first, 0), len(self.times) - 1)], round(score, 2)
+
+    def locate_pattern(self, pattern):
+        """
+        Seconds for a sentence pattern: its example sentence first, then the literal parts of its structure
+        (the longest fragment between placeholders). None when neither is found.
+        """
+        match = None
+        example = pattern.get('example')
+        if isinstance(example, str):
+            match = self.locate(example)
+        structure = pattern.get('structure')
+        if match is None and isinstance(structure, str):
+            fragments = sorted((f for f in _PLACEHOLDER_RE.split(structure) if len(_keys(f)) >= 2),
+                               key=lambda f: -len(_keys(f)))
+            for fragment in fragments[:2]:
+                match = self.locate(fragment)
+                if match:
+                    break
+        return match[0] if match else None
+
+def align_patterns(patterns, index, keep_existing=False):
+    """
+    Set each pattern's timestamp from the index. Unmatched patterns lose their timestamp (the web app
+    then shows no seek link) unless keep_existing is set. Returns the number of patterns matched.
+    """
+    matched = 0
+    for pattern in patterns:
+        if not isinstance(pattern, dict):
+            continue
+        seconds = index.locate_pattern(pattern)
+        if seconds is not None:
+            pattern['timestamp'] = int(seconds)
+            matched += 1
+        elif not keep_existing:
+            pattern.pop('timestamp', None)
+    return matched
@@ -0,0 +1,122 @@
+import os
+import time
+import zlib
+import hashlib
+from local_store import CACHE_DIR, SQLiteStore
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "transcripts.sqlite3")
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # compressed size cap
+TTL_SECONDS = 30 * 24 * 3600
+
+# Same preference order as fetch_transcript_final: manual English -> auto English -> anything
+PREFERRED_LANGUAGES = ['en', 'en-US', 'en-GB']
+
+def track_rank(language, is_generated):
+    """Sort key for caption tracks: English before others, manual before auto, then PREFERRED_LANGUAGES order."""
+    lang_rank = PREFERRED_LANGUAGES.index(language) if language in PREFERRED_LANGUAGES else len(PREFERRED_LANGUAGES)
+    is_english = lang_rank < len(PREFERRED_LANGUAGES) or language.startswith('en')
+    return (not is_english, bool(is_generated), lang_rank)
+
+class TranscriptCache(SQLiteStore):
+    """
+    字幕快取：內容以 sha256 定址 (相同內容只存一份，zlib 壓縮)，
+    索引鍵為 (video_id, 語言, 手動/自動字幕)。超過容量時依最近使用時間 (LRU) 淘汰，
+    超過 TTL 的項目視為過期。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tracks (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            is_generated INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (video_id, language, is_generated)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tracks_accessed ON tracks(accessed_at);
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_CACHE_BYTES, ttl_seconds=TTL_SECONDS):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _rank(row):
+        return track_rank(row['language'], row['is_generated'])
+
+    def get(self, video_id, language=None, is_generated=None):
+        """
+        回傳 (text, {'language', 'is_generated'})；未指定字幕軌時挑選最佳的一軌。找不到回傳 None。
+        """
+        now = time.time()
+        sql = "SELECT * FROM tracks WHERE video_id = ? AND created_at > ?"
+        params = [video_id, now - self.ttl_seconds]
+        if language is not None:
+            sql += " AND language = ?"
+            params.append(language)
+        if is_generated is not None:
+            sql += " AND is_generated = ?"
+            params.append(int(is_generated))
+        rows = self.conn.execute(sql, params).fetchall()
+        if not rows:
+            return None
+
+        best = min(rows, key=self._rank)
+        blob = self.conn.execute("SELECT data FROM blobs WHERE content_hash = ?", (best['content_hash'],)).fetchone()
+        if blob is None:
+            return None
+        self.conn.execute(
+            "UPDATE tracks SET accessed_at = ? WHERE video_id = ? AND language = ? AND is_generated = ?",
+            (now, video_id, best['language'], best['is_generated']))
+        track = {'language': best['language'], 'is_generated': bool(best['is_generated'])}
+        return zlib.decompress(blob['data']).decode('utf-8'), track
+
+    def put(self, video_id, text, language='en', is_generated=False):
+        raw = text.encode('utf-8')
+        content_hash = hashlib.sha256(raw).hexdigest()
+        data = zlib.compress(raw, 6)
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (content_hash, data, size) VALUES (?, ?, ?)",
+                (content_hash, data, len(data)))
+            conn.execute(
+                "INSERT OR REPLACE INTO tracks (video_id, language, is_generated, content_hash, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, language or 'und', int(bool(is_generated)), content_hash, now, now))
+            self._evict(conn, now)
+        return content_hash
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM tracks WHERE created_at <= ?", (now - self.ttl_seconds,))
+        conn.execute("DELETE FROM blobs WHERE content_hash NOT IN (SELECT content_hash FROM tracks)")
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently used first
+        for row in conn.execute(
+                "SELECT t.video_id, t.language, t.is_generated, t.content_hash FROM tracks t "
+                "ORDER BY t.accessed_at").fetchall():
+            conn.execute(
+                "DELETE FROM tracks WHERE video_id = ? AND language = ? AND is_generated = ?",
+                (row['video_id'], row['language'], row['is_generated']))
+            still_used = conn.execute(
+                "SELECT 1 FROM tracks WHERE content_hash = ? LIMIT 1", (row['content_hash'],)).fetchone()
+            if not still_used:
+                size = conn.execute(
+                    "SELECT size FROM blobs WHERE content_hash = ?", (row['content_hash'],)).fetchone()
+                conn.execute("DELETE FROM blobs WHERE content_hash = ?", (row['content_hash'],))
+                total -= size[0] if size else 0
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        tracks = self.conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+        blobs, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {'tracks': tracks, 'blobs': blobs, 'bytes': size}
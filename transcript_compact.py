@@ -0,0 +1,152 @@
+import re
+
+# A segment is closed at sentence punctuation, at a pause between fragments
+# (measured start to start, the transcript has no end times), or once it gets
+# this long (auto-captions have no punctuation at all).
+MAX_SEGMENT_CHARS = 240
+MAX_GAP_SECONDS = 8
+# Overlap between the end of a segment and the start of the next fragment (in words)
+MAX_OVERLAP_WORDS = 8
+
+# Pure fillers and sound tags carry nothing for vocabulary / pattern extraction.
+# Only listed tags are removed: other brackets / parentheses are real speech ("(which is rare)").
+SOUND_TAGS = ('music', 'applause', 'laughter', 'laughs', 'laughing', 'cheering', 'cheers', 'inaudible',
+              'crosstalk', 'silence', 'no audio', 'foreign', 'background noise', 'noise', 'sighs', 'coughs',
+              'clears throat', 'bleep', 'beep')
+# Words that auto-captions repeat when the speaker stutters ("I I think", "the the"); a doubled word
+# outside this list can be correct English ("had had", "that that") and is kept
+STUTTER_WORDS = ('i', "i'm", 'the', 'a', 'an', 'and', 'to', 'we', 'you', 'it', "it's", 'they', 'he', 'she',
+                 'my', 'of')
+
+def _alternatives(words):
+    return '|'.join(re.escape(w).replace(r'\ ', r'\s+') for w in sorted(words, key=len, reverse=True))
+
+_FILLER_RE = re.compile(
+    rf'[\[(]\s*(?:{_alternatives(SOUND_TAGS)})\s*[\])]|>>|♪+|'
+    rf'\b(?:u+m+|u+h+m*|e+r+m+|h+m+|m+h*m+|a+h+)\b[,.]?',   # um, uhm, erm, hmm, mhm, ah (any length)
+    re.IGNORECASE)
+_REPEAT_WORD_RE = re.compile(rf"\b({_alternatives(STUTTER_WORDS)})(?![\w'])(?:\s+\1(?![\w']))+", re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s{2,}')
+_SENTENCE_END = ('.', '?', '!', '."', '?"', '!"')
+
+def parse_timestamped(text):
+    """「秒數|文字」 -> [(秒數, 文字)]；沒有時間戳的行沿用上一行的秒數。"""
+    fragments = []
+    last_sec = 0
+    for line in text.splitlines():
+        sec, sep, body = line.partition('|')
+        if sep and sec.strip().isdigit():
+            last_sec = int(sec)
+        else:
+            body = line
+        body = body.strip()
+        if body:
+            fragments.append((last_sec, body))
+    return fragments
+
+def iter_segments(source):
+    """「秒數|文字」字串或已解析的 (秒數, 文字) 序列 (例如 transcript_store.BinaryTranscript) -> (秒數, 文字)。"""
+    return parse_timestamped(source) if isinstance(source, str) else source
+
+def _clean_fragment(text):
+    text = _FILLER_RE.sub(' ', text)
+    text = _REPEAT_WORD_RE.sub(r'\1', text)
+    text = _SPACE_RE.sub(' ', text).strip(' ,')
+    return text
+
+def _strip_overlap(previous_words, words):
+    """Drop the leading words of a fragment that repeat the end of the current segment."""
+    limit = min(MAX_OVERLAP_WORDS, len(previous_words), len(words))
+    prev_tail = [w.lower() for w in previous_words[-limit:]]
+    lowered = [w.lower() for w in words[:limit]]
+    for size in range(limit, 0, -1):
+        if prev_tail[-size:] == lowered[:size]:
+            return words[size:]
+    return words
+
+def compact_segments(fragments, max_chars=MAX_SEGMENT_CHARS, max_gap=MAX_GAP_SECONDS):
+    """
+    把零碎的字幕片段合併成句子等級的段落 (每段一個時間戳)，
+    並移除填充詞 (um, uh, [Music]...)、結巴重複的字 (I I、the the) 與緊接著重複的段落。
+    """
+    segments = []
+    start = None
+    words = []
+    seg_chars = 0
+    last_sec = None
+
+    def close():
+        if not words:
+            return
+        sentence = ' '.join(words)
+        # Only a copy right after the same sentence is a caption repeat; later ones are spoken again
+        if not segments or segments[-1][1].lower() != sentence.lower():
+            segments.append((start, sentence))
+
+    for sec, text in fragments:
+        text = _clean_fragment(text)
+        if not text:
+            continue
+        if words and last_sec is not None and sec - last_sec > max_gap:
+            close()
+            words, seg_chars = [], 0
+        new_words = text.split()
+        if words:
+            new_words = _strip_overlap(words, new_words)
+            if not new_words:
+                last_sec = sec
+                continue
+        else:
+            start = sec
+        words.extend(new_words)
+        seg_chars += sum(len(w) + 1 for w in new_words)
+        last_sec = sec
+        if words[-1].endswith(_SENTENCE_END) or seg_chars >= max_chars:
+            close()
+            words, seg_chars = [], 0
+
+    close()
+    return segments
+
+def compact_transcript(text, max_chars=MAX_SEGMENT_CHARS, max_gap=MAX_GAP_SECONDS):
+    """「秒數|文字」逐字稿 -> 壓縮後的「秒數|句子」逐字稿。"""
+    if not text:
+        return text
+    segments = compact_segments(parse_timestamped(text), max_chars, max_gap)
+    return "\n".join(f"{sec}|{sentence}" for sec, sentence in segments)
+
+def strip_timestamps(text):
+    """「秒數|文字」 -> 只有文字的行 (時間點改由 time_index 在本機比對)。"""
+    return "\n".join(body for _, body in parse_timestamped(text)) if text else text
+
+def transcript_duration(text):
+    """Last timestamp (seconds) of a 「秒數|文字」 transcript, or None if it has none."""
+    if not text:
+        return None
+    last_line = text.rstrip().rpartition('\n')[2]
+    sec, sep, _ = last_line.partition('|')
+    return int(sec) if sep and sec.strip().isdigit() else None
+
+def estimate_tokens(text):
+    """Rough Gemini token estimate for English / mixed text (about 4 chars per token)."""
+    return (len(text) + 3) // 4
+
+def sample_passages(text, max_chars, passages=8):
+    """
+    Evenly spaced runs of consecutive 「秒數|文字」 lines totalling about max_chars
+    (the text is returned unchanged when it already fits).
+    """
+    if not text or len(text) <= max_chars:
+        return text
+    lines = text.splitlines()
+    group = max(-(-len(lines) // passages), 1)
+    budget = max_chars // passages
+    picked = []
+    for start in range(0, len(lines), group):
+        chars = 0
+        for line in lines[start:start + group]:
+            if chars and chars + len(line) + 1 > budget:
+                break
+            picked.append(line)
+            chars += len(line) + 1
+    return "\n".join(picked)
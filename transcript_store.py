@@ -0,0 +1,211 @@
+"""
+逐字稿的精簡二進位格式 (每部影片一個 .trs 檔，存在 CACHE_DIR/transcripts/，和字幕快取相同的 TTL 與容量上限)：
+
+    header   <4sHHII  b'TRS1', version, flags, segment count n, text bytes
+    starts   n × uint32       每段的開始時間 (毫秒，遞增)
+    offsets  (n + 1) × uint32 每段文字在 blob 中的位元組位置
+    blob     UTF-8 文字 (各段直接相連，沒有分隔字元)
+
+以 mmap 開啟，starts / offsets 是直接 cast 的 memoryview，依時間切片 (bisect) 與逐段讀取都不複製整份文字；
+只有真正用到的段落才會 decode 成 str。
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+from local_store import CACHE_DIR
+from transcript_cache import TTL_SECONDS
+from transcript_compact import parse_timestamped
+
+DEFAULT_DIR = os.path.join(CACHE_DIR, "transcripts")
+# Oldest files (by modification time) are removed beyond this size
+MAX_STORE_BYTES = 200 * 1024 * 1024
+MAGIC = b'TRS1'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+_SAFE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+def encode(segments):
+    """(開始秒數, 文字) 序列 -> .trs bytes。秒數可以是小數 (YTA / VTT 的原始時間)，會存成毫秒。"""
+    starts, offsets = array('I'), array('I', [0])
+    parts = []
+    size = 0
+    previous = 0
+    for start, text in segments:
+        data = text.replace('\n', ' ').encode('utf-8')
+        # Kept non-decreasing so that time lookups can bisect
+        previous = max(previous, int(round(start * 1000)))
+        starts.append(previous)
+        size += len(data)
+        offsets.append(size)
+        parts.append(data)
+    return b''.join([HEADER.pack(MAGIC, VERSION, 0, len(starts), size),
+                     _little_endian(starts).tobytes(), _little_endian(offsets).tobytes(), *parts])
+
+def encode_text(text_with_timestamps):
+    return encode(parse_timestamped(text_with_timestamps))
+
+class BinaryTranscript:
+    """
+    .trs 內容的唯讀檢視 (buffer 可以是 mmap 或 bytes)。可迭代出 (秒數, 文字)，
+    和 transcript_compact.parse_timestamped 的結果相同，可直接交給 split_windows / TimeIndex / vocab_rank。
+    between() 回傳同一個 buffer 上的時間區間檢視。
+    """
+    def __init__(self, buffer, _mmap=None):
+        view = memoryview(buffer)
+        magic, version, _, count, text_bytes = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a TRS1 transcript")
+        pos = HEADER.size
+        starts, offsets = view[pos:pos + 4 * count], view[pos + 4 * count:pos + 8 * count + 4]
+        if sys.byteorder == 'little':
+            self.starts_ms, self.offsets = starts.cast('I'), offsets.cast('I')
+        else:
+            # Big-endian hosts pay for one copy of the (small) arrays, never of the text
+            self.starts_ms = _little_endian(array('I', starts.tobytes()))
+            self.offsets = _little_endian(array('I', offsets.tobytes()))
+        self.blob = view[pos + 8 * count + 4:pos + 8 * count + 4 + text_bytes]
+        self._mmap = _mmap
+        self._lo, self._hi = 0, count
+
+    def _view(self, lo, hi):
+        view = object.__new__(BinaryTranscript)
+        view.__dict__.update(self.__dict__)
+        view._lo, view._hi = lo, hi
+        return view
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __iter__(self):
+        starts, offsets, blob = self.starts_ms, self.offsets, self.blob
+        for i in range(self._lo, self._hi):
+            yield starts[i] // 1000, str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    @property
+    def nbytes(self):
+        """Size of the text in this view, in UTF-8 bytes."""
+        return self.offsets[self._hi] - self.offsets[self._lo]
+
+    def text_bytes(self):
+        """The UTF-8 text of this view (a memoryview, no copy)."""
+        return self.blob[self.offsets[self._lo]:self.offsets[self._hi]]
+
+    def duration(self):
+        """Start of the last segment in seconds (like transcript_compact.transcript_duration)."""
+        return self.starts_ms[self._hi - 1] // 1000 if len(self) else None
+
+    def between(self, start_seconds, end_seconds):
+        """Segments starting in [start, end) seconds, as a view on the same buffer."""
+        lo = max(bisect_left(self.starts_ms, int(start_seconds * 1000), self._lo, self._hi), self._lo)
+        hi = bisect_left(self.starts_ms, int(end_seconds * 1000), lo, self._hi)
+        return self._view(lo, hi)
+
+    def windows(self, seconds):
+        """Consecutive views of `seconds` each, covering every segment."""
+        if not len(self):
+            return
+        t = self.starts_ms[self._lo] // 1000
+        end = self.duration()
+        while t <= end:
+            window = self.between(t, t + seconds)
+            if len(window):
+                yield window
+            t += seconds
+
+    def to_text(self):
+        """「秒數|文字」 string for prompts and the string-based helpers (this one does copy)."""
+        return "\n".join(f"{sec}|{text}" for sec, text in self)
+
+    def close(self):
+        """Unmap the file. Views from between() / windows() share the buffers and become unusable too."""
+        if self._mmap is None:
+            return
+        for buffer in (self.starts_ms, self.offsets, self.blob):
+            if isinstance(buffer, memoryview):
+                buffer.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass   # a text_bytes() view is still alive; the mapping goes when it is collected
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class TranscriptStore:
+    """
+    每部影片一個 .trs 檔。寫入時先寫暫存檔再 os.replace (讀取中的行程不會看到寫了一半的檔案)，
+    超過 ttl_seconds 的檔案視為過期，超過 max_bytes 時刪除最舊的檔案。
+    """
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=MAX_STORE_BYTES, ttl_seconds=TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    def path(self, video_id):
+        name = video_id if _SAFE_ID_RE.match(video_id) else hashlib.sha256(video_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.trs")
+
+    def put(self, video_id, segments):
+        """segments: (秒數, 文字) 序列或「秒數|文字」字串。回傳寫入的位元組數。"""
+        data = encode_text(segments) if isinstance(segments, str) else encode(segments)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(video_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.prune()
+        return len(data)
+
+    def open(self, video_id):
+        """BinaryTranscript backed by an mmap of the file, or None if the video is not stored (or expired)."""
+        try:
+            f = open(self.path(video_id), 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_mtime < time.time() - self.ttl_seconds:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return BinaryTranscript(mapped, _mmap=mapped)
+        except Exception:
+            mapped.close()
+            raise
+
+    def __contains__(self, video_id):
+        return os.path.exists(self.path(video_id))
+
+    def prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.trs')]
+        except FileNotFoundError:
+            return 0
+        stats = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries), reverse=True)
+        expired = time.time() - self.ttl_seconds
+        total, removed = 0, 0
+        for mtime, size, path in stats:
+            total += size
+            if total > self.max_bytes or mtime < expired:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass   # e.g. still mapped by another process on Windows
+        return removed
@@ -1,8 +1,8 @@
 import os
-import json
 from supabase import create_client, Client
 
 from dotenv import load_dotenv
+from bulk_loader import BulkLoader, iter_records
 
 load_dotenv()
 
@@ -28,33 +28,26 @@ def main():
     if not os.path.exists('learning_data.json'):
         print("learning_data.json not found!")
         return
-        
-    with open('learning_data.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        
-    print(f"Found {len(data)} items to upload.")
-    
-    for item in data:
-        record = {
-            "video_id": item.get('video_id'),
-            "url": item.get('url'),
-            "category": item.get('category'), # Array
-            "vocabulary": item.get('vocabulary'), # JSONB
-            "sentence_patterns": item.get('sentence_patterns'), # JSONB
-        }
-        
-        print(f"Uploading {item.get('video_id')}...", end="")
-        try:
-            # Upsert using video_id as key
-            response = supabase.table(TABLE_NAME).upsert(record).execute()
-            print(" Done.")
-        except Exception as e:
-            print(f" Error: {e}")
-            if "relation" in str(e) and "does not exist" in str(e):
-                print(f"\n❌ CRITICAL: Table '{TABLE_NAME}' does not exist.")
-                print("Please create it in your Supabase SQL Editor with this command:")
-                print("-" * 40)
-                print("""
+
+    def records():
+        for item in iter_records('learning_data.json'):
+            yield {
+                "video_id": item.get('video_id'),
+                "url": item.get('url'),
+                "category": item.get('category'), # Array
+                "vocabulary": item.get('vocabulary'), # JSONB
+                "sentence_patterns": item.get('sentence_patterns'), # JSONB
+            }
+
+    # Upsert using video_id as key, in batches
+    loader = BulkLoader(supabase, TABLE_NAME, on_conflict='video_id')
+    loader.load(records())
+
+    if any("relation" in error and "does not exist" in error for _, error in loader.failed):
+        print(f"\n❌ CRITICAL: Table '{TABLE_NAME}' does not exist.")
+        print("Please create it in your Supabase SQL Editor with this command:")
+        print("-" * 40)
+        print("""
 CREATE TABLE english_videos (
     video_id TEXT PRIMARY KEY,
     url TEXT,
@@ -63,9 +56,8 @@ CREATE TABLE english_videos (
     sentence_patterns JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
 );
-                """)
-                print("-" * 40)
-                return
+        """)
+        print("-" * 40)
 
 if __name__ == "__main__":
     main()
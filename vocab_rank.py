@@ -0,0 +1,185 @@
+"""
+本機單字候選排序 (送出 prompt 前的預處理，不呼叫 Gemini)：
+斷詞後以 cefr_words.txt 查 CEFR 等級 (先查原字；清單中沒有時才以 lemmas 的 stem 找原形，
+例如 making -> make)，並用 NumPy 一次算出每個字的出現次數與在影片時間軸上的分佈平均度 (Juilland's D)，
+回傳附時間戳的候選清單。
+Gemini 只需從清單中挑字，不必再自己讀完整份逐字稿篩選。
+"""
+import os
+import re
+import math
+from functools import lru_cache
+import numpy as np
+from lemmas import word_key
+from transcript_compact import iter_segments
+
+WORDLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cefr_words.txt")
+LEVELS = ('A1', 'A2', 'B1', 'B2', 'C1')
+# How useful a word of each level is for the learners (Oxford 3000 / CEFR B1-B2 first).
+# A1 / A2 words are known already; off-list words are mostly names, slang or rare words.
+LEVEL_WEIGHTS = {'A1': 0.0, 'A2': 0.15, 'B1': 1.0, 'B2': 1.0, 'C1': 0.8}
+OFF_LIST_WEIGHT = 0.3
+OFF_LIST = len(LEVELS)
+# The timeline is cut into this many equal parts for the dispersion measure
+DISPERSION_BINS = 10
+MIN_WORD_LENGTH = 3
+# Timestamps shown per candidate (spread over its occurrences)
+TIMESTAMPS_PER_WORD = 3
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+@lru_cache(maxsize=1)
+def load_wordlist(path=WORDLIST_PATH):
+    """
+    cefr_words.txt -> ({word: level index}, {stem: [words]})；同一個字取最低的等級。
+    stem (lemmas.word_key) 只是備用的查詢鍵：care / car、note / not 共用同一個 stem。
+    """
+    levels, stems = {}, {}
+    level = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                level = LEVELS.index(line[1:-1])
+                continue
+            for word in line.split():
+                if word not in levels:
+                    levels[word] = level
+                    stems.setdefault(word_key(word), []).append(word)
+    return levels, stems
+
+_SUFFIXES = ('s', 'es', 'd', 'ed', 'ing', 'er', 'est')
+_VOWEL_SUFFIXES = ('ed', 'ing', 'er', 'est')
+
+def _inflects(surface, word):
+    """Whether surface is a regular inflection of word (cars / car, caring / care, planning / plan)."""
+    rules = [(word, _SUFFIXES), (word + word[-1], _VOWEL_SUFFIXES)]
+    if word.endswith('e'):
+        rules.append((word[:-1], _VOWEL_SUFFIXES))
+    if word.endswith('y'):
+        rules.append((word[:-1] + 'i', ('es', 'ed', 'er', 'est')))
+    return any(surface.startswith(stem) and surface[len(stem):] in suffixes for stem, suffixes in rules)
+
+def _common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+def base_form(surface, levels, stems):
+    """
+    清單中的原形：原字在清單中就是它自己 (note、better)；否則以 stem 找 (notes -> note、making -> make)，
+    同一個 stem 有多個字時優先取規則變化對得上的 (cars -> car、planning -> plan)，再取共同字首最長的。
+    都找不到回傳 None。
+    """
+    if surface in levels:
+        return surface
+    words = stems.get(word_key(surface))
+    if not words:
+        return None
+    return max(words, key=lambda word: (_inflects(surface, word), _common_prefix(surface, word), len(word)))
+
+def _tokenize(text_with_timestamps):
+    """-> (surface form per token id, lemma per surface id, surface ids, token times)"""
+    surface_ids = {}
+    ids, times = [], []
+    for sec, body in iter_segments(text_with_timestamps):
+        for token in _WORD_RE.findall(body.lower().replace('’', "'")):
+            sid = surface_ids.get(token)
+            if sid is None:
+                sid = surface_ids[token] = len(surface_ids)
+            ids.append(sid)
+            times.append(sec)
+    surfaces = list(surface_ids)
+    return surfaces, np.array(ids, dtype=np.int64), np.array(times, dtype=np.float64)
+
+def _dispersion(lemma_ids, times, n_lemmas, bins=DISPERSION_BINS):
+    """Juilland's D per lemma over equal time slices: 1 = evenly spread, 0 = all in one slice."""
+    duration = times.max() if len(times) else 0
+    if duration <= 0:
+        return np.ones(n_lemmas)
+    slices = np.minimum((times / duration * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(lemma_ids * bins + slices, minlength=n_lemmas * bins).reshape(n_lemmas, bins)
+    sizes = np.bincount(slices, minlength=bins)
+    used = sizes > 0
+    k = int(used.sum())
+    if k < 2:
+        return np.ones(n_lemmas)
+    relative = counts[:, used] / sizes[used]
+    mean = relative.mean(axis=1)
+    cv = np.divide(relative.std(axis=1), mean, out=np.zeros(n_lemmas), where=mean > 0)
+    return np.clip(1 - cv / math.sqrt(k - 1), 0, 1)
+
+def _spread_timestamps(sorted_times, count=TIMESTAMPS_PER_WORD):
+    if len(sorted_times) <= count:
+        return [int(t) for t in sorted_times]
+    picks = np.unique(np.linspace(0, len(sorted_times) - 1, count).round().astype(np.int64))
+    return [int(t) for t in sorted_times[picks]]
+
+def rank_candidates(text_with_timestamps, limit=45):
+    """
+    「秒數|文字」逐字稿 -> 依分數排序的候選單字
+    [{'word', 'lemma', 'level', 'count', 'dispersion', 'score', 'timestamps'}]。
+    分數 = 等級權重 × (1 + ln 次數) × (0.4 + 0.6 × 分佈平均度)。
+    """
+    levels, stems = load_wordlist()
+    surfaces, surface_ids, times = _tokenize(text_with_timestamps)
+    if not surfaces:
+        return []
+
+    # Surface forms -> list words (exact first, then by stem), or stems for off-list words;
+    # once per distinct form, not per token
+    lemma_index = {}
+    surface_lemma = np.empty(len(surfaces), dtype=np.int64)
+    for sid, surface in enumerate(surfaces):
+        key = base_form(surface, levels, stems) or word_key(surface)
+        surface_lemma[sid] = lemma_index.setdefault(key, len(lemma_index))
+    lemmas = list(lemma_index)
+    n = len(lemmas)
+    lemma_ids = surface_lemma[surface_ids]
+
+    level = np.array([levels.get(key, OFF_LIST) for key in lemmas], dtype=np.int64)
+    weights = np.array([LEVEL_WEIGHTS[name] for name in LEVELS] + [OFF_LIST_WEIGHT])[level]
+    # Fragments ("s", "ll"), contractions and very short off-list tokens are never candidates
+    eligible = np.array([len(key) >= MIN_WORD_LENGTH and "'" not in key for key in lemmas])
+    counts = np.bincount(lemma_ids, minlength=n)
+    dispersion = _dispersion(lemma_ids, times, n)
+    scores = np.where(eligible, weights * (1 + np.log(np.maximum(counts, 1))) * (0.4 + 0.6 * dispersion), 0.0)
+
+    top = np.argsort(-scores, kind='stable')[:limit]
+    top = top[scores[top] > 0]
+    if not len(top):
+        return []
+
+    # Occurrence times of each top lemma, via one stable sort of all tokens
+    order = np.argsort(lemma_ids, kind='stable')
+    starts = np.searchsorted(lemma_ids[order], top)
+    surface_counts = np.bincount(surface_ids, minlength=len(surfaces))
+    candidates = []
+    for lemma_id, start in zip(top.tolist(), starts.tolist()):
+        key = lemmas[lemma_id]
+        count = int(counts[lemma_id])
+        word = key if key in levels else None
+        if word is None:
+            forms = np.flatnonzero(surface_lemma == lemma_id)
+            word = surfaces[int(forms[np.argmax(surface_counts[forms])])]
+        candidates.append({
+            'word': word,
+            'lemma': key,
+            'level': LEVELS[level[lemma_id]] if level[lemma_id] < OFF_LIST else None,
+            'count': count,
+            'dispersion': round(float(dispersion[lemma_id]), 2),
+            'score': round(float(scores[lemma_id]), 3),
+            'timestamps': _spread_timestamps(np.sort(times[order[start:start + count]])),
+        })
+    return candidates
+
+def format_candidates(candidates):
+    """Prompt lines: 'deliberate (B2, 4x, 35/410/1210s)'."""
+    return "\n".join(
+        f"{c['word']} ({c['level'] or '-'}, {c['count']}x, {'/'.join(map(str, c['timestamps']))}s)"
+        for c in candidates)
@@ -0,0 +1,125 @@
+import re
+import html
+from collections import namedtuple
+
+# One caption cue after cleaning: start/end in seconds, text without tags
+Cue = namedtuple('Cue', ['start', 'end', 'text'])
+
+# 00:00:01.500 --> 00:00:03.000 (hours are optional in WebVTT)
+_TIMING_RE = re.compile(
+    r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})\s*-->\s*(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})')
+# <c.colorE6E6E6>, </c>, <00:00:01.120> karaoke timestamps, <i>, ...
+_TAG_RE = re.compile(r'<[^>]*>')
+_SPACE_RE = re.compile(r'\s{2,}')
+
+# YouTube auto-captions ("rolling" layout) start each cue with the last line(s) of the previous cue,
+# and show the new line alone again in a ~10 ms transition cue. A cue that only repeats the previous
+# one is dropped when it is this short; a longer one is real repeated speech and is kept.
+ROLLING_TRANSITION_SECONDS = 0.05
+
+def _seconds(h, m, s, ms):
+    return (int(h) * 3600 if h else 0) + int(m) * 60 + int(s) + int(ms) / 1000
+
+def _parse_timing(line):
+    # Fast path for the fixed-width form YouTube always emits: "HH:MM:SS.mmm --> HH:MM:SS.mmm"
+    if line[2:3] == ':' and line[13:16] == '-->' and line[19:20] == ':':
+        try:
+            return (int(line[0:2]) * 3600 + int(line[3:5]) * 60 + float(line[6:12]),
+                    int(line[17:19]) * 3600 + int(line[20:22]) * 60 + float(line[23:29]))
+        except ValueError:
+            pass
+    match = _TIMING_RE.search(line)
+    if not match:
+        return None
+    g = match.groups()
+    return _seconds(*g[:4]), _seconds(*g[4:])
+
+def _iter_lines(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = bytes(source).decode('utf-8-sig')
+    if isinstance(source, str):
+        return source.splitlines()
+    # File object / iterable of lines (text or binary)
+    return (line.decode('utf-8') if isinstance(line, bytes) else line for line in source)
+
+def _overlap(previous, lines):
+    """Number of leading lines of this cue that repeat the trailing lines of the previous cue."""
+    for k in range(min(len(previous), len(lines)), 0, -1):
+        if lines[:k] == previous[-k:]:
+            return k
+    return 0
+
+def _clean(line):
+    if '<' in line:
+        line = _TAG_RE.sub('', line)
+    if '&' in line:
+        line = html.unescape(line)
+    if '  ' in line:
+        line = _SPACE_RE.sub(' ', line)
+    return line.strip()
+
+def iter_vtt_cues(source):
+    """
+    單次掃描的 VTT 解析器：輸入可以是 str / bytes / 檔案串流，逐一產生 Cue(start, end, text)。
+    YouTube 自動字幕的「滾動」格式會在每個 cue 開頭重複上一個 cue 的最後幾行，這裡只去掉這段重疊，
+    真的重複說的話 (同一個 cue 裡的 "no. no."、正常長度的重複 cue) 會保留；同一個 cue 的多行文字合併成一筆。
+    """
+    previous = []      # cleaned lines of the previous cue, as displayed
+    timing = None      # (start, end) of the cue being read
+    lines = []         # cleaned text lines of that cue
+
+    def finish():
+        nonlocal previous
+        k = _overlap(previous, lines)
+        previous = lines
+        if k == len(lines) and timing[1] - timing[0] >= ROLLING_TRANSITION_SECONDS:
+            k = 0
+        if k < len(lines):
+            return Cue(timing[0], timing[1], ' '.join(lines[k:]))
+        return None
+
+    for raw in _iter_lines(source):
+        if timing is None:
+            # Header (WEBVTT, Kind:, Language:), cue identifiers, NOTE/STYLE/REGION blocks
+            if '-->' in raw:
+                timing = _parse_timing(raw.strip())
+            continue
+
+        line = raw.strip()
+        if not line:
+            # Only a truly empty line ends the cue (YouTube puts " " lines inside cues)
+            if raw.rstrip('\r\n'):
+                continue
+            if lines:
+                cue = finish()
+                if cue:
+                    yield cue
+                lines = []
+            timing = None
+            continue
+
+        if '-->' in line:
+            # Next cue started without a blank line in between
+            if lines:
+                cue = finish()
+                if cue:
+                    yield cue
+                lines = []
+            timing = _parse_timing(line)
+            continue
+
+        line = _clean(line)
+        if line:
+            lines.append(line)
+
+    if timing is not None and lines:
+        cue = finish()
+        if cue:
+            yield cue
+
+def format_timestamped(cues):
+    """Cue 序列 -> 舊有的「秒數|文字」格式 (每個 cue 一行)。"""
+    return "\n".join(f"{int(cue.start)}|{cue.text}" for cue in cues)
+
+def format_plain(cues):
+    return " ".join(cue.text for cue in cues)
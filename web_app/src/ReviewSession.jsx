@@ -1,8 +1,11 @@
 import { useEffect, useState } from 'react'
 import { Link, useNavigate } from 'react-router-dom'
 import { supabase } from './supabaseClient'
+import { nextReview } from './srsRules'
 import { ArrowLeft, RotateCcw, Trophy, CheckCircle, Loader2 } from 'lucide-react'
 
+const DECK_SIZE = 50
+
 const ReviewSession = () => {
     const navigate = useNavigate()
     const [loading, setLoading] = useState(true)
@@ -15,43 +18,80 @@ const ReviewSession = () => {
         fetchDueReviews()
     }, [])
 
+    // Joins progress rows with the word details stored in each video's vocabulary
+    const withDetails = async (progressItems) => {
+        if (!progressItems || progressItems.length === 0) return []
+
+        const videoIds = [...new Set(progressItems.map(item => item.video_id))]
+        const { data: videos, error: videosError } = await supabase
+            .from('en_videos')
+            .select('video_id, vocabulary')
+            .in('video_id', videoIds)
+
+        if (videosError) throw videosError
+
+        const deck = []
+        progressItems.forEach(item => {
+            const video = videos.find(v => v.video_id === item.video_id)
+            if (video && video.vocabulary) {
+                const vocabDetail = video.vocabulary.find(v => v.word === item.word)
+                if (vocabDetail) {
+                    deck.push({ ...item, details: vocabDetail })
+                }
+            }
+        })
+        return deck
+    }
+
+    const fetchDueProgress = async () => {
+        const { data: progressItems, error: progressError } = await supabase
+            .from('en_study_progress')
+            .select('*')
+            .lte('next_review_date', new Date().toISOString())
+            .order('next_review_date', { ascending: true })
+            .limit(DECK_SIZE)
+
+        if (progressError) throw progressError
+        return progressItems || []
+    }
+
     const fetchDueReviews = async () => {
         try {
             setLoading(true)
-            const { data: progressItems, error: progressError } = await supabase
-                .from('en_study_progress')
+            // Deck precomputed by srs_scheduler.py (one query, word details included)
+            const today = new Date().toISOString().slice(0, 10)
+            const { data: queued, error: queueError } = await supabase
+                .from('en_review_queue')
                 .select('*')
-                .lte('next_review_date', new Date().toISOString())
-                .order('next_review_date', { ascending: true })
-                .limit(50)
-
-            if (progressError) throw progressError
+                .lte('due_date', today)
+                .order('due_date', { ascending: true })
+                .order('position', { ascending: true })
+                .limit(DECK_SIZE)
 
-            if (!progressItems || progressItems.length === 0) {
-                setReviewQueue([])
-                setLoading(false)
+            if (queueError) {
+                // Queue tables not set up (setup_srs_queue.sql): grade directly on en_study_progress
+                setReviewQueue(await withDetails(await fetchDueProgress()))
                 return
             }
 
-            const videoIds = [...new Set(progressItems.map(item => item.video_id))]
-            const { data: videos, error: videosError } = await supabase
-                .from('en_videos')
-                .select('video_id, vocabulary')
-                .in('video_id', videoIds)
-
-            if (videosError) throw videosError
-
-            const deck = []
-            progressItems.forEach(item => {
-                const video = videos.find(v => v.video_id === item.video_id)
-                if (video && video.vocabulary) {
-                    const vocabDetail = video.vocabulary.find(v => v.word === item.word)
-                    if (vocabDetail) {
-                        deck.push({ ...item, details: vocabDetail })
-                    }
-                }
-            })
+            const deck = (queued || []).map(item => ({ ...item, id: item.progress_id, logged: true }))
+            if (deck.length < DECK_SIZE) {
+                // Words saved since the scheduler's last run are due but not queued yet. Cards graded since
+                // then are skipped (their progress row is not updated yet), unless the last grade was Again.
+                const { data: pending } = await supabase
+                    .from('en_review_log')
+                    .select('progress_id, quality')
+                    .is('applied_at', null)
+                    .order('id', { ascending: true })
+                const lastGrade = {}
+                for (const row of pending || []) lastGrade[row.progress_id] = row.quality
 
+                const inDeck = new Set(deck.map(item => item.id))
+                const missing = (await fetchDueProgress()).filter(item =>
+                    !inDeck.has(item.id) && !(item.id in lastGrade && lastGrade[item.id] !== 0))
+                const extra = await withDetails(missing.slice(0, DECK_SIZE - deck.length))
+                extra.forEach(item => deck.push({ ...item, progress_id: item.id, logged: true }))
+            }
             setReviewQueue(deck)
         } catch (error) {
             console.error('Error fetching reviews:', error)
@@ -63,18 +103,33 @@ const ReviewSession = () => {
     const updateSRS = async (e, quality) => {
         e.stopPropagation()
         const currentItem = reviewQueue[currentIndex]
-        let interval = 1
-        let status = 'review'
-        let nextStreak = (currentItem.streak || 0) + 1
+        setIsFlipped(false)
 
-        if (quality === 0) { interval = 0; status = 'learning'; nextStreak = 0; }
-        else if (quality === 3) { interval = Math.max(1, Math.floor(currentItem.interval * 1.2)); }
-        else if (quality === 4) { interval = Math.max(1, Math.floor((currentItem.interval || 1) * 2.5)); }
-        else if (quality === 5) { interval = Math.max(4, Math.floor((currentItem.interval || 1) * 3.5)); status = 'mastered'; }
+        if (currentItem.logged) {
+            // Applied in bulk by srs_scheduler.py. A graded card leaves today's queue right away; after
+            // Again it stays queued and comes back at the end of this session, as the card is due again.
+            try {
+                const { error: logError } = await supabase
+                    .from('en_review_log')
+                    .insert({ progress_id: currentItem.progress_id, quality: quality })
+                if (logError) throw logError
+                if (quality === 0) {
+                    setReviewQueue(prev => [...prev, currentItem])
+                } else {
+                    await supabase.from('en_review_queue').delete().eq('progress_id', currentItem.progress_id)
+                }
 
+                setSessionStats(prev => ({ ...prev, reviewed: prev.reviewed + 1 }))
+                setTimeout(() => setCurrentIndex(prev => prev + 1), 150)
+            } catch (err) {
+                console.error('Failed to log review', err)
+            }
+            return
+        }
+
+        const { interval, status, streak } = nextReview(currentItem, quality)
         const nextDate = new Date()
         nextDate.setDate(nextDate.getDate() + interval)
-        setIsFlipped(false)
 
         try {
             await supabase
@@ -82,7 +137,7 @@ const ReviewSession = () => {
                 .update({
                     status: status,
                     interval: interval,
-                    streak: nextStreak,
+                    streak: streak,
                     next_review_date: nextDate.toISOString(),
                     last_reviewed_at: new Date().toISOString()
                 })
@@ -674,7 +674,7 @@ const VideoList = () => {
                                 <div className="absolute bottom-0 left-0 w-full h-1 bg-slate-200">
                                     <div className={`h-full transition-all duration-1000 ${
                                         video.status === 'completed' ? 'w-full bg-emerald-500' : 
-                                        video.status === 'error' ? 'w-full bg-red-500' : 
+                                        (video.status === 'error' || video.status === 'dead') ? 'w-full bg-red-500' : 
                                         video.status === 'processing' ? 'w-2/3 bg-amber-600 animate-pulse' : 
                                         'w-1/3 bg-slate-400'
                                     }`}></div>
@@ -694,7 +694,7 @@ const VideoList = () => {
                                 <h3 className={`font-black text-slate-800 leading-tight mb-4 uppercase italic truncate group-hover:text-amber-700 transition-colors ${viewMode === 'list' ? 'text-md' : 'text-lg line-clamp-2'}`}>
                                     {video.status === 'completed' ? (video.title || `數據單元_${video.video_id}`) : 
                                      video.status === 'processing' ? '正在處理數據...' : 
-                                     video.status === 'error' ? '❌ 解析失敗 (點擊重試)' : '排隊中...'}
+                                     (video.status === 'error' || video.status === 'dead') ? '❌ 解析失敗 (點擊重試)' : '排隊中...'}
                                 </h3>
 
                                 <div className="flex flex-wrap gap-1.5 opacity-60 group-hover:opacity-100 transition-opacity">
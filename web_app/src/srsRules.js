@@ -0,0 +1,14 @@
+// Review intervals of the review deck. srs_scheduler.next_review applies the same rules in bulk;
+// test_srs_rules.py checks that both agree, so change them together.
+export const nextReview = (item, quality) => {
+    let interval = 1
+    let status = 'review'
+    let streak = (item.streak || 0) + 1
+
+    if (quality === 0) { interval = 0; status = 'learning'; streak = 0; }
+    else if (quality === 3) { interval = Math.max(1, Math.floor((item.interval || 0) * 1.2)); }
+    else if (quality === 4) { interval = Math.max(1, Math.floor((item.interval || 1) * 2.5)); }
+    else if (quality === 5) { interval = Math.max(4, Math.floor((item.interval || 1) * 3.5)); status = 'mastered'; }
+
+    return { interval, status, streak }
+}
@@ -1,191 +1,484 @@
+import os
 import time
 import traceback
 import json
 import sys
+import argparse
+import queue
+import threading
 from datetime import datetime, timedelta
-from study_ai import fetch_transcript_final, analyze_with_ai, rotate_key, supabase
+from study_ai import fetch_transcript, analyze_with_ai, key_pool, analysis_stats, youtube_limiter, transcript_fetcher, get_supabase, extract_video_info
+from transcript_compact import compact_transcript
+from task_queue import SupabaseTaskQueue, LeaseHeartbeat
+from queue_wakeup import AdaptiveBackoff, PollingWaker, create_waker
+from queue_probe import has_work
+from metrics import metrics
+from key_pool import NoKeyAvailable
+from youtube_limiter import YouTubeBlocked
 
 # Maximum time to run (e.g., 50 minutes to fit in an hourly cron)
-MAX_RUNTIME_SECONDS = 50 * 60 
+MAX_RUNTIME_SECONDS = 50 * 60
 START_TIME = datetime.now()
 
 def is_time_up():
     elapsed = (datetime.now() - START_TIME).total_seconds()
     return elapsed > MAX_RUNTIME_SECONDS
 
-def process_queue(continuous=True):
+# Atomic claim (pending -> processing + lease) shared by both modes
+task_queue = SupabaseTaskQueue(client_factory=get_supabase)
+
+# How often this worker returns expired leases (dead workers) to the queue
+REAP_INTERVAL_SECONDS = 60
+_last_reap = 0.0
+
+def maybe_reap():
+    global _last_reap
+    if time.monotonic() - _last_reap < REAP_INTERVAL_SECONDS:
+        return
+    _last_reap = time.monotonic()
+    try:
+        for row in task_queue.reap():
+            print(f"   ♻️ Lease expired for {row.get('video_id')} -> {row.get('status')}")
+    except Exception as e:
+        print(f"   ⚠️ Reaper failed: {e}")
+    update_queue_depth()
+
+def update_queue_depth():
+    """Pending rows in en_videos (exported as the queue_depth gauge), refreshed with the reaper."""
+    try:
+        response = get_supabase().table('en_videos').select('video_id', count='exact', head=True) \
+            .eq('status', 'pending').execute()
+        if response.count is not None:
+            metrics.set_gauge('queue_depth', response.count)
+    except Exception as e:
+        print(f"   ⚠️ Could not read queue depth: {e}")
+
+class ThroughputMeter:
+    """
+    統計本次執行的完成/失敗數量，換算成 videos/minute，
+    讓循序模式與 --concurrency 模式可以直接比較。
+    """
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def record(self, ok, video_id=None, started=None):
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if started is not None:
+            # End-to-end task span (claim -> completed / failed)
+            metrics.observe('task', time.monotonic() - started, 'ok' if ok else 'error', video_id=video_id)
+
+    def videos_per_minute(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return self.completed / (elapsed / 60)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        print(f"📊 [Throughput] Mode: {self.mode} | Completed: {self.completed} | Failed: {self.failed} | "
+              f"Elapsed: {elapsed/60:.1f} min | {self.videos_per_minute():.2f} videos/min")
+        if self.completed:
+            print(f"   🧩 Gemini requests per completed video: {analysis_stats['requests'] / self.completed:.2f} "
+                  f"(salvaged {analysis_stats['salvaged']}, top-ups {analysis_stats['topups']}, "
+                  f"lexicon fills {analysis_stats['lexicon_filled']})")
+        for key_stats in key_pool.stats():
+            print(f"   🔑 {key_stats['key']}: {key_stats['requests']} req, {key_stats['throttled']} throttled, "
+                  f"{key_stats['tokens']} tokens, health {key_stats['health']}")
+
+# --- Task stages (shared by sequential and pipelined modes) ---
+
+def fetch_video_metadata(video_id):
+    """
+    yt-dlp 單次擷取 (標題、縮圖、長度、字幕軌網址)，結果會交給 fetch_transcript 重複使用。
+    失敗時回傳 None (不影響後續流程)。
+    """
+    with metrics.span('metadata', video_id=video_id) as span:
+        try:
+            info = extract_video_info(video_id)
+            span.set(caption_tracks=len(info['caption_tracks']))
+            return info
+        except Exception as e_yt:
+            print(f"   ℹ️ yt-dlp metadata skip: {e_yt}")
+            span.outcome = 'skipped'
+            return None
+
+def mark_processing(video_id, info=None):
+    update_data = {'status': 'processing'}
+    if info and info.get('title'): update_data['title'] = info['title']
+    if info and info.get('thumbnail'): update_data['thumbnail'] = info['thumbnail']
+
+    with metrics.span('db_mark_processing', video_id=video_id) as span:
+        try:
+            get_supabase().table('en_videos') \
+                .update(update_data) \
+                .eq('video_id', video_id) \
+                .execute()
+        except Exception as update_err:
+            print(f"   ⚠️ Could not update initial metadata: {update_err}")
+            span.set(retries=1)
+            # Fallback: at least try to update status only
+            get_supabase().table('en_videos') \
+                .update({'status': 'processing'}) \
+                .eq('video_id', video_id) \
+                .execute()
+
+def fetch_transcript_stage(video_id, video_info=None):
+    with metrics.span('transcript', video_id=video_id) as span:
+        # YouTube pacing / 429 backoff is handled by study_ai.youtube_limiter (shared circuit breaker)
+        transcript, fetch_status = fetch_transcript(video_id, video_info=video_info)
+
+        if fetch_status == 'error':
+            raise TranscriptUnavailable("Failed to fetch transcript (caption sources failed, will retry)")
+        if not transcript:
+            raise Exception("Failed to fetch transcript (No CC found)")
+
+        # Merge caption fragments into sentences before they go into the Gemini prompt
+        compacted = compact_transcript(transcript)
+        print(f"   [壓縮] 逐字稿 {len(transcript)} -> {len(compacted)} 字元")
+        span.set(chars=len(transcript), compacted_chars=len(compacted))
+        return compacted
+
+def analyze_stage(transcript, video_id=None):
+    with metrics.span('analysis', video_id=video_id, chars=len(transcript)) as span:
+        # 429 / 503 are retried inside key_pool on another key (with cooldown and backoff)
+        analysis = analyze_with_ai(transcript)
+        if not analysis:
+            raise AnalysisFailed("AI Analysis Failed after retries")
+        span.set(vocabulary=len(analysis.get('vocabulary') or []),
+                 sentence_patterns=len(analysis.get('sentence_patterns') or []))
+        return analysis
+
+def save_results(video_id, analysis):
+    # Merge existing fields (like thumbnail) with new analysis
+    update_payload = {
+        'status': 'completed',
+        'category': analysis.get('category', []),
+        'vocabulary': analysis.get('vocabulary', []),
+        'sentence_patterns': analysis.get('sentence_patterns', []),
+        'processing_error': None,
+        'lease_owner': None,
+        'lease_expires_at': None
+    }
+
+    with metrics.span('db_save_results', video_id=video_id) as span:
+        try:
+            get_supabase().table('en_videos') \
+                .update(update_payload) \
+                .eq('video_id', video_id) \
+                .execute()
+        except Exception as final_err:
+            print(f"   ⚠️ Final update failed (possibly missing columns): {final_err}")
+            span.set(retries=1)
+            # Fallback: update status and analysis data even if title/thumbnail fail
+            # Assuming category/vocabulary/sentence_patterns ALWAYS exist
+            get_supabase().table('en_videos') \
+                .update({
+                    'status': 'completed',
+                    'category': update_payload['category'],
+                    'vocabulary': update_payload['vocabulary'],
+                    'sentence_patterns': update_payload['sentence_patterns']
+                }) \
+                .eq('video_id', video_id) \
+                .execute()
+
+class TranscriptUnavailable(Exception):
+    """字幕來源暫時失敗 (不是「沒有字幕」)，稍後再試。"""
+
+class AnalysisFailed(Exception):
+    """Gemini 在 key_pool 重試 / 換 key 之後仍沒有回傳可用的分析結果。"""
+
+TRANSIENT_ERROR_TYPES = (TimeoutError, ConnectionError, json.JSONDecodeError,
+                         NoKeyAvailable, YouTubeBlocked, TranscriptUnavailable, AnalysisFailed)
+# Transport errors of the HTTP clients under supabase / google-genai, checked once those are imported
+TRANSPORT_ERROR_TYPES = (('httpx', 'TransportError'), ('requests', 'ConnectionError'), ('requests', 'Timeout'))
+# HTTP status (google-genai APIError.code, PostgREST / httpx responses) and google-genai status names
+TRANSIENT_HTTP_STATUSES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_API_STATUSES = {'RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED'}
+# Postgres SQLSTATE in PostgREST APIError.code: serialization failure, deadlock, statement timeout,
+# shutdown / starting up, plus the connection-exception (08) and insufficient-resources (53) classes
+TRANSIENT_SQLSTATES = {'40001', '40P01', '57014', '57P01', '57P03'}
+TRANSIENT_SQLSTATE_CLASSES = ('08', '53')
+
+def _transport_error_types():
+    types = []
+    for module_name, name in TRANSPORT_ERROR_TYPES:
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, name):
+            types.append(getattr(module, name))
+    return tuple(types)
+
+def _error_status(e):
+    """(HTTP status, error code string) carried by an API error, either may be None."""
+    status = getattr(e, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+    code = getattr(e, 'code', None)
+    if isinstance(code, int):
+        status = status or code
+        code = None
+    elif isinstance(code, str) and len(code) == 3 and code.isdigit():
+        # PostgREST reports some HTTP failures as code "406" / "503"
+        status = status or int(code)
+        code = None
+    return status, code
+
+def is_transient_error(e):
+    """網路 / 配額類錯誤稍後重試即可；像「沒有字幕」這種錯誤重試也沒用。"""
+    if isinstance(e, TRANSIENT_ERROR_TYPES + _transport_error_types()):
+        return True
+    status, code = _error_status(e)
+    if status in TRANSIENT_HTTP_STATUSES:
+        return True
+    if getattr(e, 'status', None) in TRANSIENT_API_STATUSES:
+        return True
+    if isinstance(code, str) and (code in TRANSIENT_SQLSTATES or code.startswith(TRANSIENT_SQLSTATE_CLASSES)):
+        return True
+    return False
+
+def fail_task(video_id, e):
+    # Transient errors are re-queued with backoff, others are marked 'error'
+    try:
+        status = task_queue.fail(video_id, e, retryable=is_transient_error(e))
+        if status == 'pending':
+            print(f"   🔁 {video_id} re-queued for a later retry")
+        elif status == 'dead':
+            print(f"   ☠️ {video_id} exhausted its retries (dead)")
+    except Exception as fail_err:
+        print(f"   ⚠️ Could not record failure for {video_id}: {fail_err}")
+
+# --- Sequential mode ---
+
+def process_queue(continuous=True, waker=None):
     print(f"🚀 Video Processing Worker Started... Mode: {'Continuous' if continuous else 'Batch (One-off)'}")
     print(f"⏱️ Runtime Limit: {MAX_RUNTIME_SECONDS/60:.1f} minutes")
-    
-    attempted_ids = set() # Prevent infinite loop on same video in one run
-    
+
+    # Idle: wait for a push notification, re-checking the queue with adaptive backoff
+    waker = waker or (create_waker() if continuous else PollingWaker())
+    backoff = AdaptiveBackoff()
+
+    meter = ThroughputMeter("sequential")
+    heartbeat = LeaseHeartbeat(task_queue).start()
+
     while True:
         # Check if we should exit due to time limit
         if not continuous and is_time_up():
             print(f"⏰ [Timeout] Reached {MAX_RUNTIME_SECONDS/60:.1f} minutes limit. Exiting gracefully.")
             break
 
+        maybe_reap()
+
+        video_id = None
+        started = time.monotonic()
         try:
-            # 1. Fetch one pending task
-            query = supabase.table('en_videos') \
-                .select('*') \
-                .eq('status', 'pending')
-            
-            # If we already tried some in this run and they failed, skip them
-            if attempted_ids:
-                # PostgREST doesn't have a clean 'NOT IN', but we can filter or just pick one
-                # and skip if it's in attempted_ids.
-                pass
-
-            response = query.limit(1).execute()
-                
-            tasks = response.data
-            
+            # 1. Claim one pending task (atomically moved to 'processing')
+            with metrics.span('claim') as span:
+                tasks = task_queue.claim(1)
+                span.set(claimed=len(tasks))
+
             if not tasks:
                 if not continuous:
                     print("✅ [Batch Mode] Queue is empty. Exiting.")
                     break
-                time.sleep(10) # No tasks, wait longer in continuous mode
+                waker.wait(backoff.next_delay())
                 continue
-                
+
+            backoff.reset()
             task = tasks[0]
             video_id = task.get('video_id')
-            
+
             if not video_id:
                 print("⚠️ Found task with missing video_id. Skipping.")
                 continue
 
-            if video_id in attempted_ids:
-                print(f"⚠️ Video {video_id} already attempted and failed in this run. Skipping to avoid loop.")
-                # We need to manually change its status to 'error' or something if it's still pending
-                # but if we are here, it means the previous attempt failed to update status.
-                # Let's try to fetch another one by using a longer tail or just breaking
-                print("   (Queue might be stuck on this item. Suggest manual intervention.)")
-                time.sleep(5)
-                # To actually skip it in the query, we'd need better filtering. 
-                # For now, let's just abort this run to avoid 6h hang.
-                break
-
-            attempted_ids.add(video_id)
-            url = f"https://www.youtube.com/watch?v={video_id}"
+            # Failed videos come back only after their next_attempt_at, so they never block the run
+            heartbeat.track(video_id)
             print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Processing Task: {video_id}")
-            
-            # 2. Mark as processing and try to fetch Title immediately
-            title = None
-            try:
-                import yt_dlp
-                # Add a socket timeout for yt-dlp
-                ydl_opts = {
-                    'quiet': True, 
-                    'no_warnings': True,
-                    'socket_timeout': 30, # 30 seconds timeout
-                    'nocheckcertificate': True
-                }
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    title = info.get('title')
-            except Exception as e_yt:
-                print(f"   ℹ️ yt-dlp metadata skip: {e_yt}")
-
-            update_data = {'status': 'processing'}
-            if title: update_data['title'] = title
-            
-            try:
-                supabase.table('en_videos') \
-                    .update(update_data) \
-                    .eq('video_id', video_id) \
-                    .execute()
-            except Exception as update_err:
-                print(f"   ⚠️ Could not update initial metadata: {update_err}")
-                # Fallback: at least try to update status only
-                supabase.table('en_videos') \
-                    .update({'status': 'processing'}) \
-                    .eq('video_id', video_id) \
-                    .execute()
-                
+
+            # 2. Already marked as processing by the claim; try to fetch Title/Thumbnail immediately
+            info = fetch_video_metadata(video_id)
+            if info:
+                mark_processing(video_id, info)
+
             # 3. Fetch Transcript
-            try:
-                transcript = fetch_transcript_final(video_id)
-            except Exception as e_cc:
-                if "429" in str(e_cc):
-                    print("   🛑 YouTube IP 遭封鎖 (429)，暫停 60 秒...")
-                    time.sleep(60)
-                raise e_cc
-            
-            if not transcript:
-                raise Exception("Failed to fetch transcript (No CC found)")
-                
+            transcript = fetch_transcript_stage(video_id, info)
+
             # 4. AI Analysis
-            # Retry logic for AI (simplified from study_ai.py)
-            analysis = None
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    analysis = analyze_with_ai(transcript)
-                    break
-                except Exception as ai_err:
-                    err_str = str(ai_err)
-                    if any(code in err_str for code in ["429", "RESOURCE_EXHAUSTED", "503", "UNAVAILABLE"]):
-                        print(f"   [{'429' if '429' in err_str else '503'}] Temporary error, rotating Key and retrying...")
-                        rotate_key()
-                        time.sleep(5 if "503" in err_str or "UNAVAILABLE" in err_str else 2)
-                    else:
-                        raise ai_err # Re-raise other errors
-            
-            if not analysis:
-                raise Exception("AI Analysis Failed after retries")
+            analysis = analyze_stage(transcript, video_id)
 
             # 5. Update Database with Results
-            # Merge existing fields (like thumbnail) with new analysis
-            update_payload = {
-                'status': 'completed',
-                'category': analysis.get('category', []),
-                'vocabulary': analysis.get('vocabulary', []),
-                'sentence_patterns': analysis.get('sentence_patterns', []),
-                'processing_error': None
-            }
-            
-            try:
-                supabase.table('en_videos') \
-                    .update(update_payload) \
-                    .eq('video_id', video_id) \
-                    .execute()
-            except Exception as final_err:
-                print(f"   ⚠️ Final update failed (possibly missing columns): {final_err}")
-                # Fallback: update status and analysis data even if title/thumbnail fail
-                # Assuming category/vocabulary/sentence_patterns ALWAYS exist
-                supabase.table('en_videos') \
-                    .update({
-                        'status': 'completed',
-                        'category': update_payload['category'],
-                        'vocabulary': update_payload['vocabulary'],
-                        'sentence_patterns': update_payload['sentence_patterns']
-                    }) \
-                    .eq('video_id', video_id) \
-                    .execute()
-                
+            save_results(video_id, analysis)
+
             print(f"✅ Task Completed: {video_id}")
-            
+            meter.record(True, video_id, started)
+
         except Exception as e:
             error_msg = f"{str(e)}\n{traceback.format_exc()}"
             print(f"❌ Task Failed: {error_msg}")
-            
-            # Update DB with error
+
+            if video_id:
+                fail_task(video_id, e)
+                meter.record(False, video_id, started)
+        finally:
+            if video_id:
+                heartbeat.untrack(video_id)
+
+    heartbeat.stop()
+    waker.close()
+    meter.report()
+
+# --- Pipelined mode (--concurrency N) ---
+
+_STOP = object() # Sentinel passed down the pipeline on shutdown
+
+def _run_stage(name, fn, in_q, out_q, meter, heartbeat):
+    """
+    單一階段的工作執行緒：從 in_q 取出任務、執行 fn，成功則交給下一階段。
+    任何例外都會在這裡把影片標記為 error，不會往下游傳遞。
+    """
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            in_q.put(_STOP) # Let sibling threads of this stage see it too
+            return
+        video_id = item['video_id']
+        try:
+            fn(item)
+            if out_q is not None:
+                out_q.put(item)
+        except Exception as e:
+            print(f"❌ Task Failed [{name}] {video_id}: {e}\n{traceback.format_exc()}")
+            fail_task(video_id, e)
+            heartbeat.untrack(video_id)
+            meter.record(False, video_id, item.get('claimed_at'))
+
+def _metadata_step(item):
+    item['info'] = fetch_video_metadata(item['video_id'])
+    if item['info']:
+        mark_processing(item['video_id'], item['info'])
+
+def _transcript_step(item):
+    item['transcript'] = fetch_transcript_stage(item['video_id'], item.pop('info'))
+
+def _make_analysis_step(meter, heartbeat):
+    def _analysis_step(item):
+        analysis = analyze_stage(item.pop('transcript'), item['video_id'])
+        save_results(item['video_id'], analysis)
+        heartbeat.untrack(item['video_id'])
+        print(f"✅ Task Completed: {item['video_id']}")
+        meter.record(True, item['video_id'], item.get('claimed_at'))
+    return _analysis_step
+
+def process_queue_pipelined(concurrency, continuous=True, waker=None):
+    """
+    管線化模式：metadata / transcript / AI 三個階段各自有 concurrency 條執行緒，
+    階段之間以有界佇列 (maxsize=concurrency) 連接，讓多支影片同時在網路 I/O 上等待。
+    任務以 claim_en_videos() 原子性領取，狀態轉換與循序模式相同：pending -> processing -> completed / error (可重試的錯誤排回 pending)。
+    """
+    print(f"🚀 Video Processing Worker Started... Mode: {'Continuous' if continuous else 'Batch (One-off)'} | Pipelined x{concurrency}")
+    print(f"⏱️ Runtime Limit: {MAX_RUNTIME_SECONDS/60:.1f} minutes")
+
+    meter = ThroughputMeter(f"pipelined x{concurrency}")
+    # One hedged fetch per transcript-stage thread
+    transcript_fetcher.set_concurrency(concurrency)
+    heartbeat = LeaseHeartbeat(task_queue).start()
+    waker = waker or (create_waker() if continuous else PollingWaker())
+    backoff = AdaptiveBackoff()
+    metadata_q = queue.Queue(maxsize=concurrency)
+    transcript_q = queue.Queue(maxsize=concurrency)
+    analysis_q = queue.Queue(maxsize=concurrency)
+
+    stages = [
+        ("metadata", _metadata_step, metadata_q, transcript_q),
+        ("transcript", _transcript_step, transcript_q, analysis_q),
+        ("analysis", _make_analysis_step(meter, heartbeat), analysis_q, None),
+    ]
+    # In-process queue depths between the stages
+    metrics.register_collector(lambda: {f"pipeline_{name}_queue": in_q.qsize() for name, _, in_q, _ in stages})
+
+    threads = []
+    for name, fn, in_q, out_q in stages:
+        stage_threads = [
+            threading.Thread(target=_run_stage, args=(name, fn, in_q, out_q, meter, heartbeat), name=f"{name}-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        for t in stage_threads:
+            t.start()
+        threads.append(stage_threads)
+
+    try:
+        while True:
+            if not continuous and is_time_up():
+                print(f"⏰ [Timeout] Reached {MAX_RUNTIME_SECONDS/60:.1f} minutes limit. Exiting gracefully.")
+                break
+
+            maybe_reap()
+
             try:
-                if 'video_id' in locals():
-                    supabase.table('en_videos') \
-                        .update({
-                            'status': 'error', 
-                            'processing_error': str(e)
-                        }) \
-                        .eq('video_id', video_id) \
-                        .execute()
-            except:
-                pass
-                
-        time.sleep(2) # Small buffer between tasks
+                with metrics.span('claim') as span:
+                    tasks = [t for t in task_queue.claim(concurrency) if t.get('video_id')]
+                    span.set(claimed=len(tasks))
+            except Exception as e:
+                print(f"❌ Queue fetch failed: {e}")
+                tasks = []
+
+            if not tasks:
+                if not continuous:
+                    print("✅ [Batch Mode] Queue is empty. Waiting for in-flight tasks...")
+                    break
+                waker.wait(backoff.next_delay())
+                continue
+
+            backoff.reset()
+
+            for task in tasks:
+                video_id = task['video_id']
+                heartbeat.track(video_id)
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Processing Task: {video_id}")
+                metadata_q.put({'video_id': video_id, 'claimed_at': time.monotonic()}) # Blocks while the pipeline is full
+    finally:
+        # Drain stage by stage so every in-flight video reaches a final status
+        for (name, fn, in_q, out_q), stage_threads in zip(stages, threads):
+            in_q.put(_STOP)
+            for t in stage_threads:
+                t.join()
+        heartbeat.stop()
+        waker.close()
+        meter.report()
 
 if __name__ == "__main__":
-    # Check for batch mode flag
-    is_batch = "--batch" in sys.argv
-    process_queue(continuous=not is_batch)
+    parser = argparse.ArgumentParser(description="Video processing worker for en_videos")
+    parser.add_argument("--batch", action="store_true", help="Drain the queue once and exit (cron mode)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of videos in flight at once (pipelined metadata/transcript/AI stages)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", 0)),
+                        help="Serve Prometheus metrics on this port (/metrics, /stats)")
+    args = parser.parse_args()
+
+    # Cron mode: one cheap request decides whether there is anything to do (before any client is built)
+    if args.batch and has_work() is False:
+        print("✅ [Batch Mode] Queue is empty (probe). Exiting.")
+        sys.exit(0)
+
+    # Rolling JSON stats file (always on) and optional Prometheus endpoint
+    metrics.start_json_writer()
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+
+    try:
+        if args.concurrency > 1:
+            process_queue_pipelined(args.concurrency, continuous=not args.batch)
+        else:
+            process_queue(continuous=not args.batch)
+    finally:
+        # Keep the learned YouTube rate / breaker state for the next cron run
+        youtube_limiter.close()
+        transcript_fetcher.save()
+        print(f"📺 [YouTube] {youtube_limiter.stats()}")
+        print(f"🏁 [Transcripts] {transcript_fetcher.summary()}")
+        metrics.write_json()
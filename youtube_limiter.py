@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from local_store import CACHE_DIR
+
+# Request rate (requests / second), adjusted by AIMD
+MIN_RATE = 0.05          # one request every 20 s while recovering from blocks
+MAX_RATE = 2.0
+INITIAL_RATE = 0.5
+ADDITIVE_STEP = 0.05     # + per successful request
+BLOCK_DECREASE = 0.5     # x on 429 / bot check
+SLOW_DECREASE = 0.8      # x on a response slower than SLOW_SECONDS
+SLOW_SECONDS = 15
+
+# Circuit breaker: open after this many consecutive blocks, probe again after the cooldown
+BREAKER_THRESHOLD = 3
+BASE_COOLDOWN_SECONDS = 60
+MAX_COOLDOWN_SECONDS = 30 * 60
+# Callers wait at most this long for the breaker / pacing before giving up
+MAX_WAIT_SECONDS = 30 * 60
+
+STATE_PATH = os.path.join(CACHE_DIR, "youtube_limiter.json")
+
+# YTA (TooManyRequests / RequestBlocked / IpBlocked) and yt-dlp ("Sign in to confirm you're not a bot")
+_BLOCK_MARKERS = ("429", "Too Many Requests", "TooManyRequests", "RequestBlocked", "IpBlocked",
+                  "blocking requests from your IP", "confirm you’re not a bot", "confirm you're not a bot")
+
+def is_block_error(error):
+    text = f"{type(error).__name__}: {error}"
+    return any(marker in text for marker in _BLOCK_MARKERS)
+
+class YouTubeBlocked(Exception):
+    pass
+
+class RequestCancelled(Exception):
+    """The caller gave up (cancel event set) while waiting for a slot; nothing was sent."""
+
+class YouTubeLimiter:
+    """
+    YouTube 請求的共用節流器 (YTA 與 yt-dlp 共用)：
+    - AIMD：成功時速率慢慢增加，遇到 429 / 機器人驗證時減半，回應太慢時小幅降低
+    - 斷路器：連續被擋 BREAKER_THRESHOLD 次就暫停 (open)，冷卻後只放一個探測請求 (half-open)，
+      成功才恢復，失敗則冷卻時間加倍
+    狀態存在 .cache/youtube_limiter.json，cron 重新啟動時延續上次的速率與封鎖狀態。
+    """
+    def __init__(self, state_path=STATE_PATH):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.rate = INITIAL_RATE
+        self.state = 'closed'
+        self.open_until = 0.0        # wall clock (time.time()), so it survives restarts
+        self.cooldown = BASE_COOLDOWN_SECONDS
+        self.consecutive_blocks = 0
+        self._probe_in_flight = False
+        self._next_slot = 0.0        # monotonic
+        self.requests = 0
+        self.blocks = 0
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.rate = min(max(float(saved.get('rate', INITIAL_RATE)), MIN_RATE), MAX_RATE)
+        self.state = saved.get('state', 'closed')
+        self.open_until = float(saved.get('open_until', 0))
+        self.cooldown = float(saved.get('cooldown', BASE_COOLDOWN_SECONDS))
+        self.consecutive_blocks = int(saved.get('consecutive_blocks', 0))
+        if self.state == 'half_open':
+            # The probe died with the previous process
+            self.state = 'open'
+        if self.state == 'open':
+            print(f"   ⏸️ [YouTube] 斷路器仍為 open (剩 {max(self.open_until - time.time(), 0):.0f} 秒)，速率 {self.rate:.2f}/s")
+
+    def _save(self):
+        state = {
+            'rate': round(self.rate, 4),
+            'state': self.state,
+            'open_until': self.open_until,
+            'cooldown': self.cooldown,
+            'consecutive_blocks': self.consecutive_blocks,
+            'updated_at': time.time(),
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"   [資訊] 無法儲存 YouTube 節流狀態: {e}")
+
+    # --- Acquire / record ---
+
+    def _try_acquire(self):
+        """Returns (is_probe, 0) when a request may start, or (None, seconds to wait)."""
+        now = time.time()
+        if self.state == 'open':
+            if now < self.open_until:
+                return None, self.open_until - now
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self._probe_in_flight:
+                return None, 1.0
+            self._probe_in_flight = True
+            return True, 0.0
+        mono = time.monotonic()
+        slot = max(mono, self._next_slot)
+        self._next_slot = slot + 1 / self.rate
+        return False, slot - mono
+
+    def acquire(self, max_wait=MAX_WAIT_SECONDS, cancel=None):
+        """
+        Blocks until a request may go out; returns True for a half-open probe.
+        cancel: threading.Event; once set, the wait ends with RequestCancelled and the slot is given back.
+        """
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled()
+                is_probe, wait = self._try_acquire()
+                if is_probe is not None and wait <= 0:
+                    self.requests += 1
+                    return is_probe
+                if time.monotonic() + wait > deadline:
+                    if is_probe is False:
+                        # Give the reserved pacing slot back
+                        self._next_slot -= 1 / self.rate
+                    raise YouTubeBlocked(f"YouTube rate limited (429): circuit {self.state}, retry in {wait:.0f}s")
+                if is_probe is False:
+                    # Pacing slot reserved: wait for it outside the lock
+                    self._cond.release()
+                    try:
+                        cancelled = cancel.wait(wait) if cancel is not None else time.sleep(wait)
+                    finally:
+                        self._cond.acquire()
+                    if cancelled:
+                        self._next_slot -= 1 / self.rate
+                        raise RequestCancelled()
+                    self.requests += 1
+                    return False
+                # Breaker open: re-check the cancel event at least once a second
+                self._cond.wait(wait if cancel is None else min(wait, 1.0))
+
+    def record(self, is_probe, latency, error=None):
+        blocked = error is not None and is_block_error(error)
+        with self._cond:
+            if is_probe:
+                self._probe_in_flight = False
+            if blocked:
+                self.blocks += 1
+                self.consecutive_blocks += 1
+                self.rate = max(self.rate * BLOCK_DECREASE, MIN_RATE)
+                if self.state == 'open' and not is_probe:
+                    # Breaker already tripped by another in-flight request
+                    pass
+                elif is_probe or self.consecutive_blocks >= BREAKER_THRESHOLD:
+                    if self.state != 'closed':
+                        self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN_SECONDS)
+                    self.state = 'open'
+                    self.open_until = time.time() + self.cooldown
+                    print(f"   ⛔ [YouTube] 連續被封鎖 {self.consecutive_blocks} 次，暫停 {self.cooldown:.0f} 秒 (速率 {self.rate:.2f}/s)")
+                else:
+                    print(f"   🐢 [YouTube] 429，降速至 {self.rate:.2f}/s")
+                self._save()
+            else:
+                # Any answer that is not a block (including "no captions") means YouTube is serving us
+                changed = self.state != 'closed' or self.consecutive_blocks
+                if self.state != 'closed':
+                    print("   ✅ [YouTube] 探測成功，斷路器恢復 (closed)")
+                self.state = 'closed'
+                self.cooldown = BASE_COOLDOWN_SECONDS
+                self.consecutive_blocks = 0
+                if latency > SLOW_SECONDS:
+                    self.rate = max(self.rate * SLOW_DECREASE, MIN_RATE)
+                else:
+                    self.rate = min(self.rate + ADDITIVE_STEP, MAX_RATE)
+                if changed:
+                    self._save()
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self, cancel=None):
+        """with youtube_limiter.request(): ...  (一次 YouTube 請求；cancel 已設定時拋出 RequestCancelled)"""
+        is_probe = self.acquire(cancel=cancel)
+        t0 = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.record(is_probe, time.monotonic() - t0, e)
+            raise
+        self.record(is_probe, time.monotonic() - t0)
+
+    def close(self):
+        """Persist the learned rate (called at the end of a run)."""
+        with self._cond:
+            self._save()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'state': self.state,
+                'rate': round(self.rate, 3),
+                'requests': self.requests,
+                'blocks': self.blocks,
+                'open_for': round(max(self.open_until - time.time(), 0), 1) if self.state == 'open' else 0,
+            }